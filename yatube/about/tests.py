@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from django.test import Client, TestCase
 
 from posts.models import User
@@ -10,6 +11,7 @@ class StaticURLTests(TestCase):
         cls.user = User.objects.create_user(username="TestUser")
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
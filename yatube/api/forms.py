@@ -0,0 +1,11 @@
+from django import forms
+
+from posts.forms import PostForm
+from posts.models import Group
+
+
+class ApiPostForm(PostForm):
+    # В API группа передаётся адресом, как и отдаётся.
+    group = forms.ModelChoiceField(
+        Group.objects.all(), to_field_name="slug", required=False
+    )
@@ -0,0 +1,93 @@
+import json
+import os
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.export import FORMATS, KINDS, Export
+
+
+class Command(BaseCommand):
+    help = (
+        "Выгружает посты или комментарии в JSON Lines или CSV потоком, "
+        "с продолжением с последнего id"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--kind", choices=sorted(KINDS), default="posts")
+        parser.add_argument("--format", choices=FORMATS, default="jsonl")
+        parser.add_argument(
+            "--gzip", action="store_true", help="Сжимать вывод gzip"
+        )
+        parser.add_argument(
+            "--output", default="-", help="Файл выгрузки, «-» — stdout"
+        )
+        parser.add_argument(
+            "--after", type=int, default=0, help="Выгрузить строки с id > N"
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Дописать --output с места, сохранённого в <output>.state",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.EXPORT_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        output = options["output"]
+        after, offset = options["after"], 0
+        if options["resume"]:
+            if output == "-":
+                raise CommandError("--resume работает только с --output")
+            state = self.load_state(output)
+            if state is not None and os.path.exists(output):
+                after, offset = state["after"], state["bytes"]
+        export = Export(
+            options["kind"],
+            options["format"],
+            options["gzip"],
+            after,
+            header=offset == 0,
+            batch_size=options["batch_size"],
+        )
+        if output == "-":
+            for chunk in export:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            report = self.stderr
+        else:
+            self.write_file(export, output, offset)
+            report = self.stdout
+        report.write(
+            f"Выгружено строк: {export.rows}, последний id: "
+            f"{export.last_id} за {time.monotonic() - started:.1f} с"
+        )
+
+    def write_file(self, export, output, offset):
+        with open(output, "r+b" if offset else "wb") as target:
+            # Хвост после сохранённой позиции — недописанная пачка.
+            target.seek(offset)
+            target.truncate()
+            for chunk in export:
+                target.write(chunk)
+                target.flush()
+                self.save_state(output, export.last_id, target.tell())
+            self.save_state(output, export.last_id, target.tell())
+
+    def load_state(self, output):
+        try:
+            with open(f"{output}.state") as source:
+                return json.load(source)
+        except FileNotFoundError:
+            return None
+
+    def save_state(self, output, last_id, size):
+        path = f"{output}.state"
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as target:
+            json.dump({"after": last_id, "bytes": size}, target)
+        os.replace(temporary, path)
@@ -0,0 +1,84 @@
+"""Сериализация строк .values() в словари ответа.
+
+Модели не создаются: связанные поля (автор, группа) приходят JOIN-ом
+в том же запросе, поэтому страница любого размера — один запрос.
+"""
+
+from django.core.files.storage import default_storage
+
+
+def image_url(name):
+    return default_storage.url(name) if name else None
+
+
+class Serializer:
+    # Имя поля в API -> поле или путь ORM.
+    fields = {}
+    # Преобразования значений, которые JSON не умеет сам.
+    converters = {}
+    # Поле сортировки для курсора.
+    key = "id"
+
+    def __init__(self, names=None):
+        """names — поля из ?fields=; неизвестные дают ValueError."""
+        names = names or list(self.fields)
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ValueError(f"Неизвестные поля: {', '.join(unknown)}")
+        self.columns = [
+            (name, self.fields[name], self.converters.get(name))
+            for name in dict.fromkeys(names)
+        ]
+
+    def rows(self, queryset):
+        """Запрос выбранных колонок; ключ курсора и id — всегда."""
+        lookups = [lookup for _, lookup, _ in self.columns]
+        return queryset.values(*dict.fromkeys([*lookups, self.key, "id"]))
+
+    def dump(self, row):
+        return {
+            name: row[lookup] if convert is None else convert(row[lookup])
+            for name, lookup, convert in self.columns
+        }
+
+
+class PostSerializer(Serializer):
+    fields = {
+        "id": "id",
+        "text": "text",
+        "pub_date": "pub_date",
+        "author": "author__username",
+        "group": "group__slug",
+        "image": "image",
+        "comments_count": "comments_count",
+    }
+    converters = {"image": image_url}
+    key = "pub_date"
+
+
+class GroupSerializer(Serializer):
+    fields = {
+        "id": "id",
+        "title": "title",
+        "slug": "slug",
+        "description": "description",
+    }
+
+
+class CommentSerializer(Serializer):
+    fields = {
+        "id": "id",
+        "post": "post_id",
+        "author": "author__username",
+        "text": "text",
+        "created": "created",
+    }
+    key = "created"
+
+
+class FollowSerializer(Serializer):
+    fields = {
+        "id": "id",
+        "user": "user__username",
+        "author": "author__username",
+    }
@@ -0,0 +1,299 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from http import HTTPStatus
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="ApiAuthor")
+        cls.reader = User.objects.create(username="ApiReader")
+        cls.group = Group.objects.create(
+            title="Группа API", slug="api-group", description="Описание"
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f"Пост {i}",
+                author=cls.author,
+                group=cls.group if i % 2 else None,
+            )
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def send(self, client, method, url, data):
+        return getattr(client, method)(
+            url, json.dumps(data), content_type="application/json"
+        )
+
+    def get_counting(self, url, **extra):
+        """Ответ и запросы к данным без точек сохранения транзакции."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, **extra)
+        return response, [
+            query["sql"]
+            for query in queries.captured_queries
+            if "SAVEPOINT" not in query["sql"]
+        ]
+
+    def test_post_list_is_one_query(self):
+        """Страница постов со связанными полями — один запрос."""
+        url = reverse("api:post_list")
+        response, queries = self.get_counting(url)
+        self.assertEqual(len(queries), 1)
+        results = response.json()["results"]
+        self.assertEqual(
+            [row["id"] for row in results],
+            [post.pk for post in reversed(self.posts)],
+        )
+        self.assertEqual(results[0]["author"], "ApiAuthor")
+        self.assertEqual(results[1]["group"], "api-group")
+        self.assertIsNone(results[0]["image"])
+
+    def test_sparse_fields(self):
+        """?fields= оставляет только перечисленные поля."""
+        url = reverse("api:post_list")
+        response = self.client.get(url, {"fields": "id,text"})
+        self.assertEqual(set(response.json()["results"][0]), {"id", "text"})
+        response = self.client.get(url, {"fields": "id,password"})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_keyset_pagination(self):
+        """Курсор проходит все посты без повторов и пропусков."""
+        url = reverse("api:post_list")
+        seen, params = [], {"limit": 2}
+        while True:
+            body = self.client.get(url, params).json()
+            seen.extend(row["id"] for row in body["results"])
+            if not body["next_cursor"]:
+                break
+            params["cursor"] = body["next_cursor"]
+        self.assertEqual(seen, [post.pk for post in reversed(self.posts)])
+        response = self.client.get(url, {"cursor": "мусор"})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_etag_not_modified(self):
+        """Повторный запрос с If-None-Match получает 304 без базы."""
+        url = reverse("api:post_list")
+        etag = self.client.get(url)["ETag"]
+        response, queries = self.get_counting(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(queries, [])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Post.objects.create(text="Новый пост", author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_filters_and_follow_feed(self):
+        """Фильтры по группе и автору, лента подписок."""
+        url = reverse("api:post_list")
+        group = self.client.get(url, {"group": "api-group"}).json()
+        self.assertEqual(len(group["results"]), 2)
+        author = self.client.get(url, {"author": "ApiReader"}).json()
+        self.assertEqual(author["results"], [])
+        response = self.client.get(url, {"feed": "follow"})
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+        Follow.objects.create(user=self.reader, author=self.author)
+        feed = self.reader_client.get(url, {"feed": "follow"}).json()
+        self.assertEqual(len(feed["results"]), 5)
+
+    def test_post_write(self):
+        """Создавать посты могут вошедшие, менять — только автор."""
+        url = reverse("api:post_list")
+        data = {"text": "Из API", "group": "api-group"}
+        response = self.send(self.client, "post", url, data)
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+        response = self.send(self.author_client, "post", url, data)
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        created = response.json()
+        self.assertEqual(created["group"], "api-group")
+        response = self.send(self.author_client, "post", url, {"text": ""})
+        self.assertIn("text", response.json()["errors"])
+
+        detail = reverse("api:post_detail", args=[created["id"]])
+        response = self.send(
+            self.reader_client, "patch", detail, {"text": "Чужое"}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+        response = self.send(
+            self.author_client, "patch", detail, {"text": "Правка"}
+        )
+        self.assertEqual(response.json()["text"], "Правка")
+        self.assertEqual(response.json()["group"], "api-group")
+        response = self.author_client.delete(detail)
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        self.assertEqual(
+            self.client.get(detail).status_code, HTTPStatus.NOT_FOUND
+        )
+
+    def test_comments(self):
+        """Комментарии поста читаются страницами и добавляются."""
+        url = reverse("api:comment_list", args=[self.posts[0].pk])
+        response = self.send(
+            self.reader_client, "post", url, {"text": "Комментарий"}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertEqual(response.json()["author"], "ApiReader")
+        self.assertTrue(Comment.objects.filter(text="Комментарий").exists())
+        results = self.client.get(url).json()["results"]
+        self.assertEqual([row["text"] for row in results], ["Комментарий"])
+
+    def test_groups(self):
+        """Группы доступны списком и по адресу."""
+        results = self.client.get(reverse("api:group_list")).json()["results"]
+        self.assertEqual([row["slug"] for row in results], ["api-group"])
+        detail = reverse("api:group_detail", args=["api-group"])
+        self.assertEqual(self.client.get(detail).json()["title"], "Группа API")
+        response = self.client.post(detail)
+        self.assertEqual(response.status_code, HTTPStatus.METHOD_NOT_ALLOWED)
+
+    def test_follows(self):
+        """Подписка, повторная подписка, список и отписка."""
+        url = reverse("api:follow_list")
+        data = {"author": "ApiAuthor"}
+        response = self.send(self.reader_client, "post", url, data)
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        response = self.send(self.reader_client, "post", url, data)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        response = self.send(
+            self.author_client, "post", url, {"author": "ApiAuthor"}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        results = self.reader_client.get(url).json()["results"]
+        self.assertEqual([row["author"] for row in results], ["ApiAuthor"])
+        detail = reverse("api:follow_detail", args=["ApiAuthor"])
+        response = self.reader_client.delete(detail)
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        self.assertFalse(Follow.objects.filter(user=self.reader).exists())
+
+    def test_bulk_follows(self):
+        """Подписка и отписка сразу на нескольких авторов."""
+        other = User.objects.create(username="ApiOther")
+        url = reverse("api:follow_list")
+        data = {"authors": ["ApiAuthor", "ApiOther", "nobody", "ApiReader"]}
+        response = self.send(self.reader_client, "post", url, data)
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertEqual(
+            response.json(), {"created": 2, "unknown": ["nobody"]}
+        )
+        self.assertEqual(other.stats.followers_count, 1)
+        response = self.send(
+            self.reader_client, "delete", url, {"authors": ["ApiOther"]}
+        )
+        self.assertEqual(response.json()["deleted"], 1)
+        self.assertEqual(
+            list(
+                Follow.objects.filter(user=self.reader).values_list(
+                    "author__username", flat=True
+                )
+            ),
+            ["ApiAuthor"],
+        )
+        response = self.send(
+            self.reader_client, "post", url, {"authors": "ApiOther"}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+
+@override_settings(EXPORT_BATCH_SIZE=2)
+class ExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="ExportAuthor")
+        cls.staff = User.objects.create(username="ExportStaff", is_staff=True)
+        cls.posts = [
+            Post.objects.create(text=f"Пост {i}", author=cls.author)
+            for i in range(5)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.staff, text="Комментарий"
+        )
+
+    def setUp(self):
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def stream(self, kind, **params):
+        response = self.staff_client.get(
+            reverse("api:export", args=[kind]), params
+        )
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content)
+
+    def test_export_requires_staff(self):
+        """Выгрузка доступна только персоналу."""
+        url = reverse("api:export", args=["posts"])
+        self.assertEqual(
+            self.client.get(url).status_code, HTTPStatus.UNAUTHORIZED
+        )
+        author = Client()
+        author.force_login(self.author)
+        self.assertEqual(author.get(url).status_code, HTTPStatus.FORBIDDEN)
+
+    def test_jsonl_in_keyset_batches(self):
+        """Строки идут пачками по id без OFFSET, с продолжением после id."""
+        with CaptureQueriesContext(connection) as queries:
+            response, body = self.stream("posts")
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(
+            [row["id"] for row in rows], [post.pk for post in self.posts]
+        )
+        self.assertEqual(rows[0]["author"], "ExportAuthor")
+        selects = [
+            query["sql"]
+            for query in queries.captured_queries
+            if 'FROM "posts_post"' in query["sql"]
+        ]
+        self.assertEqual(len(selects), 4)
+        for sql in selects:
+            self.assertNotIn("OFFSET", sql)
+        _, body = self.stream("posts", after=self.posts[2].pk)
+        self.assertEqual(len(body.splitlines()), 2)
+
+    def test_gzip_csv(self):
+        """CSV в gzip: один заголовок на несколько членов архива."""
+        response, body = self.stream("comments", format="csv", gzip="1")
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        lines = gzip.decompress(body).decode().splitlines()
+        self.assertEqual(lines[0], "id,post,author,text,created")
+        self.assertEqual(len(lines), 2)
+        _, body = self.stream("posts", format="csv", gzip="1")
+        self.assertEqual(len(gzip.decompress(body).splitlines()), 6)
+
+    def test_command_resumes(self):
+        """Команда дописывает файл с сохранённого места."""
+        output = os.path.join(self.directory, "posts.jsonl.gz")
+        options = {"output": output, "gzip": True, "stdout": StringIO()}
+        call_command("export_posts", **options)
+        with open(f"{output}.state") as state:
+            self.assertEqual(json.load(state)["after"], self.posts[-1].pk)
+        # Недописанный хвост от прерванного запуска.
+        with open(output, "ab") as target:
+            target.write(b"broken")
+        new = Post.objects.create(text="Новый пост", author=self.author)
+        call_command("export_posts", resume=True, **options)
+        with gzip.open(output) as source:
+            ids = [json.loads(line)["id"] for line in source]
+        self.assertEqual(ids, [post.pk for post in self.posts] + [new.pk])
@@ -0,0 +1,329 @@
+import json
+from functools import partial, wraps
+from http import HTTPStatus
+
+from django.conf import settings
+from django.core.paginator import InvalidPage
+from django.http import (
+    Http404,
+    HttpResponse,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition
+
+from posts.caching import feed_version
+from posts.conditional import make_etag
+from posts.follows import bulk_follow, bulk_unfollow
+from posts.forms import CommentForm
+from posts.models import Comment, Follow, Group, Post, User
+from posts.timeline import TimelinePaginator, timeline_posts
+from yatube.utils import CursorPaginator
+
+from .export import FORMATS, KINDS, Export
+from .forms import ApiPostForm
+from .serializers import (
+    CommentSerializer,
+    FollowSerializer,
+    GroupSerializer,
+    PostSerializer,
+)
+
+SAFE_METHODS = ("GET", "HEAD")
+
+
+class ApiError(Exception):
+    def __init__(self, status, detail, **extra):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+        self.extra = extra
+
+
+def _error(status, detail, **extra):
+    return JsonResponse({"detail": detail, **extra}, status=status)
+
+
+def api_view(*methods):
+    """Допустимые методы и ошибки в JSON; запись — только для вошедших."""
+    allowed = set(methods) | ({"HEAD"} if "GET" in methods else set())
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in allowed:
+                response = _error(
+                    HTTPStatus.METHOD_NOT_ALLOWED, "Метод не поддерживается"
+                )
+                response["Allow"] = ", ".join(sorted(allowed))
+                return response
+            if (
+                request.method not in SAFE_METHODS
+                and not request.user.is_authenticated
+            ):
+                return _error(HTTPStatus.UNAUTHORIZED, "Нужна авторизация")
+            try:
+                return view(request, *args, **kwargs)
+            except Http404:
+                return _error(HTTPStatus.NOT_FOUND, "Не найдено")
+            except ApiError as error:
+                return _error(error.status, error.detail, **error.extra)
+
+        return wrapper
+
+    return decorator
+
+
+def _etag(*scopes):
+    """ETag из версий данных в кэше: 304 отдаётся без запросов к базе."""
+
+    def etag_func(request, *args, **kwargs):
+        return make_etag(
+            request,
+            request.get_full_path(),
+            *(feed_version(scope) for scope in scopes),
+        )
+
+    return etag_func
+
+
+def _serializer(request, serializer_class):
+    fields = request.GET.get("fields", "")
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    try:
+        return serializer_class(names)
+    except ValueError as error:
+        raise ApiError(HTTPStatus.BAD_REQUEST, str(error))
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get("limit", settings.API_PAGE_SIZE))
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "limit должен быть числом")
+    return min(max(limit, 1), settings.API_MAX_PAGE_SIZE)
+
+
+def _page(
+    request, queryset, serializer_class, paginator_class=CursorPaginator
+):
+    """Страница по курсору: results, next_cursor и previous_cursor."""
+    serializer = _serializer(request, serializer_class)
+    rows = serializer.rows(queryset).order_by(f"-{serializer.key}", "-pk")
+    paginator = paginator_class(rows, _limit(request), key=serializer.key)
+    try:
+        page = paginator.page(request.GET.get("cursor"))
+    except InvalidPage as error:
+        raise ApiError(HTTPStatus.BAD_REQUEST, str(error))
+    return JsonResponse(
+        {
+            "results": [serializer.dump(row) for row in page],
+            "next_cursor": paginator.next_cursor,
+            "previous_cursor": paginator.previous_cursor,
+        }
+    )
+
+
+def _one(request, queryset, serializer_class, status=HTTPStatus.OK):
+    serializer = _serializer(request, serializer_class)
+    rows = list(serializer.rows(queryset)[:1])
+    if not rows:
+        raise Http404
+    return JsonResponse(serializer.dump(rows[0]), status=status)
+
+
+def _payload(request):
+    """Данные запроса: объект JSON или поля формы с файлами."""
+    if request.content_type != "application/json":
+        return request.POST, request.FILES
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Некорректный JSON")
+    if not isinstance(data, dict):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Ожидается объект JSON")
+    return data, None
+
+
+def _validate(form):
+    if not form.is_valid():
+        raise ApiError(
+            HTTPStatus.BAD_REQUEST,
+            "Ошибка в данных",
+            errors=form.errors.get_json_data(),
+        )
+
+
+def _save_post(request, post, status=HTTPStatus.OK):
+    data, files = _payload(request)
+    if post.pk is not None:
+        # PATCH: неуказанные поля остаются прежними.
+        group = post.group.slug if post.group else None
+        data = {"text": post.text, "group": group, **data}
+    form = ApiPostForm(data, files, instance=post)
+    _validate(form)
+    form.save()
+    return _one(
+        request, Post.objects.filter(pk=post.pk), PostSerializer, status
+    )
+
+
+@api_view("GET", "POST")
+@condition(etag_func=_etag("all", "groups", "follows"))
+def post_list(request):
+    """Посты: ?group=, ?author=, ?feed=follow; POST — новый пост."""
+    if request.method == "POST":
+        return _save_post(
+            request, Post(author=request.user), HTTPStatus.CREATED
+        )
+    posts = Post.objects.all()
+    paginator_class = CursorPaginator
+    if request.GET.get("feed") == "follow":
+        if not request.user.is_authenticated:
+            raise ApiError(HTTPStatus.UNAUTHORIZED, "Нужна авторизация")
+        posts = timeline_posts(request.user)
+        paginator_class = partial(TimelinePaginator, user=request.user)
+    if request.GET.get("group"):
+        posts = posts.filter(group__slug=request.GET["group"])
+    if request.GET.get("author"):
+        posts = posts.filter(author__username=request.GET["author"])
+    return _page(request, posts, PostSerializer, paginator_class)
+
+
+@api_view("GET", "PATCH", "DELETE")
+@condition(etag_func=_etag("all", "groups"))
+def post_detail(request, post_id):
+    if request.method in SAFE_METHODS:
+        return _one(request, Post.objects.filter(pk=post_id), PostSerializer)
+    post = get_object_or_404(Post.objects.select_related("group"), pk=post_id)
+    if post.author_id != request.user.pk:
+        raise ApiError(HTTPStatus.FORBIDDEN, "Пост может менять только автор")
+    if request.method == "DELETE":
+        post.delete()
+        return HttpResponse(status=HTTPStatus.NO_CONTENT)
+    return _save_post(request, post)
+
+
+@api_view("GET", "POST")
+@condition(etag_func=_etag("all"))
+def comment_list(request, post_id):
+    post = get_object_or_404(Post.objects.only("pk"), pk=post_id)
+    if request.method == "POST":
+        data, _ = _payload(request)
+        form = CommentForm(data)
+        _validate(form)
+        comment = form.save(commit=False)
+        comment.author = request.user
+        comment.post = post
+        comment.save()
+        return _one(
+            request,
+            Comment.objects.filter(pk=comment.pk),
+            CommentSerializer,
+            HTTPStatus.CREATED,
+        )
+    return _page(request, post.comments.all(), CommentSerializer)
+
+
+@api_view("GET")
+@condition(etag_func=_etag("groups"))
+def group_list(request):
+    return _page(request, Group.objects.all(), GroupSerializer)
+
+
+@api_view("GET")
+@condition(etag_func=_etag("groups"))
+def group_detail(request, slug):
+    return _one(request, Group.objects.filter(slug=slug), GroupSerializer)
+
+
+def _bulk_follow(request, data):
+    names = data.get("authors")
+    if not isinstance(names, list) or not all(
+        isinstance(name, str) for name in names
+    ):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "authors — список имён")
+    if len(names) > settings.API_BULK_LIMIT:
+        raise ApiError(
+            HTTPStatus.BAD_REQUEST,
+            f"Не больше {settings.API_BULK_LIMIT} авторов за запрос",
+        )
+    ids = dict(
+        User.objects.filter(username__in=names).values_list("username", "pk")
+    )
+    unknown = [name for name in names if name not in ids]
+    pairs = [(request.user.pk, pk) for pk in ids.values()]
+    if request.method == "DELETE":
+        return JsonResponse(
+            {"deleted": bulk_unfollow(pairs), "unknown": unknown}
+        )
+    created = bulk_follow(pairs)["created"]
+    return JsonResponse(
+        {"created": created, "unknown": unknown},
+        status=HTTPStatus.CREATED if created else HTTPStatus.OK,
+    )
+
+
+@api_view("GET", "POST", "DELETE")
+@condition(etag_func=_etag("follows"))
+def follow_list(request):
+    """Подписки пользователя.
+
+    POST {"author": имя} — подписаться, {"authors": [имена]} — на всех
+    сразу; DELETE {"authors": [имена]} — отписаться от них.
+    """
+    if not request.user.is_authenticated:
+        raise ApiError(HTTPStatus.UNAUTHORIZED, "Нужна авторизация")
+    if request.method == "GET":
+        return _page(request, request.user.follower.all(), FollowSerializer)
+    data, _ = _payload(request)
+    if request.method == "DELETE" or "authors" in data:
+        return _bulk_follow(request, data)
+    author = get_object_or_404(User, username=data.get("author") or "")
+    if author == request.user:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Нельзя подписаться на себя")
+    follow, created = Follow.objects.get_or_create(
+        user=request.user, author=author
+    )
+    return _one(
+        request,
+        Follow.objects.filter(pk=follow.pk),
+        FollowSerializer,
+        HTTPStatus.CREATED if created else HTTPStatus.OK,
+    )
+
+
+@api_view("GET", "DELETE")
+def follow_detail(request, username):
+    if not request.user.is_authenticated:
+        raise ApiError(HTTPStatus.UNAUTHORIZED, "Нужна авторизация")
+    follow = get_object_or_404(
+        Follow, user=request.user, author__username=username
+    )
+    if request.method == "DELETE":
+        follow.delete()
+        return HttpResponse(status=HTTPStatus.NO_CONTENT)
+    return _one(request, Follow.objects.filter(pk=follow.pk), FollowSerializer)
+
+
+@api_view("GET")
+def export(request, kind):
+    """Потоковая выгрузка для аналитики: ?format=, ?gzip=1, ?after=id."""
+    if not request.user.is_authenticated:
+        raise ApiError(HTTPStatus.UNAUTHORIZED, "Нужна авторизация")
+    if not request.user.is_staff:
+        raise ApiError(HTTPStatus.FORBIDDEN, "Выгрузка доступна персоналу")
+    if kind not in KINDS:
+        raise Http404
+    fmt = request.GET.get("format", "jsonl")
+    if fmt not in FORMATS:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "format: jsonl или csv")
+    try:
+        after = int(request.GET.get("after", 0))
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "after должен быть числом")
+    rows = Export(kind, fmt, request.GET.get("gzip") == "1", after)
+    response = StreamingHttpResponse(rows, content_type=rows.content_type)
+    response["Content-Disposition"] = f'attachment; filename="{rows.filename}"'
+    return response
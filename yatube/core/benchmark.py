@@ -0,0 +1,452 @@
+import asyncio
+import http.client
+import json
+import math
+import threading
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+from django.middleware.csrf import get_token
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from api.serializers import PostSerializer, image_url
+from posts.models import Post
+from yatube.handlers import ASGIHandler
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, p):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    rank = max(math.ceil(p / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def scenarios(user, post, group):
+    """Сценарии: имя, метод, адрес и данные формы для POST."""
+    return [
+        ("posts:index", "get", reverse("posts:index"), None),
+        (
+            "posts:group_list",
+            "get",
+            reverse("posts:group_list", args=[group.slug]),
+            None,
+        ),
+        (
+            "posts:profile",
+            "get",
+            reverse("posts:profile", args=[post.author.username]),
+            None,
+        ),
+        (
+            "posts:post_detail",
+            "get",
+            reverse("posts:post_detail", args=[post.pk]),
+            None,
+        ),
+        ("posts:follow_index", "get", reverse("posts:follow_index"), None),
+        (
+            "posts:post_create",
+            "post",
+            reverse("posts:post_create"),
+            {"text": "Пост из бенчмарка", "group": group.pk},
+        ),
+        (
+            "posts:add_comment",
+            "post",
+            reverse("posts:add_comment", args=[post.pk]),
+            {"text": "Комментарий из бенчмарка"},
+        ),
+    ]
+
+
+class TestClientTransport:
+    """Запросы через django.test.Client в текущем потоке."""
+
+    name = "client"
+
+    def __init__(self, user):
+        self.client = Client()
+        self.client.force_login(user)
+
+    def request(self, method, url, data):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data or {})
+        return response.status_code, len(response.content), len(queries)
+
+    def close(self):
+        pass
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class WSGITransport:
+    """Запросы по HTTP к WSGI-серверу, запущенному в этом же процессе."""
+
+    name = "wsgi"
+
+    def __init__(self, user):
+        login = Client()
+        login.force_login(user)
+        # get_token кладёт значение cookie в META запроса.
+        request = RequestFactory().get("/")
+        token = get_token(request)
+        cookies = SimpleCookie()
+        cookies[settings.SESSION_COOKIE_NAME] = login.cookies[
+            settings.SESSION_COOKIE_NAME
+        ].value
+        cookies[settings.CSRF_COOKIE_NAME] = request.META["CSRF_COOKIE"]
+        self.headers = {
+            "Cookie": cookies.output(header="", sep=";").strip(),
+            "X-CSRFToken": token,
+        }
+        self.queries = 0
+        self.server = make_server(
+            "127.0.0.1", 0, self._app, handler_class=_QuietHandler
+        )
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True
+        )
+        self.thread.start()
+        self.application = get_wsgi_application()
+
+    def _app(self, environ, start_response):
+        # Запросы считаются в потоке сервера: у него своё соединение.
+        with CaptureQueriesContext(connection) as queries:
+            response = self.application(environ, start_response)
+        self.queries = len(queries)
+        return response
+
+    def request(self, method, url, data):
+        conn = http.client.HTTPConnection(*self.server.server_address)
+        headers = dict(self.headers)
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        conn.request(method.upper(), url, body=body, headers=headers)
+        response = conn.getresponse()
+        content = response.read()
+        conn.close()
+        return response.status, len(content), self.queries
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+TRANSPORTS = {
+    TestClientTransport.name: TestClientTransport,
+    WSGITransport.name: WSGITransport,
+}
+
+
+def run(transport, user, post, group, iterations=20, warmup=2):
+    """Прогоняет все сценарии и возвращает сводку по каждому URL.
+
+    Для каждого сценария считаются перцентили задержки в мс, число
+    запросов к базе и размер ответа в байтах последнего прогона.
+    """
+    results = {}
+    # Без панели отладки: она встраивается в ответы с DEBUG = True.
+    with override_settings(DEBUG=False):
+        client = TRANSPORTS[transport](user)
+        try:
+            for name, method, url, data in scenarios(user, post, group):
+                timings = []
+                for i in range(warmup + iterations):
+                    started = time.perf_counter()
+                    status, size, queries = client.request(method, url, data)
+                    elapsed = (time.perf_counter() - started) * 1000
+                    if status >= 400:
+                        raise RuntimeError(f"{name}: ответ {status}")
+                    if i >= warmup:
+                        timings.append(elapsed)
+                results[name] = {
+                    **{
+                        f"p{p}": round(percentile(timings, p), 3)
+                        for p in PERCENTILES
+                    },
+                    "queries": queries,
+                    "bytes": size,
+                }
+        finally:
+            client.close()
+    return results
+
+
+def _hammer(send, deadline, samples, errors):
+    """Повторяет send(i) до deadline, собирая задержки и ошибки."""
+    i = 0
+    try:
+        while time.perf_counter() < deadline:
+            i += 1
+            started = time.perf_counter()
+            try:
+                response = send(i)
+            except Exception as error:
+                # database is locked и подобные ошибки под нагрузкой.
+                errors.append(error)
+                continue
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+                continue
+            samples.append((time.perf_counter() - started) * 1000)
+    finally:
+        connection.close()
+
+
+def concurrency(user, post, readers=4, writers=2, duration=3.0):
+    """Чтение главной и поста, пока другие потоки пишут комментарии.
+
+    У каждого потока своё соединение с базой. Возвращает число чтений
+    и записей в секунду, p95 чтения в мс и число ошибок блокировки.
+    """
+    urls = [
+        reverse("posts:index"),
+        reverse("posts:post_detail", args=[post.pk]),
+    ]
+    comment_url = reverse("posts:add_comment", args=[post.pk])
+    data = {"text": "Комментарий из бенчмарка"}
+    senders = {"read": [], "write": []}
+    for _ in range(readers):
+        client = Client()
+        senders["read"].append(
+            lambda i, client=client: client.get(urls[i % len(urls)])
+        )
+    for _ in range(writers):
+        client = Client()
+        client.force_login(user)
+        senders["write"].append(
+            lambda i, client=client: client.post(comment_url, data)
+        )
+    timings = {"read": [], "write": []}
+    errors = []
+    # Потоки открывают свои соединения, общее не должно держать блокировок.
+    connections.close_all()
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(
+            target=_hammer, args=(send, deadline, timings[kind], errors)
+        )
+        for kind, sends in senders.items()
+        for send in sends
+    ]
+    with override_settings(DEBUG=False):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return {
+        "reads_per_second": round(len(timings["read"]) / duration, 1),
+        "writes_per_second": round(len(timings["write"]) / duration, 1),
+        "read_p95": round(percentile(timings["read"] or [0], 95), 3),
+        "errors": len(errors),
+    }
+
+
+def _instance_dump(post):
+    return {
+        "id": post.pk,
+        "text": post.text,
+        "pub_date": post.pub_date,
+        "author": post.author.username,
+        "group": post.group.slug if post.group else None,
+        "image": image_url(post.image.name),
+        "comments_count": post.comments_count,
+    }
+
+
+def serialization(rows=1000, repeat=5):
+    """Строк в секунду при сериализации постов в JSON, лучший прогон.
+
+    values — путь API: словари из .values() с JOIN автора и группы;
+    instances — объекты моделей из for_feed(), как в шаблонах.
+    """
+    serializer = PostSerializer()
+    paths = {
+        "values": lambda: [
+            serializer.dump(row)
+            for row in serializer.rows(Post.objects.all())[:rows]
+        ],
+        "instances": lambda: [
+            _instance_dump(post) for post in Post.objects.for_feed()[:rows]
+        ],
+    }
+    results = {}
+    for name, build in paths.items():
+        best = math.inf
+        for _ in range(repeat):
+            started = time.perf_counter()
+            dumped = build()
+            json.dumps(dumped, cls=DjangoJSONEncoder)
+            best = min(best, time.perf_counter() - started)
+        results[name] = round(len(dumped) / best)
+    return results
+
+
+def _wsgi_get(application, url):
+    environ = {"PATH_INFO": url}
+    setup_testing_defaults(environ)
+    statuses = []
+    response = application(
+        environ, lambda status, headers, exc_info=None: statuses.append(status)
+    )
+    try:
+        b"".join(response)
+    finally:
+        response.close()
+    return int(statuses[0].split()[0])
+
+
+async def _asgi_get(application, url):
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": url,
+        "query_string": b"",
+        "headers": [(b"host", b"127.0.0.1")],
+        "server": ("127.0.0.1", 80),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+    return messages[0]["status"]
+
+
+def _summary(timings, errors, elapsed, threads):
+    return {
+        "requests_per_second": round(len(timings) / elapsed, 1),
+        "p95": round(percentile(timings or [0], 95), 3),
+        "errors": errors,
+        "threads": threads,
+    }
+
+
+def _wsgi_throughput(url, clients, requests):
+    application = get_wsgi_application()
+    timings, errors = [], []
+
+    def client():
+        try:
+            for _ in range(requests):
+                started = time.perf_counter()
+                if _wsgi_get(application, url) >= 400:
+                    errors.append(url)
+                    continue
+                timings.append((time.perf_counter() - started) * 1000)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return _summary(timings, len(errors), elapsed, clients)
+
+
+def _asgi_throughput(url, clients, requests, threads):
+    application = ASGIHandler(threads)
+    timings, errors = [], []
+
+    async def client():
+        for _ in range(requests):
+            started = time.perf_counter()
+            if await _asgi_get(application, url) >= 400:
+                errors.append(url)
+                continue
+            timings.append((time.perf_counter() - started) * 1000)
+
+    async def main():
+        await asyncio.gather(*(client() for _ in range(clients)))
+
+    started = time.perf_counter()
+    try:
+        asyncio.run(main())
+    finally:
+        # Соединения потоков пула закрываются вместе с потоками.
+        application.executor.shutdown(wait=True)
+    elapsed = time.perf_counter() - started
+    return _summary(timings, len(errors), elapsed, threads)
+
+
+def throughput(urls, clients=32, requests=20, threads=8):
+    """Пропускная способность WSGI и ASGI при clients клиентах.
+
+    WSGI держит поток на каждое соединение, как потоковый сервер;
+    ASGI обслуживает всех клиентов одним циклом событий и пулом из
+    threads потоков. Для каждого адреса — запросов в секунду, p95 в
+    мс, ошибки и число потоков, занятых запросами.
+    """
+    results = {}
+    # Без кэша целых страниц: замеряется работа представлений.
+    with override_settings(DEBUG=False, PAGE_CACHE_VIEWS=[]):
+        # Новые потоки открывают свои соединения с базой.
+        connections.close_all()
+        for name, url in urls.items():
+            results[name] = {
+                "wsgi": _wsgi_throughput(url, clients, requests),
+                "asgi": _asgi_throughput(url, clients, requests, threads),
+            }
+    return results
+
+
+def compare(results, baseline, tolerance=0.25):
+    """Регрессии относительно базовой линии.
+
+    Задержка p95 может вырасти не больше чем на долю tolerance, число
+    запросов к базе расти не может вовсе.
+    """
+    regressions = []
+    for transport, urls in results.items():
+        for name, current in urls.items():
+            previous = baseline.get(transport, {}).get(name)
+            if previous is None:
+                continue
+            if current["queries"] > previous["queries"]:
+                regressions.append(
+                    f"{transport} {name}: запросов {previous['queries']}"
+                    f" -> {current['queries']}"
+                )
+            if current["p95"] > previous["p95"] * (1 + tolerance):
+                regressions.append(
+                    f"{transport} {name}: p95 {previous['p95']} мс"
+                    f" -> {current['p95']} мс"
+                )
+    return regressions
+
+
+def load_baseline(path):
+    try:
+        with open(path) as baseline:
+            return json.load(baseline)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, results):
+    with open(path, "w") as baseline:
+        json.dump(results, baseline, indent=2, sort_keys=True)
+        baseline.write("\n")
@@ -0,0 +1,5 @@
+from django.conf import settings
+
+
+def feed_cache_timeout(request):
+    return {"feed_cache_timeout": settings.FEED_CACHE_TIMEOUT}
@@ -0,0 +1,142 @@
+import json
+import logging
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Node
+
+logger = logging.getLogger("yatube.queries")
+
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"IN \(\?(?:, \?)*\)")
+_SPACES = re.compile(r"\s+")
+_RENDER_ANNOTATED = Node.render_annotated.__code__
+_HERE = os.path.abspath(__file__)
+# Служебные запросы транзакций не считаются повторами и медленными.
+_SERVICE = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+def shape(sql):
+    """SQL без значений: одинаковые по форме запросы совпадают."""
+    sql = _STRINGS.sub("?", sql)
+    sql = _NUMBERS.sub("?", sql.replace("%s", "?"))
+    sql = _IN_LIST.sub("IN (...)", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+def origin():
+    """Строка шаблона и кадр кода проекта, откуда пришёл запрос."""
+    template = code = None
+    frame = sys._getframe(1)
+    while frame is not None and (template is None or code is None):
+        if template is None and frame.f_code is _RENDER_ANNOTATED:
+            node = frame.f_locals.get("self")
+            token = getattr(node, "token", None)
+            source = getattr(node, "origin", None)
+            if token is not None and source is not None:
+                template = f"{source.template_name}:{token.lineno}"
+        filename = frame.f_code.co_filename
+        if (
+            code is None
+            and filename.startswith(settings.BASE_DIR)
+            and filename != _HERE
+            and "site-packages" not in filename
+        ):
+            code = (
+                f"{os.path.relpath(filename, settings.BASE_DIR)}:"
+                f"{frame.f_lineno} in {frame.f_code.co_name}"
+            )
+        frame = frame.f_back
+    return template, code
+
+
+class Inspection:
+    """Запросы к базе за время одного HTTP-запроса.
+
+    Запросы группируются по форме SQL; группа, повторённая больше
+    NPLUSONE_THRESHOLD раз, считается N+1. Запросы дольше
+    SLOW_QUERY_SECONDS попадают в журнал медленных.
+    """
+
+    def __init__(self):
+        self.shapes = defaultdict(list)
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.startswith(_SERVICE):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            template, code = origin()
+            self.shapes[shape(sql)].append((template, code))
+            if duration >= settings.SLOW_QUERY_SECONDS:
+                self.slow.append(
+                    {
+                        "sql": sql,
+                        "seconds": round(duration, 6),
+                        "database": context["connection"].alias,
+                        "template": template,
+                        "code": code,
+                    }
+                )
+
+    @contextmanager
+    def watching(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    def repeated(self):
+        """Группы N+1: форма, число повторов и первое место вызова."""
+        return [
+            {
+                "sql": sql,
+                "count": len(calls),
+                "template": calls[0][0],
+                "code": calls[0][1],
+            }
+            for sql, calls in self.shapes.items()
+            if len(calls) > settings.NPLUSONE_THRESHOLD
+        ]
+
+    def report(self, view):
+        """Пишет события в журнал; с QUERY_INSPECTION_RAISE падает на N+1."""
+        for query in self.slow:
+            logger.warning(
+                json.dumps(
+                    {"event": "slow_query", "view": view, **query},
+                    ensure_ascii=False,
+                )
+            )
+        repeated = self.repeated()
+        for group in repeated:
+            logger.warning(
+                json.dumps(
+                    {"event": "n_plus_one", "view": view, **group},
+                    ensure_ascii=False,
+                )
+            )
+        if repeated and settings.QUERY_INSPECTION_RAISE:
+            raise NPlusOneError(
+                f"{view}: "
+                + "; ".join(
+                    f"{group['count']}× {group['sql']} "
+                    f"({group['template'] or group['code']})"
+                    for group in repeated
+                )
+            )
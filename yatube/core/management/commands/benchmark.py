@@ -0,0 +1,260 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Count
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from core import benchmark
+from posts.models import Group, Post, User
+from posts.seeding import seed
+
+# Масштаб «как в продакшене» для --full.
+FULL_SCALE = {
+    "users": 100_000,
+    "groups": 500,
+    "posts": 5_000_000,
+    "comments": 5_000_000,
+    "follows": 2_000_000,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет задержку, число запросов и размер ответа основных "
+        "страниц на синтетических данных во временной базе"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--groups", type=int, default=20)
+        parser.add_argument("--posts", type=int, default=20000)
+        parser.add_argument("--comments", type=int, default=20000)
+        parser.add_argument("--follows", type=int, default=20000)
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="100 тыс. пользователей и 5 млн постов",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument(
+            "--transport",
+            action="append",
+            choices=sorted(benchmark.TRANSPORTS),
+            help="client и/или wsgi, по умолчанию оба",
+        )
+        parser.add_argument(
+            "--baseline",
+            default=os.path.join(settings.BASE_DIR, "benchmark.json"),
+            help="Файл базовой линии",
+        )
+        parser.add_argument(
+            "--save-baseline",
+            action="store_true",
+            help="Записать результаты как новую базовую линию",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.25,
+            help="Допустимый рост p95, доля",
+        )
+        parser.add_argument(
+            "--concurrency",
+            action="store_true",
+            help="Чтение при параллельной записи для профилей SQLite",
+        )
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--writers", type=int, default=2)
+        parser.add_argument("--duration", type=float, default=3.0)
+        parser.add_argument(
+            "--serialization",
+            action="store_true",
+            help="Строк в секунду при сериализации постов в JSON",
+        )
+        parser.add_argument("--rows", type=int, default=1000)
+        parser.add_argument(
+            "--asgi",
+            action="store_true",
+            help="Пропускная способность WSGI и ASGI под нагрузкой",
+        )
+        parser.add_argument("--clients", type=int, default=32)
+        parser.add_argument(
+            "--threads", type=int, default=settings.ASGI_THREADS
+        )
+
+    def handle(self, *args, **options):
+        scale = {
+            name: options[name]
+            for name in ("users", "groups", "posts", "comments", "follows")
+        }
+        if options["full"]:
+            scale = FULL_SCALE
+        if options["concurrency"]:
+            self.concurrency(scale, options)
+            return
+        if options["asgi"]:
+            self.asgi(scale, options)
+            return
+        if options["serialization"]:
+            self.serialization(scale, options)
+            return
+        transports = options["transport"] or sorted(benchmark.TRANSPORTS)
+        with self.database(scale, options):
+            user = User.objects.order_by("-stats__following_count").first()
+            post = Post.objects.order_by("-comments_count", "pk").first()
+            group = (
+                Group.objects.annotate(total=Count("posts"))
+                .order_by("-total", "pk")
+                .first()
+            )
+            results = {
+                transport: benchmark.run(
+                    transport,
+                    user,
+                    post,
+                    group,
+                    options["iterations"],
+                    options["warmup"],
+                )
+                for transport in transports
+            }
+        self.report(results)
+
+        if options["save_baseline"]:
+            benchmark.save_baseline(options["baseline"], results)
+            self.stdout.write(
+                f"Базовая линия записана в {options['baseline']}"
+            )
+            return
+        baseline = benchmark.load_baseline(options["baseline"])
+        if baseline is None:
+            return
+        regressions = benchmark.compare(
+            results, baseline, options["tolerance"]
+        )
+        if regressions:
+            raise CommandError("Регрессии:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS("Регрессий нет"))
+
+    def database(self, scale, options):
+        # Рабочая база не затрагивается: данные живут во временной.
+        # Миллионы строк --full держим в файле, а не в памяти.
+        if options["full"]:
+            return self.file_database(scale, options)
+        return self.memory_database(scale, options)
+
+    @contextmanager
+    def memory_database(self, scale, options):
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            seed(seed=options["seed"], **scale)
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    @contextmanager
+    def file_database(self, scale, options):
+        # Потокам нужна общая база в файле, а не в памяти.
+        directory = tempfile.mkdtemp()
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(
+            directory, "benchmark.sqlite3"
+        )
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            seed(seed=options["seed"], **scale)
+            yield
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def concurrency(self, scale, options):
+        with self.file_database(scale, options):
+            user = User.objects.order_by("pk").first()
+            post = Post.objects.order_by("-comments_count", "pk").first()
+            self.stdout.write(
+                f"{'профиль':<10}{'чтений/с':>10}{'записей/с':>11}"
+                f"{'p95 чтения':>12}{'ошибки':>8}"
+            )
+            for profile in settings.SQLITE_PROFILES:
+                with override_settings(SQLITE_PROFILE=profile):
+                    # Новые соединения откроются с PRAGMA профиля.
+                    connections.close_all()
+                    row = benchmark.concurrency(
+                        user,
+                        post,
+                        options["readers"],
+                        options["writers"],
+                        options["duration"],
+                    )
+                self.stdout.write(
+                    f"{profile:<10}{row['reads_per_second']:>10}"
+                    f"{row['writes_per_second']:>11}"
+                    f"{row['read_p95']:>12.2f}{row['errors']:>8}"
+                )
+
+    def asgi(self, scale, options):
+        with self.file_database(scale, options):
+            user = User.objects.order_by("-stats__posts_count").first()
+            group = Group.objects.order_by("pk").first()
+            urls = {
+                "posts:index": reverse("posts:index"),
+                "posts:group_list": reverse(
+                    "posts:group_list", args=[group.slug]
+                ),
+                "posts:profile": reverse(
+                    "posts:profile", args=[user.username]
+                ),
+            }
+            results = benchmark.throughput(
+                urls,
+                options["clients"],
+                options["iterations"],
+                options["threads"],
+            )
+        self.stdout.write(
+            f"{'страница':<20}{'сервер':<8}{'запросов/с':>12}"
+            f"{'p95':>10}{'потоки':>8}{'ошибки':>8}"
+        )
+        for name, servers in results.items():
+            for server, row in servers.items():
+                self.stdout.write(
+                    f"{name:<20}{server:<8}{row['requests_per_second']:>12}"
+                    f"{row['p95']:>10.2f}{row['threads']:>8}"
+                    f"{row['errors']:>8}"
+                )
+
+    def serialization(self, scale, options):
+        with self.database(scale, options):
+            results = benchmark.serialization(
+                options["rows"], options["iterations"]
+            )
+        self.stdout.write(f"{'путь':<12}{'строк/с':>10}")
+        for name, rows_per_second in results.items():
+            self.stdout.write(f"{name:<12}{rows_per_second:>10}")
+
+    def report(self, results):
+        header = (
+            f"{'транспорт':<10}{'страница':<20}{'p50':>9}{'p95':>9}"
+            f"{'p99':>9}{'запросы':>9}{'байты':>9}"
+        )
+        self.stdout.write(header)
+        for transport, urls in results.items():
+            for name, row in urls.items():
+                self.stdout.write(
+                    f"{transport:<10}{name:<20}{row['p50']:>9.2f}"
+                    f"{row['p95']:>9.2f}{row['p99']:>9.2f}"
+                    f"{row['queries']:>9}{row['bytes']:>9}"
+                )
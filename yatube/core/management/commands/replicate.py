@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.replication import Replicator
+
+
+class Command(BaseCommand):
+    help = (
+        "Синхронизирует реплики SQLite из DATABASE_REPLICAS с основной базой"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Синхронизировать один раз и выйти",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Пауза между проверками основной базы, с",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError("Реплики не заданы: DATABASE_REPLICAS")
+        replicator = Replicator(
+            settings.DATABASES["default"]["NAME"],
+            (
+                settings.DATABASES[alias]["NAME"]
+                for alias in settings.DATABASE_REPLICAS
+            ),
+        )
+        try:
+            replicator.run(options["interval"], options["once"])
+        finally:
+            replicator.close()
@@ -0,0 +1,43 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.queue import work
+
+
+class Command(BaseCommand):
+    help = "Выполняет фоновые задачи из очереди"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes", type=int, default=1, help="Число процессов"
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Выполнить накопившиеся задачи и выйти",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Пауза между опросами пустой очереди, с",
+        )
+
+    def handle(self, *args, **options):
+        once, interval = options["once"], options["interval"]
+        if options["processes"] == 1:
+            work(once, interval)
+            return
+        # Соединения с базой не должны переходить в дочерние процессы.
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        workers = [
+            context.Process(target=work, args=(once, interval))
+            for _ in range(options["processes"])
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
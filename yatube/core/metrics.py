@@ -0,0 +1,227 @@
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+# Границы корзин гистограммы задержки, в секундах.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+METRICS = {
+    "yatube_request_duration_seconds": (
+        "histogram",
+        "Время обработки запроса по имени URL.",
+    ),
+    "yatube_requests_total": ("counter", "Число запросов по имени URL."),
+    "yatube_db_queries_total": ("counter", "Число запросов к базе."),
+    "yatube_db_query_seconds_total": ("counter", "Время запросов к базе."),
+    "yatube_cache_hits_total": ("counter", "Попадания в кэш."),
+    "yatube_cache_misses_total": ("counter", "Промахи кэша."),
+    "yatube_template_render_seconds_total": (
+        "counter",
+        "Время отрисовки шаблонов.",
+    ),
+}
+
+# Счётчики на текущий запрос: запросы к базе, кэш и шаблоны.
+REQUEST_COUNTERS = {
+    "db_queries": "yatube_db_queries_total",
+    "db_seconds": "yatube_db_query_seconds_total",
+    "cache_hits": "yatube_cache_hits_total",
+    "cache_misses": "yatube_cache_misses_total",
+    "template_seconds": "yatube_template_render_seconds_total",
+}
+
+# У каждого потока свой словарь: запись идёт без блокировок, при
+# чтении словари всех потоков складываются.
+_local = threading.local()
+_shards = []
+_flushed = {"at": 0.0}
+
+
+def _shard():
+    shard = getattr(_local, "shard", None)
+    if shard is None:
+        shard = _local.shard = defaultdict(float)
+        _shards.append(shard)
+    return shard
+
+
+def begin_request():
+    _local.current = defaultdict(float)
+
+
+def add(name, value=1):
+    """Прибавляет значение к счётчику текущего запроса, если он идёт."""
+    current = getattr(_local, "current", None)
+    if current is not None:
+        current[name] += value
+
+
+def end_request(view, status, seconds):
+    """Переносит счётчики запроса в метрики с меткой view."""
+    current = getattr(_local, "current", None) or {}
+    _local.current = None
+    shard = _shard()
+    labels = (("view", view),)
+    shard[("yatube_requests_total", labels + (("status", str(status)),))] += 1
+    for le in BUCKETS:
+        if seconds <= le:
+            bucket = labels + (("le", str(le)),)
+            shard[("yatube_request_duration_seconds_bucket", bucket)] += 1
+    shard[
+        ("yatube_request_duration_seconds_bucket", labels + (("le", "+Inf"),))
+    ] += 1
+    shard[("yatube_request_duration_seconds_sum", labels)] += seconds
+    shard[("yatube_request_duration_seconds_count", labels)] += 1
+    for name, metric in REQUEST_COUNTERS.items():
+        shard[(metric, labels)] += current.get(name, 0)
+    flush()
+
+
+def snapshot():
+    """Сумма счётчиков всех потоков этого процесса."""
+    totals = defaultdict(float)
+    for shard in list(_shards):
+        for key, value in list(shard.items()):
+            totals[key] += value
+    return totals
+
+
+def _path(pid):
+    return os.path.join(settings.METRICS_DIR, f"{pid}.json")
+
+
+def _read(path):
+    with open(path) as source:
+        return {
+            (metric, tuple(tuple(pair) for pair in labels)): value
+            for metric, labels, value in json.load(source)
+        }
+
+
+def _write(path, totals):
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary, "w") as target:
+        json.dump(
+            [
+                [metric, [list(pair) for pair in labels], value]
+                for (metric, labels), value in totals.items()
+            ],
+            target,
+        )
+    # Переименование атомарно: читатели не видят недописанный файл.
+    os.replace(temporary, path)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _retire_dead():
+    """Сливает снимки завершённых процессов в общий retired.json.
+
+    Счётчики Prometheus не должны убывать, поэтому снимок ушедшего
+    воркера не удаляется, а прибавляется к итогу; файлов при этом не
+    становится больше, чем живых процессов.
+    """
+    retired = os.path.join(settings.METRICS_DIR, "retired.json")
+    with open(os.path.join(settings.METRICS_DIR, "retired.lock"), "w") as lock:
+        # Под блокировкой один снимок не сольют два процесса сразу.
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        dead = []
+        for path in glob.glob(os.path.join(settings.METRICS_DIR, "*.json")):
+            pid = os.path.basename(path)[: -len(".json")]
+            if pid.isdigit() and not _alive(int(pid)):
+                dead.append(path)
+        if not dead:
+            return
+        totals = defaultdict(float)
+        for path in [retired, *dead]:
+            try:
+                for key, value in _read(path).items():
+                    totals[key] += value
+            except (OSError, ValueError):
+                continue
+        _write(retired, totals)
+        for path in dead:
+            os.remove(path)
+
+
+def flush(force=False):
+    """Сохраняет снимок процесса в METRICS_DIR не чаще интервала."""
+    if not settings.METRICS_DIR:
+        return
+    now = time.monotonic()
+    if not force and now - _flushed["at"] < settings.METRICS_FLUSH_INTERVAL:
+        return
+    _flushed["at"] = now
+    _write(_path(os.getpid()), snapshot())
+
+
+def collect():
+    """Метрики всех процессов: снимки из METRICS_DIR и живые свои."""
+    totals = snapshot()
+    if not settings.METRICS_DIR:
+        return totals
+    _retire_dead()
+    own = _path(os.getpid())
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, "*.json")):
+        if path == own:
+            continue
+        try:
+            rows = _read(path)
+        except (OSError, ValueError):
+            continue
+        for key, value in rows.items():
+            totals[key] += value
+    return totals
+
+
+def _family(metric):
+    for suffix in ("_bucket", "_sum", "_count"):
+        if metric.endswith(suffix) and metric[: -len(suffix)] in METRICS:
+            return metric[: -len(suffix)]
+    return metric
+
+
+def _format(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def _order(row):
+    # Корзины одной гистограммы идут по возрастанию le, "+Inf" — последней.
+    metric, labels, _ = row
+    le = dict(labels).get("le")
+    return (
+        metric,
+        tuple(pair for pair in labels if pair[0] != "le"),
+        float(le) if le is not None else 0.0,
+    )
+
+
+def render(totals=None):
+    """Метрики в текстовом формате Prometheus."""
+    if totals is None:
+        totals = collect()
+    families = defaultdict(list)
+    for (metric, labels), value in totals.items():
+        families[_family(metric)].append((metric, labels, value))
+    lines = []
+    for family, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {family} {help_text}")
+        lines.append(f"# TYPE {family} {kind}")
+        for metric, labels, value in sorted(families[family], key=_order):
+            pairs = ",".join(f'{name}="{label}"' for name, label in labels)
+            lines.append(f"{metric}{{{pairs}}} {_format(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,207 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from core import metrics, pagecache, replication
+from core.inspector import Inspection
+from yatube.backends.sqlite3.base import immediate_transactions
+from yatube.routers import replica_reads
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def view_name(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match else "unresolved"
+
+
+def _count_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add("db_queries")
+        metrics.add("db_seconds", time.perf_counter() - started)
+
+
+class MetricsMiddleware:
+    """Задержка, запросы к базе, кэш и шаблоны по имени URL.
+
+    Должен стоять первым, чтобы время включало остальные middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics.begin_request()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(_count_query)
+                    )
+                response = self.get_response(request)
+        except Exception:
+            self.finish(request, 500, started)
+            raise
+        self.finish(request, response.status_code, started)
+        return response
+
+    @staticmethod
+    def finish(request, status, started):
+        metrics.end_request(
+            view_name(request), status, time.perf_counter() - started
+        )
+
+
+class QueryInspectorMiddleware:
+    """Ищет N+1 и медленные запросы в доле QUERY_INSPECTION_RATE."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.QUERY_INSPECTION_RATE
+        if not rate or random.random() >= rate:
+            return self.get_response(request)
+        with Inspection().watching() as inspection:
+            response = self.get_response(request)
+        inspection.report(view_name(request))
+        return response
+
+
+class ReplicaMiddleware:
+    """Безопасные запросы читают с реплик, остальные — с основной базы.
+
+    После изменяющего запроса в куку REPLICA_PIN_COOKIE пишется позиция
+    записи. Пока кука есть, пользователь читает только с реплик, чья
+    позиция не меньше, а если таких нет — с основной базы, и всегда
+    видит свои записи. Когда догоняют все реплики, кука удаляется.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        safe = request.method in SAFE_METHODS
+        pinned = settings.REPLICA_PIN_COOKIE in request.COOKIES
+        aliases = self.caught_up(request) if safe else []
+        with replica_reads(bool(aliases), aliases):
+            response = self.get_response(request)
+        if not settings.DATABASE_REPLICAS:
+            return response
+        if not safe:
+            # Транзакция запроса уже зафиксирована: реплика, проверенная
+            # позже этого момента, содержит запись.
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                repr(time.time()),
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        elif pinned and aliases == settings.DATABASE_REPLICAS:
+            response.delete_cookie(settings.REPLICA_PIN_COOKIE)
+        return response
+
+    @staticmethod
+    def caught_up(request):
+        """Реплики, в которых уже есть последняя запись пользователя."""
+        replicas = settings.DATABASE_REPLICAS
+        pin = request.COOKIES.get(settings.REPLICA_PIN_COOKIE)
+        if pin is None:
+            return replicas
+        try:
+            written = float(pin)
+        except ValueError:
+            return []
+        return [
+            alias
+            for alias in replicas
+            if replication.position(settings.DATABASES[alias]["NAME"])
+            >= written
+        ]
+
+
+class WriteTransactionMiddleware:
+    """Изменяющий запрос — одна транзакция, начатая BEGIN IMMEDIATE.
+
+    Безопасные запросы транзакцию не открывают: отложенная транзакция,
+    которая начала с чтения и перешла к записи, не ждёт busy_timeout.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method in SAFE_METHODS:
+            return self.get_response(request)
+        with immediate_transactions(), transaction.atomic():
+            response = self.get_response(request)
+            if response.status_code >= 500:
+                # Исключение представления уже превращено в ответ 500.
+                transaction.set_rollback(True)
+            return response
+
+
+class PageCacheMiddleware:
+    """Отдаёт анонимным посетителям страницы из кэша целиком."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        regenerating = getattr(request, "page_cache", None)
+        if regenerating is None:
+            return response
+        key, version, started = regenerating
+        try:
+            if (
+                response.status_code == 200
+                and not response.streaming
+                and not response.cookies
+            ):
+                pagecache.store(key, version, response, started)
+        finally:
+            pagecache.unlock(key)
+        response["X-Page-Cache"] = "miss"
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not pagecache.cacheable(request):
+            return None
+        key = pagecache.page_key(request)
+        version = pagecache.current_version()
+        entry = pagecache.cache.get(key)
+        if entry is not None and pagecache.is_fresh(entry, version):
+            return self.serve(request, entry, "hit")
+        if pagecache.lock(key):
+            request.page_cache = (key, version, time.time())
+            return None
+        if entry is None:
+            entry = pagecache.wait(key)
+        if entry is None:
+            return None
+        return self.serve(request, entry, "stale")
+
+    @staticmethod
+    def serve(request, entry, state):
+        response = entry["response"]
+        response["X-Page-Cache"] = state
+        return get_conditional_response(
+            request,
+            etag=response.get("ETag"),
+            last_modified=parse_http_date_safe(
+                response.get("Last-Modified", "")
+            ),
+            response=response,
+        )
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0001_task"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="run_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now,
+                verbose_name="Запустить не раньше",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["status", "run_at"], name="task_run_at_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    PENDING = "pending"
+    RUNNING = "running"
+    FAILED = "failed"
+    STATUSES = (
+        (PENDING, "В очереди"),
+        (RUNNING, "Выполняется"),
+        (FAILED, "Ошибка"),
+    )
+
+    name = models.CharField("Задача", max_length=200)
+    args = models.TextField("Аргументы", default="[]")
+    status = models.CharField(
+        "Статус", max_length=10, choices=STATUSES, default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField("Попыток", default=0)
+    error = models.TextField("Ошибка", blank=True)
+    run_at = models.DateTimeField("Запустить не раньше", default=timezone.now)
+    created = models.DateTimeField("Создана", auto_now_add=True)
+    updated = models.DateTimeField("Изменена", auto_now=True)
+
+    class Meta:
+        ordering = ["pk"]
+        indexes = [
+            models.Index(fields=["status", "updated"], name="task_status_idx"),
+            models.Index(fields=["status", "run_at"], name="task_run_at_idx"),
+        ]
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,87 @@
+"""Кэш страниц целиком для анонимных посетителей.
+
+Запись хранит ответ, версию страниц на момент отрисовки, срок и
+время генерации. Пока срок не вышел, ответ отдаётся из кэша; ближе к
+сроку отдельные запросы обновляют его заранее с вероятностью, которая
+растёт со временем генерации (XFetch). Устаревшую или сброшенную
+мутацией постов страницу перерисовывает только владелец блокировки,
+остальные получают прежний ответ или ждут первой отрисовки.
+"""
+
+import hashlib
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from posts.caching import feed_version
+
+# Версия страниц, её меняют те же события, что и версии лент.
+VERSION_SCOPE = "pages"
+WAIT_STEP = 0.05
+
+
+def cacheable(request):
+    """GET без сессии к одному из PAGE_CACHE_VIEWS."""
+    match = request.resolver_match
+    return (
+        request.method in ("GET", "HEAD")
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and match is not None
+        and match.view_name in settings.PAGE_CACHE_VIEWS
+    )
+
+
+def page_key(request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f"page:{path}"
+
+
+def is_fresh(entry, version, now=None):
+    """Запись свежая: версия та же и XFetch не выбрал раннее обновление."""
+    if entry["version"] != version:
+        return False
+    now = time.time() if now is None else now
+    early = entry["delta"] * settings.PAGE_CACHE_BETA
+    return now - early * math.log(1 - random.random()) < entry["expires"]
+
+
+def lock(key):
+    return cache.add(f"{key}:lock", 1, settings.PAGE_CACHE_LOCK_TIMEOUT)
+
+
+def unlock(key):
+    cache.delete(f"{key}:lock")
+
+
+def wait(key):
+    """Ждёт, пока страницу отрисует владелец блокировки."""
+    deadline = time.monotonic() + settings.PAGE_CACHE_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_STEP)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def store(key, version, response, started):
+    now = time.time()
+    cache.set(
+        key,
+        {
+            "version": version,
+            "expires": now + settings.PAGE_CACHE_TIMEOUT,
+            "delta": now - started,
+            "response": response,
+        },
+        # Запись живёт дольше срока, чтобы её можно было отдать,
+        # пока новую версию отрисовывает владелец блокировки.
+        settings.PAGE_CACHE_TIMEOUT * 2,
+    )
+
+
+def current_version():
+    return feed_version(VERSION_SCOPE)
@@ -0,0 +1,35 @@
+"""Плагин pytest: тест падает, если в ответе на запрос появился N+1.
+
+Подключается через pytest_plugins; отключить для всего запуска можно
+флагом --no-nplusone, для отдельного теста — меткой allow_nplusone.
+"""
+
+import pytest
+from django.test import override_settings
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--no-nplusone",
+        action="store_true",
+        help="Не проверять запросы к базе на N+1",
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "allow_nplusone: не проверять этот тест на N+1"
+    )
+
+
+@pytest.fixture(autouse=True)
+def nplusone(request):
+    if request.config.getoption(
+        "no_nplusone"
+    ) or request.node.get_closest_marker("allow_nplusone"):
+        yield
+        return
+    with override_settings(
+        QUERY_INSPECTION_RATE=1, QUERY_INSPECTION_RAISE=True
+    ):
+        yield
@@ -0,0 +1,98 @@
+import json
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .models import Task
+
+registry = {}
+
+
+def task(func):
+    """Регистрирует функцию как фоновую задачу."""
+    registry[f"{func.__module__}.{func.__name__}"] = func
+    return func
+
+
+def enqueue(func, *args):
+    """Ставит задачу в очередь; в режиме TASKS_EAGER выполняет сразу."""
+    if settings.TASKS_EAGER:
+        return func(*args)
+    Task.objects.create(
+        name=f"{func.__module__}.{func.__name__}", args=json.dumps(args)
+    )
+
+
+def enqueue_many(func, args, batch_size=500):
+    """Ставит в очередь по задаче на каждый кортеж аргументов из args."""
+    if settings.TASKS_EAGER:
+        for item in args:
+            func(*item)
+        return
+    name = f"{func.__module__}.{func.__name__}"
+    Task.objects.bulk_create(
+        (Task(name=name, args=json.dumps(item)) for item in args),
+        batch_size=batch_size,
+    )
+
+
+def _claimable():
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.TASK_TIMEOUT)
+    return Task.objects.filter(
+        Q(status=Task.PENDING, run_at__lte=now)
+        | Q(status=Task.RUNNING, updated__lt=stale)
+    )
+
+
+def run_next():
+    """Выполняет одну задачу; False, если очередь пуста."""
+    candidate = _claimable().order_by("pk").first()
+    if candidate is None:
+        return False
+    claimed = (
+        _claimable()
+        .filter(pk=candidate.pk, updated=candidate.updated)
+        .update(
+            status=Task.RUNNING,
+            attempts=F("attempts") + 1,
+            updated=timezone.now(),
+        )
+    )
+    if not claimed:
+        # Задачу забрал другой воркер.
+        return True
+    candidate.refresh_from_db()
+    try:
+        registry[candidate.name](*json.loads(candidate.args))
+    except Exception:
+        failed = candidate.attempts >= settings.TASK_MAX_ATTEMPTS
+        now = timezone.now()
+        delay = settings.TASK_RETRY_DELAY * 2 ** (candidate.attempts - 1)
+        Task.objects.filter(pk=candidate.pk).update(
+            status=Task.FAILED if failed else Task.PENDING,
+            error=traceback.format_exc(),
+            run_at=now + timedelta(seconds=delay),
+            updated=now,
+        )
+    else:
+        Task.objects.filter(pk=candidate.pk).delete()
+    return True
+
+
+def work(once=False, interval=1.0):
+    """Цикл воркера: выполняет задачи, пока очередь не опустеет."""
+    autodiscover_modules("tasks")
+    while True:
+        close_old_connections()
+        if run_next():
+            continue
+        if once:
+            return
+        time.sleep(interval)
@@ -0,0 +1,64 @@
+import os
+import sqlite3
+import time
+
+
+def position(path):
+    """Позиция реплики: время, до которого в ней все записи основной базы.
+
+    0, если реплику ещё не синхронизировали.
+    """
+    try:
+        with open(f"{path}.position") as source:
+            return float(source.read())
+    except (OSError, ValueError):
+        return 0.0
+
+
+def _save_position(path, value):
+    temporary = f"{path}.position.tmp"
+    with open(temporary, "w") as target:
+        target.write(repr(value))
+    os.replace(temporary, f"{path}.position")
+
+
+class Replicator:
+    """Замена репликации для локального запуска на файлах SQLite.
+
+    Когда основная база меняется (PRAGMA data_version), её страницы
+    целиком переносятся на реплики через backup API SQLite. После
+    каждой проверки рядом с репликой записывается её позиция — время
+    начала проверки: всё, что основная база зафиксировала раньше, в
+    реплике уже есть.
+    """
+
+    def __init__(self, source, targets):
+        self.source = sqlite3.connect(source)
+        self.targets = list(targets)
+        self.version = None
+
+    def sync(self):
+        """Обновляет реплики, если база изменилась; True — обновлены."""
+        started = time.time()
+        version = self.source.execute("PRAGMA data_version").fetchone()[0]
+        changed = version != self.version
+        for target in self.targets:
+            if changed:
+                replica = sqlite3.connect(target)
+                try:
+                    self.source.backup(replica)
+                finally:
+                    replica.close()
+            _save_position(target, started)
+        self.version = version
+        return changed
+
+    def run(self, interval=1.0, once=False):
+        while True:
+            self.sync()
+            if once:
+                return
+            time.sleep(interval)
+
+    def close(self):
+        self.source.close()
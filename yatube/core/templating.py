@@ -0,0 +1,32 @@
+import time
+
+from django.template.backends.django import DjangoTemplates
+
+from core import metrics
+
+
+class TimedTemplate:
+    """Шаблон, время отрисовки которого попадает в метрики."""
+
+    def __init__(self, template):
+        self._wrapped = template
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return self._wrapped.render(context, request)
+        finally:
+            metrics.add("template_seconds", time.perf_counter() - started)
+
+
+class InstrumentedTemplates(DjangoTemplates):
+    """Бэкенд DjangoTemplates с замером времени отрисовки."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
@@ -1,14 +1,52 @@
+import asyncio
+import json
+import os
 import shutil
+import sqlite3
 import tempfile
+import threading
+import time
+from fnmatch import fnmatch
 from http import HTTPStatus
+from unittest import mock
 
 from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.signals import request_finished, request_started
+from django.db import connection
+from django.db.models import OuterRef
+from django.http import HttpResponse
+from django.template import Context, Engine
+from django.test import (
+    Client,
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
 from django.urls import reverse
+from django.utils import timezone
 
+from core import benchmark, metrics, pagecache
+from core.inspector import Inspection, NPlusOneError, shape
+from core.middleware import ReplicaMiddleware, WriteTransactionMiddleware
+from core.models import Task
+from core.queue import enqueue, enqueue_many, task, work
+from core.replication import Replicator, position
 from posts.forms import PostForm
-from posts.models import Group, Post, User
+from posts.models import Follow, Group, Post, User
+from posts.seeding import seed
+from yatube.backends.sqlite3.base import (
+    DatabaseWrapper,
+    immediate_transactions,
+)
+from yatube.cache import RedisCache, cache_config
+from yatube.handlers import ASGIHandler, wsgi_environ
+from yatube.routers import ReplicaRouter, primary, replica_reads
+from yatube.utils import query_batch
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -77,3 +115,829 @@ class CoreTestClass(TestCase):
                         image=self.post.image,
                     ).exists()
                 )
+
+
+class FakeRedis:
+    """Двойник сервера Redis: общее хранилище на каждый адрес."""
+
+    servers = {}
+
+    def __init__(self, url):
+        self.data = self.servers.setdefault(url, {})
+
+    @classmethod
+    def from_url(cls, url):
+        return cls(url)
+
+    def _alive(self, key):
+        value, expires = self.data.get(key, (None, None))
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            return None
+        return value
+
+    def get(self, key):
+        return self._alive(key)
+
+    def mget(self, keys):
+        return [self._alive(key) for key in keys]
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and self._alive(key) is not None:
+            return None
+        expires = None if ex is None else time.monotonic() + ex
+        self.data[key] = (value, expires)
+        return True
+
+    def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def exists(self, key):
+        return int(self._alive(key) is not None)
+
+    def incrby(self, key, delta):
+        value = int(self._alive(key) or 0) + delta
+        self.data[key] = (str(value).encode(), self.data[key][1])
+        return value
+
+    def expire(self, key, seconds):
+        if self._alive(key) is None:
+            return False
+        self.data[key] = (self.data[key][0], time.monotonic() + seconds)
+        return True
+
+    def persist(self, key):
+        if self._alive(key) is None:
+            return False
+        self.data[key] = (self.data[key][0], None)
+        return True
+
+    def scan_iter(self, match):
+        return [key for key in list(self.data) if fnmatch(key, match)]
+
+    def flushdb(self):
+        self.data.clear()
+
+
+def redis_cache(prefix="yatube"):
+    return RedisCache(
+        "redis://stand-in:6379/0",
+        {"KEY_PREFIX": prefix, "OPTIONS": {"CLIENT_CLASS": FAKE_REDIS}},
+    )
+
+
+FAKE_REDIS = "core.tests.FakeRedis"
+SHARED_CACHES = {
+    "default": {
+        "BACKEND": "yatube.cache.RedisCache",
+        "LOCATION": "redis://stand-in:6379/0",
+        "KEY_PREFIX": "yatube",
+        "OPTIONS": {"CLIENT_CLASS": FAKE_REDIS},
+    }
+}
+
+
+class CacheConfigTest(TestCase):
+    def test_cache_config_schemes(self):
+        """Бэкенд кэша выбирается по схеме CACHE_URL."""
+        backends = {
+            "locmem://": "django.core.cache.backends.locmem.LocMemCache",
+            "file:///dev/shm/yatube": (
+                "django.core.cache.backends.filebased.FileBasedCache"
+            ),
+            "redis://cache:6379/1": "yatube.cache.RedisCache",
+        }
+        for url, backend in backends.items():
+            with self.subTest(url=url):
+                config = cache_config(url, key_prefix="yatube", version=3)
+                self.assertEqual(config["BACKEND"], backend)
+                self.assertEqual(config["KEY_PREFIX"], "yatube")
+                self.assertEqual(config["VERSION"], 3)
+        self.assertEqual(
+            cache_config("file:///dev/shm/yatube")["LOCATION"],
+            "/dev/shm/yatube",
+        )
+        with self.assertRaises(ImproperlyConfigured):
+            cache_config("memcached://localhost")
+
+
+class RedisCacheTest(TestCase):
+    def setUp(self):
+        FakeRedis.servers.clear()
+
+    def test_workers_share_values(self):
+        """Значения и счётчики видны всем процессам-воркерам."""
+        first, second = redis_cache(), redis_cache()
+        first.set("feed", {"posts": [1, 2]})
+        self.assertEqual(second.get("feed"), {"posts": [1, 2]})
+        self.assertTrue(first.add("version", 10))
+        self.assertFalse(second.add("version", 20))
+        self.assertEqual(second.incr("version"), 11)
+        self.assertEqual(first.get("version"), 11)
+        second.delete("feed")
+        self.assertIsNone(first.get("feed"))
+        with self.assertRaises(ValueError):
+            first.incr("missing")
+
+    def test_timeouts_and_many(self):
+        """Время жизни и пакетные операции."""
+        cache = redis_cache()
+        cache.set("gone", 1, timeout=0)
+        self.assertFalse(cache.has_key("gone"))
+        cache.set_many({"a": 1, "b": "два"}, timeout=None)
+        self.assertEqual(cache.get_many(["a", "b", "c"]), {"a": 1, "b": "два"})
+        self.assertTrue(cache.touch("a", 60))
+        cache.delete_many(["a", "b"])
+        self.assertEqual(cache.get_many(["a", "b"]), {})
+
+    def test_clear_keeps_other_namespaces(self):
+        """Очистка затрагивает только свой префикс."""
+        ours, theirs = redis_cache(), redis_cache(prefix="other")
+        ours.set("key", 1)
+        theirs.set("key", 2)
+        ours.clear()
+        self.assertIsNone(ours.get("key"))
+        self.assertEqual(theirs.get("key"), 2)
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_fragments_share_namespace(self):
+        """Фрагменты шаблонов пишутся в общий кэш с префиксом."""
+        user = User.objects.create(username="CacheUser")
+        Post.objects.create(text="Тестовый текст", author=user)
+        self.client.get(reverse("posts:index"))
+        keys = list(FakeRedis.servers["redis://stand-in:6379/0"])
+        self.assertTrue(any("feed:page:all" in k for k in keys))
+        self.assertTrue(all(key.startswith("yatube:1:") for key in keys))
+
+
+@task
+def flaky_task(marker):
+    raise RuntimeError(marker)
+
+
+@override_settings(TASK_MAX_ATTEMPTS=2, TASK_RETRY_DELAY=0)
+class TaskQueueTest(TestCase):
+    def test_failed_task_is_retried_then_parked(self):
+        """Упавшая задача повторяется и после лимита попыток откладывается."""
+        enqueue(flaky_task, "boom")
+        work(once=True)
+        failed = Task.objects.get()
+        self.assertEqual(failed.status, Task.FAILED)
+        self.assertEqual(failed.attempts, 2)
+        self.assertIn("RuntimeError: boom", failed.error)
+
+    @override_settings(TASK_RETRY_DELAY=30)
+    def test_retry_waits_for_delay(self):
+        """Повтор упавшей задачи откладывается на TASK_RETRY_DELAY."""
+        enqueue(flaky_task, "later")
+        work(once=True)
+        task = Task.objects.get()
+        self.assertEqual(task.status, Task.PENDING)
+        self.assertEqual(task.attempts, 1)
+        self.assertGreater(task.run_at, timezone.now())
+        Task.objects.update(run_at=timezone.now())
+        work(once=True)
+        self.assertEqual(Task.objects.get().status, Task.FAILED)
+
+    def test_enqueue_many(self):
+        """Пачка задач ставится в очередь одним проходом."""
+        enqueue_many(flaky_task, ((i,) for i in range(3)))
+        args = Task.objects.values_list("args", flat=True)
+        self.assertEqual([json.loads(item) for item in args], [[0], [1], [2]])
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_mode_runs_inline(self):
+        """В режиме TASKS_EAGER задача выполняется сразу."""
+        with self.assertRaisesMessage(RuntimeError, "inline"):
+            enqueue(flaky_task, "inline")
+        self.assertFalse(Task.objects.exists())
+
+
+class BenchmarkTest(TransactionTestCase):
+    def test_run_reports_every_page(self):
+        """Бенчмарк проходит все страницы через оба транспорта."""
+        seed(users=20, groups=2, posts=60, comments=30, follows=60)
+        user = User.objects.order_by("-stats__following_count").first()
+        post = Post.objects.first()
+        group = Group.objects.first()
+        for transport in benchmark.TRANSPORTS:
+            with self.subTest(transport=transport):
+                results = benchmark.run(
+                    transport, user, post, group, iterations=3, warmup=1
+                )
+                self.assertEqual(
+                    set(results),
+                    {
+                        name
+                        for name, *_ in benchmark.scenarios(user, post, group)
+                    },
+                )
+                for name, row in results.items():
+                    self.assertLessEqual(row["p50"], row["p99"])
+                    self.assertGreater(row["queries"], 0)
+                self.assertGreater(results["posts:index"]["bytes"], 0)
+
+    def test_concurrency_reports_throughput(self):
+        """Бенчмарк конкурентности считает чтения при записях."""
+        seed(users=5, groups=1, posts=20, comments=5, follows=5)
+        user, post = User.objects.first(), Post.objects.first()
+        result = benchmark.concurrency(user, post, 2, 1, duration=0.3)
+        self.assertGreater(result["reads_per_second"], 0)
+        self.assertEqual(
+            set(result),
+            {"reads_per_second", "writes_per_second", "read_p95", "errors"},
+        )
+
+    def test_serialization_reports_rows_per_second(self):
+        """Бенчмарк сериализации сравнивает .values() и модели."""
+        seed(users=5, groups=1, posts=30, comments=0, follows=0)
+        result = benchmark.serialization(rows=20, repeat=2)
+        self.assertEqual(set(result), {"values", "instances"})
+        self.assertTrue(all(rate > 0 for rate in result.values()))
+
+    def test_throughput_compares_wsgi_and_asgi(self):
+        """Бенчмарк пропускной способности гоняет оба сервера."""
+        seed(users=5, groups=1, posts=20, comments=0, follows=0)
+        urls = {"posts:index": reverse("posts:index")}
+        result = benchmark.throughput(urls, clients=3, requests=2, threads=2)
+        self.assertEqual(set(result["posts:index"]), {"wsgi", "asgi"})
+        for row in result["posts:index"].values():
+            self.assertEqual(row["errors"], 0)
+            self.assertGreater(row["requests_per_second"], 0)
+        self.assertEqual(result["posts:index"]["asgi"]["threads"], 2)
+
+    def test_compare_flags_regressions(self):
+        """Рост запросов и p95 сверх допуска считается регрессией."""
+        baseline = {"wsgi": {"posts:index": {"p95": 10.0, "queries": 4}}}
+        same = {"wsgi": {"posts:index": {"p95": 12.0, "queries": 4}}}
+        worse = {"wsgi": {"posts:index": {"p95": 13.0, "queries": 5}}}
+        self.assertEqual(benchmark.compare(same, baseline, 0.25), [])
+        self.assertEqual(len(benchmark.compare(worse, baseline, 0.25)), 2)
+        self.assertEqual(benchmark.percentile([3, 1, 2, 4], 50), 2)
+
+
+def sample(text, line):
+    """Значение строки метрики из ответа /metrics, 0 если её нет."""
+    for row in text.splitlines():
+        name, _, value = row.rpartition(" ")
+        if name == line:
+            return float(value)
+    return 0
+
+
+class MetricsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="MetricsUser")
+        Post.objects.create(text="Тестовый текст", author=cls.author)
+
+    def scrape(self):
+        return self.client.get(reverse("metrics")).content.decode()
+
+    def test_request_metrics_by_view(self):
+        """Запросы, база, кэш и шаблоны учитываются по имени URL."""
+        view = 'view="posts:index"'
+        before = self.scrape()
+        self.client.get(reverse("posts:index"))
+        self.client.get(reverse("posts:index"))
+        self.client.get("/nonexist-page/")
+        after = self.scrape()
+        for line, delta in (
+            (f'yatube_requests_total{{{view},status="200"}}', 2),
+            (f"yatube_request_duration_seconds_count{{{view}}}", 2),
+            (f'yatube_request_duration_seconds_bucket{{{view},le="+Inf"}}', 2),
+            ('yatube_requests_total{view="unresolved",status="404"}', 1),
+        ):
+            with self.subTest(line=line):
+                self.assertEqual(
+                    sample(after, line) - sample(before, line), delta
+                )
+        for metric in (
+            "yatube_db_queries_total",
+            "yatube_db_query_seconds_total",
+            "yatube_cache_hits_total",
+            "yatube_cache_misses_total",
+            "yatube_template_render_seconds_total",
+        ):
+            with self.subTest(metric=metric):
+                line = f"{metric}{{{view}}}"
+                self.assertGreater(
+                    sample(after, line) - sample(before, line), 0
+                )
+        self.assertIn(
+            "# TYPE yatube_request_duration_seconds histogram", after
+        )
+
+    @override_settings(METRICS_ALLOWED_IPS=["10.0.0.1"])
+    def test_metrics_access(self):
+        """Метрики видны с разрешённых адресов и персоналу."""
+        url = reverse("metrics")
+        self.assertEqual(
+            self.client.get(url).status_code, HTTPStatus.FORBIDDEN
+        )
+        self.assertEqual(
+            self.client.get(url, REMOTE_ADDR="10.0.0.1").status_code,
+            HTTPStatus.OK,
+        )
+        staff = User.objects.create(username="MetricsStaff", is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(url).status_code, HTTPStatus.OK)
+
+    def test_workers_are_aggregated(self):
+        """Снимки других процессов из METRICS_DIR складываются."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        line = 'yatube_requests_total{view="posts:index",status="200"}'
+        with override_settings(METRICS_DIR=directory):
+            before = sample(self.scrape(), line)
+            with open(os.path.join(directory, "999999.json"), "w") as other:
+                json.dump(
+                    [
+                        [
+                            "yatube_requests_total",
+                            [["view", "posts:index"], ["status", "200"]],
+                            5,
+                        ]
+                    ],
+                    other,
+                )
+            self.client.get(reverse("posts:index"))
+            metrics.flush(force=True)
+            self.assertEqual(sample(self.scrape(), line), before + 6)
+            self.assertTrue(
+                os.path.exists(os.path.join(directory, f"{os.getpid()}.json"))
+            )
+
+    def test_dead_workers_are_retired(self):
+        """Снимки ушедших процессов сливаются в итог, а не копятся."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        row = ["yatube_requests_total", [["view", "posts:index"]], 2]
+        for pid in (999998, 999999):
+            with open(os.path.join(directory, f"{pid}.json"), "w") as other:
+                json.dump([row], other)
+        line = 'yatube_requests_total{view="posts:index"}'
+        with override_settings(METRICS_DIR=directory):
+            self.assertEqual(sample(metrics.render(), line), 4)
+            self.assertEqual(
+                sorted(os.listdir(directory)), ["retired.json", "retired.lock"]
+            )
+            with open(os.path.join(directory, "999999.json"), "w") as other:
+                json.dump([row], other)
+            self.assertEqual(sample(metrics.render(), line), 6)
+
+    def test_buckets_are_ordered_numerically(self):
+        """Корзины гистограммы идут по возрастанию le, +Inf — последней."""
+        labels = (("view", "posts:index"),)
+        totals = {
+            (
+                "yatube_request_duration_seconds_bucket",
+                labels + (("le", le),),
+            ): 1
+            for le in ("+Inf", "10", "2.5", "0.5", "0.005")
+        }
+        lines = [
+            line
+            for line in metrics.render(totals).splitlines()
+            if line.startswith("yatube_request_duration_seconds_bucket")
+        ]
+        self.assertEqual(
+            [line.split('le="')[1].split('"')[0] for line in lines],
+            ["0.005", "0.5", "2.5", "10", "+Inf"],
+        )
+
+
+class QueryInspectorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for i in range(7):
+            author = User.objects.create(username=f"author{i}")
+            Post.objects.create(text="Тестовый текст", author=author)
+
+    def test_shape_ignores_values(self):
+        """Запросы, отличающиеся только значениями, одной формы."""
+        self.assertEqual(
+            shape("SELECT * FROM t WHERE id IN (%s, %s) AND a = 'x'"),
+            shape("SELECT  * FROM t WHERE id IN (%s) AND a = 'y'"),
+        )
+
+    def test_nplusone_points_to_template_line(self):
+        """N+1 в шаблоне указывает на имя шаблона и строку."""
+        engine = Engine(
+            loaders=[
+                (
+                    "django.template.loaders.locmem.Loader",
+                    {
+                        "list.html": (
+                            "{% for post in posts %}\n"
+                            "{{ post.author.username }}\n"
+                            "{% endfor %}"
+                        )
+                    },
+                )
+            ]
+        )
+        template = engine.get_template("list.html")
+        with Inspection().watching() as inspection:
+            template.render(Context({"posts": Post.objects.all()}))
+        (group,) = inspection.repeated()
+        self.assertEqual(group["count"], 7)
+        self.assertEqual(group["template"], "list.html:2")
+        self.assertTrue(group["code"].startswith("core/tests.py:"))
+
+    @override_settings(QUERY_INSPECTION_RAISE=True)
+    def test_nplusone_raises_in_strict_mode(self):
+        """В строгом режиме N+1 — ошибка, без повторов — нет."""
+        with Inspection().watching() as inspection:
+            list(Post.objects.select_related("author"))
+        inspection.report("posts:index")
+        with Inspection().watching() as inspection:
+            for post in Post.objects.all():
+                post.author.username
+        with self.assertLogs("yatube.queries", "WARNING"):
+            with self.assertRaisesMessage(NPlusOneError, "7×"):
+                inspection.report("posts:index")
+
+    @override_settings(QUERY_INSPECTION_RATE=1, SLOW_QUERY_SECONDS=0)
+    def test_slow_queries_are_logged(self):
+        """Медленные запросы пишутся в журнал в формате JSON."""
+        with self.assertLogs("yatube.queries", "WARNING") as logs:
+            self.client.get(reverse("posts:index"))
+        event = json.loads(logs.records[0].getMessage())
+        self.assertEqual(event["event"], "slow_query")
+        self.assertEqual(event["view"], "posts:index")
+        self.assertIn("SELECT", event["sql"])
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"])
+class ReplicaRoutingTest(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.seen = []
+
+    def view(self, request):
+        self.seen.append(self.router.db_for_read(Post))
+        return HttpResponse()
+
+    def test_reads_go_to_replica_only_when_allowed(self):
+        """Реплика читается только в разрешённом блоке, запись — нет."""
+        self.assertEqual(self.router.db_for_read(Post), "default")
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Post), "replica1")
+            self.assertEqual(self.router.db_for_write(Post), "default")
+            with primary():
+                self.assertEqual(self.router.db_for_read(Post), "default")
+        self.assertFalse(self.router.allow_migrate("replica1", "posts"))
+        with override_settings(DATABASE_REPLICAS=[]), replica_reads():
+            self.assertEqual(self.router.db_for_read(Post), "default")
+
+    def test_sessions_and_users_read_from_primary(self):
+        """Сессии и пользователи не читаются с реплик."""
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Session), "default")
+            self.assertEqual(self.router.db_for_read(User), "default")
+
+    def test_own_writes_pin_reads_until_replica_catches_up(self):
+        """После POST чтение идёт с основной базы, пока реплика отстаёт."""
+        middleware = ReplicaMiddleware(self.view)
+        factory = RequestFactory()
+        middleware(factory.get("/"))
+        response = middleware(factory.post("/"))
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertEqual(cookie["max-age"], settings.REPLICA_PIN_SECONDS)
+        written = float(cookie.value)
+        pinned = factory.get("/")
+        pinned.COOKIES[settings.REPLICA_PIN_COOKIE] = cookie.value
+        replica = {"replica1": {"NAME": "replica.sqlite3"}}
+        with mock.patch.dict(settings.DATABASES, replica), mock.patch(
+            "core.replication.position", return_value=written - 1
+        ):
+            response = middleware(pinned)
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        with mock.patch.dict(settings.DATABASES, replica), mock.patch(
+            "core.replication.position", return_value=written
+        ):
+            response = middleware(pinned)
+        self.assertEqual(
+            response.cookies[settings.REPLICA_PIN_COOKIE].value, ""
+        )
+        self.assertEqual(
+            self.seen, ["replica1", "default", "default", "replica1"]
+        )
+
+    def test_replicator_copies_changes(self):
+        """Реплика получает изменения основной базы при синхронизации."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        source = os.path.join(directory, "primary.sqlite3")
+        target = os.path.join(directory, "replica.sqlite3")
+        writer = sqlite3.connect(source)
+        self.addCleanup(writer.close)
+        writer.execute("CREATE TABLE post (text TEXT)")
+        writer.execute("INSERT INTO post VALUES ('первый')")
+        writer.commit()
+        replicator = Replicator(source, [target])
+        self.addCleanup(replicator.close)
+        self.assertEqual(position(target), 0)
+        self.assertTrue(replicator.sync())
+        synced = position(target)
+        time.sleep(0.01)
+        self.assertFalse(replicator.sync())
+        # Без изменений позиция всё равно продвигается.
+        self.assertGreater(position(target), synced)
+        writer.execute("INSERT INTO post VALUES ('второй')")
+        writer.commit()
+        self.assertTrue(replicator.sync())
+        replica = sqlite3.connect(target)
+        self.addCleanup(replica.close)
+        self.assertEqual(
+            replica.execute("SELECT COUNT(*) FROM post").fetchone()[0], 2
+        )
+
+
+class SQLiteProfileTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, "profile.sqlite3")
+        self.wrapper = DatabaseWrapper(
+            {**connection.settings_dict, "NAME": self.path}, alias="profile"
+        )
+        self.addCleanup(self.wrapper.close)
+
+    def pragma(self, name):
+        with self.wrapper.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_profile_applied_on_connect(self):
+        """Новое соединение получает PRAGMA выбранного профиля."""
+        self.assertEqual(self.pragma("journal_mode"), "wal")
+        self.assertEqual(self.pragma("synchronous"), 1)
+        self.assertEqual(self.pragma("busy_timeout"), 5000)
+        self.assertEqual(self.pragma("cache_size"), -64000)
+        self.wrapper.close()
+        with override_settings(SQLITE_PROFILE="rollback"):
+            self.assertEqual(self.pragma("journal_mode"), "delete")
+
+    def test_immediate_transactions_take_write_lock(self):
+        """Пишущая транзакция берёт блокировку записи сразу."""
+        self.wrapper.ensure_connection()
+        with immediate_transactions():
+            self.wrapper._start_transaction_under_autocommit()
+        other = sqlite3.connect(self.path, timeout=0)
+        self.addCleanup(other.close)
+        with self.assertRaisesMessage(sqlite3.OperationalError, "locked"):
+            other.execute("BEGIN IMMEDIATE")
+        self.wrapper.cursor().execute("ROLLBACK")
+        other.execute("BEGIN IMMEDIATE")
+        other.execute("ROLLBACK")
+
+
+class WriteTransactionTest(TestCase):
+    def test_only_unsafe_requests_open_transaction(self):
+        """Транзакцию открывают изменяющие запросы, ответ 500 её откатывает."""
+        depth = len(connection.savepoint_ids)
+        nested = []
+
+        def view(request):
+            nested.append(len(connection.savepoint_ids) > depth)
+            Group.objects.create(title=request.method, slug=request.method)
+            failed = request.method == "DELETE"
+            return HttpResponse(status=500 if failed else 200)
+
+        middleware = WriteTransactionMiddleware(view)
+        factory = RequestFactory()
+        for method in ("get", "post", "delete"):
+            middleware(getattr(factory, method)("/"))
+        self.assertEqual(nested, [False, True, True])
+        self.assertEqual(
+            set(Group.objects.values_list("title", flat=True)),
+            {"GET", "POST"},
+        )
+
+
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="PageAuthor")
+        Post.objects.create(text="Первый пост", author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("posts:index")
+
+    def test_anonymous_pages_served_from_cache(self):
+        """Повторный анонимный запрос обходится без базы и шаблонов."""
+        first = self.client.get(self.url)
+        self.assertEqual(first["X-Page-Cache"], "miss")
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second["X-Page-Cache"], "hit")
+        self.assertEqual(second.content, first.content)
+        again = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(again.status_code, 304)
+        user = Client()
+        user.force_login(self.author)
+        self.assertNotIn("X-Page-Cache", user.get(self.url))
+
+    def test_post_changes_invalidate_pages(self):
+        """Новый пост сбрасывает закэшированные страницы."""
+        self.client.get(self.url)
+        Post.objects.create(text="Свежий пост", author=self.author)
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertContains(response, "Свежий пост")
+
+    def test_only_lock_holder_regenerates(self):
+        """Пока страницу перерисовывает другой, отдаётся прежняя."""
+        self.client.get(self.url)
+        Post.objects.create(text="Ещё пост", author=self.author)
+        request = RequestFactory().get(self.url)
+        self.assertTrue(pagecache.lock(pagecache.page_key(request)))
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Page-Cache"], "stale")
+        self.assertNotContains(response, "Ещё пост")
+
+    @override_settings(PAGE_CACHE_WAIT=0.1)
+    def test_waits_for_first_render(self):
+        """Без записи и без блокировки запрос отрисовывает сам."""
+        request = RequestFactory().get(self.url)
+        self.assertTrue(pagecache.lock(pagecache.page_key(request)))
+        response = self.client.get(self.url)
+        self.assertNotIn("X-Page-Cache", response)
+        self.assertContains(response, "Первый пост")
+
+    def test_early_refresh_probability(self):
+        """XFetch обновляет заранее тем раньше, чем дольше генерация."""
+        entry = {"version": 1, "expires": 100.0, "delta": 1.0}
+        with mock.patch("core.pagecache.random.random", return_value=0.5):
+            self.assertTrue(pagecache.is_fresh(entry, 1, now=99.0))
+            self.assertFalse(pagecache.is_fresh(entry, 1, now=99.5))
+            self.assertFalse(pagecache.is_fresh(entry, 2, now=0.0))
+            slow = {**entry, "delta": 10.0}
+            self.assertFalse(pagecache.is_fresh(slow, 1, now=95.0))
+
+
+def asgi_call(application, scope, body=b""):
+    """Сообщения, отправленные ASGI-приложением в ответ на запрос."""
+    sent = []
+    incoming = [{"type": "http.request", "body": body}]
+    if scope["type"] == "lifespan":
+        incoming = [
+            {"type": "lifespan.startup"},
+            {"type": "lifespan.shutdown"},
+        ]
+
+    async def receive():
+        return incoming.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    return sent
+
+
+def http_scope(method, path, headers=()):
+    return {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": b"",
+        "headers": [(b"host", b"testserver"), *headers],
+    }
+
+
+class ASGIHandlerTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username="AsgiAuthor")
+        Post.objects.create(text="Пост через ASGI", author=self.author)
+        self.application = ASGIHandler(threads=2)
+        self.addCleanup(self.application.executor.shutdown)
+
+    def test_get_page(self):
+        """GET проходит через Django и возвращает страницу."""
+        start, body = asgi_call(
+            self.application, http_scope("GET", reverse("posts:index"))
+        )
+        self.assertEqual(start["status"], HTTPStatus.OK)
+        self.assertIn(
+            (b"Content-Type", b"text/html; charset=utf-8"), start["headers"]
+        )
+        self.assertIn("Пост через ASGI", body["body"].decode())
+
+    def test_post_body(self):
+        """Тело запроса и cookie доходят до представления."""
+        client = Client()
+        client.force_login(self.author)
+        session = client.cookies[settings.SESSION_COOKIE_NAME].value
+        token = "a" * 64
+        headers = [
+            (
+                b"cookie",
+                f"{settings.SESSION_COOKIE_NAME}={session}; "
+                f"{settings.CSRF_COOKIE_NAME}={token}".encode(),
+            ),
+            (b"x-csrftoken", token.encode()),
+            (b"content-type", b"application/json"),
+            (b"referer", b"http://testserver/"),
+        ]
+        start, body = asgi_call(
+            self.application,
+            http_scope("POST", reverse("api:post_list"), headers),
+            json.dumps({"text": "Из ASGI"}).encode(),
+        )
+        self.assertEqual(start["status"], HTTPStatus.CREATED)
+        self.assertEqual(json.loads(body["body"])["text"], "Из ASGI")
+
+    def test_streaming_response_stays_on_one_thread(self):
+        """Потоковый ответ читается и закрывается в потоке запроса."""
+        self.author.is_staff = True
+        self.author.save()
+        client = Client()
+        client.force_login(self.author)
+        session = client.cookies[settings.SESSION_COOKIE_NAME].value
+        threads = []
+
+        def remember(**kwargs):
+            threads.append(threading.get_ident())
+
+        request_started.connect(remember)
+        request_finished.connect(remember)
+        self.addCleanup(request_started.disconnect, remember)
+        self.addCleanup(request_finished.disconnect, remember)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={session}".encode()
+        start, *chunks = asgi_call(
+            self.application,
+            http_scope(
+                "GET",
+                reverse("api:export", args=["posts"]),
+                [(b"cookie", cookie)],
+            ),
+        )
+        self.assertEqual(start["status"], HTTPStatus.OK)
+        body = b"".join(chunk["body"] for chunk in chunks)
+        self.assertIn("Пост через ASGI", body.decode())
+        self.assertFalse(chunks[-1].get("more_body"))
+        self.assertEqual(len(threads), 2)
+        self.assertEqual(threads[0], threads[1])
+
+    def test_lifespan(self):
+        """Запуск и остановка подтверждаются серверу."""
+        sent = asgi_call(self.application, {"type": "lifespan"})
+        self.assertEqual(
+            [message["type"] for message in sent],
+            ["lifespan.startup.complete", "lifespan.shutdown.complete"],
+        )
+
+    def test_environ(self):
+        """Путь без root_path, заголовки и тело в окружении WSGI."""
+        scope = {
+            **http_scope(
+                "GET",
+                "/app/поиск/",
+                [(b"accept", b"text/html"), (b"accept", b"*/*")],
+            ),
+            "root_path": "/app",
+            "query_string": b"q=1",
+        }
+        environ = wsgi_environ(scope, b"data")
+        self.assertEqual(environ["SCRIPT_NAME"], "/app")
+        self.assertEqual(
+            environ["PATH_INFO"].encode("latin-1").decode(), "/поиск/"
+        )
+        self.assertEqual(environ["HTTP_ACCEPT"], "text/html,*/*")
+        self.assertEqual(environ["CONTENT_LENGTH"], "4")
+        self.assertEqual(environ["wsgi.input"].read(), b"data")
+
+
+class QueryBatchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username="BatchAuthor")
+        cls.reader = User.objects.create(username="BatchReader")
+        cls.post = Post.objects.create(text="Пост", author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def test_batch_is_one_query(self):
+        """Скаляр и EXISTS приходят вместе со строкой одним запросом."""
+        with self.assertNumQueries(1):
+            rows = list(
+                query_batch(
+                    User.objects.order_by("pk"),
+                    latest=Post.objects.filter(author=OuterRef("pk"))
+                    .order_by("-pub_date")
+                    .values("pub_date"),
+                    followed=Follow.objects.filter(author=OuterRef("pk")),
+                )
+            )
+        self.assertEqual(rows[0].latest, self.post.pub_date)
+        self.assertTrue(rows[0].followed)
+        self.assertIsNone(rows[1].latest)
+        self.assertFalse(rows[1].followed)
@@ -1,7 +1,12 @@
 from http import HTTPStatus
 
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
 from django.shortcuts import render
 
+from core.metrics import render as render_metrics
+
 
 def page_not_found(request, exception):
     template_name = "core/404.html"
@@ -28,3 +33,12 @@ def permission_denied(request, exception):
 def csrf_failure(request, reason=""):
     template_name = "core/403csrf.html"
     return render(request, template_name)
+
+
+def metrics(request):
+    allowed = request.META.get("REMOTE_ADDR") in settings.METRICS_ALLOWED_IPS
+    if not (allowed or request.user.is_staff):
+        raise PermissionDenied
+    return HttpResponse(
+        render_metrics(), content_type="text/plain; version=0.0.4"
+    )
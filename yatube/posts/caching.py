@@ -0,0 +1,75 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+from yatube.utils import pagination
+
+POST_FRAGMENT = "post_item"
+
+
+def _version_key(scope):
+    return f"feed:version:{scope}"
+
+
+def _initial_version():
+    # Версия после вытеснения ключа всегда больше прежних.
+    return int(time.time() * 1000)
+
+
+def feed_version(scope="all"):
+    """Версия ленты: all, group:<id>, author:<id> или поста post:<id>."""
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_feed_versions(*scopes):
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), None)
+
+
+def post_scopes(author_id, *group_ids):
+    scopes = ["all", f"author:{author_id}"]
+    scopes.extend(f"group:{pk}" for pk in set(group_ids) if pk)
+    return scopes
+
+
+def invalidate_post(post_id, author_id, *group_ids):
+    """Сбрасывает фрагмент поста и версии лент, где он показан."""
+    cache.delete(make_template_fragment_key(POST_FRAGMENT, [post_id]))
+    bump_feed_versions(
+        *post_scopes(author_id, *group_ids), f"post:{post_id}", "pages"
+    )
+
+
+def cached_page(request, scope, queryset, count=None):
+    """Страница ленты scope: кэшируются строки постов, а не разметка.
+
+    Ключ включает версию ленты и версию групп, поэтому новый пост,
+    правка или переименование группы сразу дают новую страницу.
+    """
+    params = "|".join(request.GET.get(name, "") for name in ("cursor", "page"))
+    key = "feed:page:{}:{}:{}:{}".format(
+        scope,
+        feed_version(scope),
+        feed_version("groups"),
+        hashlib.md5(params.encode()).hexdigest(),
+    )
+    page = cache.get(key)
+    if page is None:
+        page = pagination(request, queryset, count=count)
+        page.object_list = list(page.object_list)
+        # В кэш уходят только строки страницы, без исходного запроса.
+        page.paginator.object_list = page.object_list
+        cache.set(key, page, settings.FEED_CACHE_TIMEOUT)
+    return page
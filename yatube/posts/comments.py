@@ -0,0 +1,33 @@
+from django.conf import settings
+
+from yatube.utils import CursorPaginator
+
+
+def comment_page(post, cursor=None):
+    """Страница комментариев поста, от новых к старым.
+
+    Комментарии листаются курсором отдельно от ленты постов; авторы
+    загружаются тем же запросом.
+    """
+    paginator = CursorPaginator(
+        post.comments.select_related("author"),
+        settings.COMMENTS_ON_PAGE,
+        key="created",
+    )
+    return paginator.get_page(cursor)
+
+
+def serialize(page):
+    """Страница комментариев для ответа в JSON."""
+    return {
+        "comments": [
+            {
+                "id": comment.pk,
+                "author": comment.author.username,
+                "text": comment.text,
+                "created": comment.created.isoformat(),
+            }
+            for comment in page
+        ],
+        "next_cursor": page.paginator.next_cursor,
+    }
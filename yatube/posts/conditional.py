@@ -0,0 +1,159 @@
+"""ETag и Last-Modified для условных GET-запросов к лентам и посту.
+
+ETag складывается из версий лент в кэше (их же используют фрагменты
+{% cache %}), денормализованных счётчиков и пользователя, поэтому
+ответ 304 отдаётся без отрисовки шаблонов. Last-Modified — время
+последней публикации; правки постов его не меняют, их ловит ETag,
+который при наличии If-None-Match проверяется первым.
+"""
+
+import hashlib
+
+from django.db.models import Max, OuterRef
+
+from yatube.utils import query_batch
+
+from .caching import feed_version
+from .models import Comment, Follow, Group, Post, User
+
+
+def make_etag(request, *parts):
+    viewer = request.user.pk if request.user.is_authenticated else "anon"
+    raw = ":".join(str(part) for part in (viewer, *parts))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def _first(queryset):
+    # Поиск по уникальному ключу, сортировка не нужна.
+    rows = list(queryset.order_by()[:1])
+    return rows[0] if rows else None
+
+
+def _latest(queryset, field="pub_date"):
+    return queryset.aggregate(latest=Max(field))["latest"]
+
+
+def index_etag(request):
+    # Карточки показывают название группы: её правка тоже меняет ETag.
+    return make_etag(request, feed_version(), feed_version("groups"))
+
+
+def index_last_modified(request):
+    return _latest(Post.objects.all())
+
+
+def group_etag(request, slug):
+    group_id = _first(
+        Group.objects.filter(slug=slug).values_list("pk", flat=True)
+    )
+    if group_id is None:
+        return None
+    return make_etag(
+        request, feed_version(f"group:{group_id}"), feed_version("groups")
+    )
+
+
+def group_last_modified(request, slug):
+    return _latest(Post.objects.filter(group__slug=slug))
+
+
+def _once(request, key, compute):
+    # ETag и Last-Modified одной страницы читают одну и ту же строку.
+    rows = request.__dict__.setdefault("_conditional_rows", {})
+    if key not in rows:
+        rows[key] = compute()
+    return rows[key]
+
+
+def following_check(request):
+    """Проверка подписки читателя на автора строки для query_batch."""
+    if not request.user.is_authenticated:
+        return {}
+    return {
+        "is_following": Follow.objects.filter(
+            user=request.user, author=OuterRef("pk")
+        )
+    }
+
+
+def _profile_row(request, username):
+    queries = {
+        "latest": Post.objects.filter(author=OuterRef("pk"))
+        .order_by("-pub_date")
+        .values("pub_date"),
+        **following_check(request),
+    }
+    return _first(
+        query_batch(User.objects.filter(username=username), **queries).values(
+            "pk",
+            "stats__posts_count",
+            "stats__followers_count",
+            "stats__following_count",
+            *queries,
+        )
+    )
+
+
+def profile_etag(request, username):
+    row = _once(
+        request, ("profile", username), lambda: _profile_row(request, username)
+    )
+    if row is None:
+        return None
+    return make_etag(
+        request,
+        feed_version(f"author:{row['pk']}"),
+        row.get("is_following", False),
+        row["pk"],
+        row["stats__posts_count"],
+        row["stats__followers_count"],
+        row["stats__following_count"],
+    )
+
+
+def profile_last_modified(request, username):
+    row = _once(
+        request, ("profile", username), lambda: _profile_row(request, username)
+    )
+    return row and row["latest"]
+
+
+def _post_row(post_id):
+    return _first(
+        query_batch(
+            Post.objects.filter(pk=post_id),
+            commented=Comment.objects.filter(post=OuterRef("pk"))
+            .order_by("-created")
+            .values("created"),
+        ).values(
+            "author_id",
+            "author__stats__posts_count",
+            "comments_count",
+            "pub_date",
+            "commented",
+        )
+    )
+
+
+def post_etag(request, post_id):
+    row = _once(request, ("post", post_id), lambda: _post_row(post_id))
+    if row is None:
+        return None
+    # Версия самого поста: посты и комментарии того же автора к другим
+    # постам эту страницу не меняют.
+    return make_etag(
+        request,
+        feed_version(f"post:{post_id}"),
+        feed_version("groups"),
+        post_id,
+        row["author_id"],
+        row["author__stats__posts_count"],
+        row["comments_count"],
+    )
+
+
+def post_last_modified(request, post_id):
+    row = _once(request, ("post", post_id), lambda: _post_row(post_id))
+    if row is None:
+        return None
+    return max(filter(None, (row["pub_date"], row["commented"])))
@@ -0,0 +1,103 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from yatube.backends.sqlite3.base import immediate_transactions
+from yatube.routers import primary
+
+from .models import AuthorStats, Comment, Follow, Post, User
+
+BATCH_SIZE = 500
+
+
+def _count(model, field, outer="pk"):
+    """Коррелированный подзапрос: число строк model с field == outer."""
+    rows = (
+        model.objects.filter(**{field: OuterRef(outer)})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(rows), 0)
+
+
+def _author_counts(outer):
+    return {
+        "posts_count": _count(Post, "author", outer),
+        "followers_count": _count(Follow, "author", outer),
+        "following_count": _count(Follow, "user", outer),
+    }
+
+
+def _batches(ids):
+    for start in range(0, len(ids), BATCH_SIZE):
+        end = start + BATCH_SIZE
+        yield ids[start:end]
+
+
+def bump_author(user_id, field, delta):
+    """Сдвигает счётчик автора; отсутствующие строки считаются при чтении."""
+    rows = AuthorStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        rows = rows.filter(**{f"{field}__gte": -delta})
+    rows.update(**{field: F(field) + delta})
+
+
+def bump_post(post_id, delta):
+    rows = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        rows = rows.filter(comments_count__gte=-delta)
+    rows.update(comments_count=F("comments_count") + delta)
+
+
+def stats_for(user):
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        # Строку создаёт сигнал регистрации; здесь досчитываются только
+        # пользователи, вставленные в обход сигналов.
+        with primary():
+            with immediate_transactions(), transaction.atomic():
+                recount_authors([user.pk])
+            return AuthorStats.objects.get(user=user)
+
+
+def recount_authors(user_ids=None):
+    """Пересчитывает счётчики авторов, возвращает число исправленных."""
+    users = User.objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    missing = users.filter(stats__isnull=True).values_list("pk", flat=True)
+    AuthorStats.objects.bulk_create(
+        (AuthorStats(user_id=pk) for pk in missing.iterator()),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    counts = _author_counts("user")
+    drifted = list(
+        AuthorStats.objects.filter(user__in=users)
+        .annotate(**{f"actual_{name}": expr for name, expr in counts.items()})
+        .exclude(**{name: F(f"actual_{name}") for name in counts})
+        .values_list("pk", flat=True)
+    )
+    for chunk in _batches(drifted):
+        AuthorStats.objects.filter(pk__in=chunk).update(**counts)
+    return len(drifted)
+
+
+def recount_posts(post_ids=None):
+    """Пересчитывает число комментариев, возвращает число исправленных."""
+    posts = Post.objects.all()
+    if post_ids is not None:
+        posts = posts.filter(pk__in=post_ids)
+    drifted = list(
+        posts.annotate(actual=_count(Comment, "post"))
+        .exclude(comments_count=F("actual"))
+        .values_list("pk", flat=True)
+    )
+    for chunk in _batches(drifted):
+        Post.objects.filter(pk__in=chunk).update(
+            comments_count=_count(Comment, "post")
+        )
+    return len(drifted)
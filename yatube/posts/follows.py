@@ -0,0 +1,154 @@
+"""Массовые подписки: импорт графа подписок и подписка на многих сразу.
+
+Строки вставляются пачками без сигналов, поэтому счётчики, ленты и
+версии кэша пересчитываются один раз в конце, а не на каждую связь.
+"""
+
+import time
+from collections import Counter, defaultdict
+
+from django.db import connection, transaction
+
+from . import caching, counters, timeline
+from .models import Follow, Timeline, User
+
+BATCH_SIZE = 2000
+
+
+def _pack(user_id, author_id):
+    # Пара id в одном int: множество чисел занимает в разы меньше
+    # памяти, чем множество кортежей.
+    return user_id << 32 | author_id
+
+
+def _chunks(ids, size=counters.BATCH_SIZE):
+    ids = sorted(ids)
+    for start in range(0, len(ids), size):
+        end = start + size
+        yield ids[start:end]
+
+
+def _existing_users(ids):
+    existing = set()
+    for chunk in _chunks(ids):
+        existing.update(
+            User.objects.filter(pk__in=chunk).values_list("pk", flat=True)
+        )
+    return existing
+
+
+def refresh(user_ids, author_ids):
+    """Пересчитывает счётчики и собранные ленты затронутых пользователей."""
+    for chunk in _chunks(set(user_ids) | set(author_ids)):
+        counters.recount_authors(chunk)
+    for chunk in _chunks(user_ids):
+        # Ленты, которых ещё нет, соберутся при первом открытии.
+        timeline.rebuild(
+            list(
+                Timeline.objects.filter(user_id__in=chunk).values_list(
+                    "user_id", flat=True
+                )
+            )
+        )
+    caching.bump_feed_versions("pages", "follows")
+
+
+def _present(pairs):
+    """Упакованные пары из pairs, которые уже есть среди подписок."""
+    wanted = {_pack(user_id, author_id) for user_id, author_id in pairs}
+    present = set()
+    for users in _chunks({user_id for user_id, _ in pairs}):
+        for authors in _chunks({author_id for _, author_id in pairs}):
+            rows = Follow.objects.filter(
+                user_id__in=users, author_id__in=authors
+            ).values_list("user_id", "author_id")
+            present.update(_pack(*row) for row in rows)
+    return present & wanted
+
+
+def _insert(batch, users, authors):
+    """Вставляет пачку пар, возвращает число созданных и пропущенных."""
+    existing = _existing_users({pk for pair in batch for pk in pair})
+    known = [
+        (user_id, author_id)
+        for user_id, author_id in batch
+        if user_id in existing and author_id in existing
+    ]
+    with transaction.atomic():
+        present = _present(known)
+        rows = [
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in known
+            if _pack(user_id, author_id) not in present
+        ]
+        Follow.objects.bulk_create(rows, ignore_conflicts=True)
+    users.update(row.user_id for row in rows)
+    authors.update(row.author_id for row in rows)
+    return Counter(created=len(rows), skipped=len(batch) - len(known))
+
+
+def bulk_follow(pairs, batch_size=BATCH_SIZE):
+    """Создаёт подписки из пар (user_id, author_id).
+
+    Пары читаются потоком. Повторы отбрасываются в памяти, уже
+    существующие подписки — сверкой с таблицей по каждой пачке, так что
+    created считается без подсчёта всей таблицы. Подписки на себя
+    и пары с неизвестными пользователями (id None или нет в базе)
+    пропускаются. Возвращает сводку: read, duplicates, skipped, created
+    и seconds.
+    """
+    started = time.monotonic()
+    summary = Counter(read=0, duplicates=0, skipped=0, created=0)
+    seen, users, authors, batch = set(), set(), set(), []
+    for user_id, author_id in pairs:
+        summary["read"] += 1
+        if user_id is None or author_id is None or user_id == author_id:
+            summary["skipped"] += 1
+            continue
+        key = _pack(user_id, author_id)
+        if key in seen:
+            summary["duplicates"] += 1
+            continue
+        seen.add(key)
+        batch.append((user_id, author_id))
+        if len(batch) == batch_size:
+            summary.update(_insert(batch, users, authors))
+            batch = []
+    if batch:
+        summary.update(_insert(batch, users, authors))
+    refresh(users, authors)
+    summary["seconds"] = time.monotonic() - started
+    return summary
+
+
+def _delete(user_id, author_ids):
+    # Обычный DELETE без сигналов на каждую строку: пересчёт — в refresh.
+    quote = connection.ops.quote_name
+    meta = Follow._meta
+    user = quote(meta.get_field("user").column)
+    author = quote(meta.get_field("author").column)
+    placeholders = ", ".join(["%s"] * len(author_ids))
+    sql = (
+        f"DELETE FROM {quote(meta.db_table)}"
+        f" WHERE {user} = %s AND {author} IN ({placeholders})"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user_id, *author_ids])
+        return cursor.rowcount
+
+
+def bulk_unfollow(pairs):
+    """Удаляет подписки из пар (user_id, author_id), возвращает их число."""
+    by_user = defaultdict(set)
+    for user_id, author_id in pairs:
+        if user_id is not None and author_id is not None:
+            by_user[user_id].add(author_id)
+    deleted = 0
+    authors = set()
+    with transaction.atomic():
+        for user_id, author_ids in by_user.items():
+            for chunk in _chunks(author_ids):
+                deleted += _delete(user_id, chunk)
+            authors.update(author_ids)
+    refresh(by_user, authors)
+    return deleted
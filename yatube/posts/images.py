@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import Image, ImageOps
+
+# Расширение, формат Pillow и MIME-тип; порядок — от лучшего сжатия.
+FORMATS = (
+    ("avif", "AVIF", "image/avif"),
+    ("webp", "WEBP", "image/webp"),
+    ("jpg", "JPEG", "image/jpeg"),
+)
+ASPECT_RATIO = 339 / 960
+# Форматы, которые принимаются при загрузке, и MIME-типы для них.
+UPLOAD_FORMATS = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "GIF": "image/gif",
+    "WEBP": "image/webp",
+}
+
+
+def available_formats():
+    Image.init()
+    return [fmt for fmt in FORMATS if fmt[1] in Image.SAVE]
+
+
+def variant_name(manifest, width, ext):
+    return f"{manifest['path']}-{width}.{ext}"
+
+
+def variants_path(name):
+    """Префикс вариантов картинки с именем name в хранилище.
+
+    Хэш полного имени различает a.png и a.jpg: Django переименовывает
+    только полностью совпадающие файлы.
+    """
+    stem = os.path.splitext(os.path.basename(name))[0]
+    digest = hashlib.md5(name.encode()).hexdigest()[:12]
+    return f"posts/variants/{stem}-{digest}"
+
+
+def build_variants(image_field):
+    """Нарезает картинку поста по ширинам и форматам.
+
+    Возвращает компактный манифест: общий префикс имён, ширины
+    и расширения; имя варианта — <path>-<ширина>.<расширение>.
+    """
+    with image_field.open("rb") as source:
+        image = ImageOps.exif_transpose(Image.open(source)).convert("RGB")
+    widths = sorted(settings.POST_IMAGE_WIDTHS)
+    # Не раздуваем маленькие картинки: больше исходника — только минимум.
+    widths = [w for w in widths if w <= image.width] or widths[:1]
+    manifest = {
+        "path": variants_path(image_field.name),
+        "widths": widths,
+        "formats": [ext for ext, _, _ in available_formats()],
+    }
+    for width in widths:
+        size = (width, round(width * ASPECT_RATIO))
+        variant = ImageOps.fit(image, size, Image.LANCZOS)
+        for ext, fmt, _ in available_formats():
+            buffer = BytesIO()
+            variant.save(buffer, fmt, quality=80)
+            name = variant_name(manifest, width, ext)
+            default_storage.delete(name)
+            default_storage.save(name, ContentFile(buffer.getvalue()))
+    return json.dumps(manifest, separators=(",", ":"))
+
+
+def delete_variants(variants):
+    """Удаляет файлы вариантов по манифесту из Post.image_variants."""
+    try:
+        manifest = json.loads(variants)
+    except ValueError:
+        return
+    for width in manifest["widths"]:
+        for ext in manifest["formats"]:
+            default_storage.delete(variant_name(manifest, width, ext))
+
+
+def prepare_upload(upload):
+    """Проверяет загруженную картинку по заголовку и уменьшает большую.
+
+    Формат и размеры берутся из заголовка, который уже прочитал
+    forms.ImageField, поэтому пиксели декодируются только при
+    уменьшении; JPEG при этом читается сразу в сниженном масштабе.
+    Уменьшенная копия пишется во временный файл, а не в память.
+    """
+    if upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            "Файл больше %(limit)d МБ.",
+            code="file_too_large",
+            params={"limit": settings.POST_IMAGE_MAX_BYTES // 2 ** 20},
+        )
+    header = upload.image
+    if header.format not in UPLOAD_FORMATS:
+        raise ValidationError(
+            "Поддерживаются только JPEG, PNG, GIF и WebP.",
+            code="invalid_format",
+        )
+    width, height = header.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            "Слишком большое разрешение: %(width)d×%(height)d.",
+            code="too_many_pixels",
+            params={"width": width, "height": height},
+        )
+    side = settings.POST_IMAGE_MAX_SIDE
+    if max(width, height) <= side:
+        return upload
+    upload.seek(0)
+    image = Image.open(upload)
+    image.draft("RGB", (side, side))
+    image.thumbnail((side, side), Image.LANCZOS, reducing_gap=None)
+    image = ImageOps.exif_transpose(image)
+    fmt = header.format
+    if fmt == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    resized = TemporaryUploadedFile(
+        upload.name, UPLOAD_FORMATS[fmt], 0, None
+    )
+    image.save(resized.file, fmt, quality=85, optimize=True)
+    resized.size = resized.file.tell()
+    resized.file.seek(0)
+    resized.image = image
+    return resized
@@ -0,0 +1,94 @@
+import csv
+import json
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.follows import BATCH_SIZE, bulk_follow, bulk_unfollow
+from posts.models import User
+
+FORMATS = ("csv", "jsonl")
+
+
+def _rows(source, fmt):
+    """Пары (пользователь, автор) из CSV или JSON Lines по строке."""
+    if fmt == "csv":
+        for row in csv.reader(source):
+            if len(row) >= 2 and row[0] != "user":
+                yield row[0], row[1]
+        return
+    for line in source:
+        if not line.strip():
+            continue
+        edge = json.loads(line)
+        if isinstance(edge, dict):
+            yield edge["user"], edge["author"]
+        else:
+            yield edge[0], edge[1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Импортирует подписки из файлов CSV (user,author) или JSON Lines "
+        '({"user": ..., "author": ...}); «-» — стандартный ввод'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="Формат файлов, по умолчанию — по расширению",
+        )
+        parser.add_argument(
+            "--usernames",
+            action="store_true",
+            help="В файлах имена пользователей, а не id",
+        )
+        parser.add_argument(
+            "--unfollow",
+            action="store_true",
+            help="Удалить перечисленные подписки",
+        )
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        resolve = self.ids
+        if options["usernames"]:
+            # Один словарь имён на весь импорт вместо запроса на связь.
+            names = dict(User.objects.values_list("username", "pk"))
+            resolve = names.get
+        edges = (
+            (resolve(user), resolve(author))
+            for path in options["paths"]
+            for user, author in self.read(path, options["format"])
+        )
+        if options["unfollow"]:
+            deleted = bulk_unfollow(edges)
+            self.stdout.write(f"Удалено подписок: {deleted}")
+            return
+        summary = bulk_follow(edges, options["batch_size"])
+        rate = summary["read"] / max(summary["seconds"], 1e-9)
+        self.stdout.write(
+            f"Прочитано связей: {summary['read']}, создано: "
+            f"{summary['created']}, повторов: {summary['duplicates']}, "
+            f"пропущено: {summary['skipped']} за {summary['seconds']:.1f} с "
+            f"({rate:.0f} связей/с)"
+        )
+
+    def ids(self, value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    def read(self, path, fmt):
+        fmt = fmt or os.path.splitext(path)[1].lstrip(".")
+        if fmt not in FORMATS:
+            raise CommandError(f"Неизвестный формат файла: {path}")
+        if path == "-":
+            yield from _rows(sys.stdin, fmt)
+            return
+        with open(path, newline="") as source:
+            yield from _rows(source, fmt)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount_authors, recount_posts
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счётчики постов, комментариев и подписок"
+
+    def handle(self, *args, **options):
+        authors = recount_authors()
+        posts = recount_posts()
+        self.stdout.write(
+            f"Исправлено счётчиков авторов: {authors}, постов: {posts}"
+        )
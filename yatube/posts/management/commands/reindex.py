@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from posts.search import rebuild
+
+
+class Command(BaseCommand):
+    help = "Перестраивает поисковый индекс постов"
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Проиндексировано постов: {rebuild()}")
@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.seeding import DEFAULTS, seed
+
+
+class Command(BaseCommand):
+    help = "Заполняет базу синтетическими пользователями, постами и подписками"
+
+    def add_arguments(self, parser):
+        for name in ("users", "groups", "posts", "comments", "follows"):
+            parser.add_argument(f"--{name}", type=int, default=DEFAULTS[name])
+        parser.add_argument(
+            "--alpha",
+            type=float,
+            default=DEFAULTS["alpha"],
+            help="Показатель закона Ципфа для авторов постов и подписок, "
+            "0 — равномерно",
+        )
+        parser.add_argument(
+            "--group-share",
+            type=float,
+            default=DEFAULTS["group_share"],
+            help="Доля постов в группах",
+        )
+        parser.add_argument(
+            "--image-share",
+            type=float,
+            default=DEFAULTS["image_share"],
+            help="Доля постов с картинкой",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=DEFAULTS["days"],
+            help="За сколько дней распределены даты",
+        )
+        parser.add_argument("--seed", type=int, default=DEFAULTS["seed"])
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="Число процессов, генерирующих данные",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        totals = seed(
+            processes=options["processes"],
+            **{name: options[name] for name in DEFAULTS},
+        )
+        summary = ", ".join(
+            f"{name}: {count}" for name, count in totals.items()
+        )
+        self.stdout.write(
+            f"Создано {summary} за {time.monotonic() - started:.1f} с"
+        )
@@ -0,0 +1,26 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:26
+
+from django.db import migrations, models
+
+
+def mark_existing_ready(apps, schema_editor):
+    # Старые посты рендерят миниатюры как раньше, в запросе.
+    Post = apps.get_model("posts", "Post")
+    Post.objects.exclude(image="").update(thumbnail_ready=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0005_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="thumbnail_ready",
+            field=models.BooleanField(
+                default=False, editable=False, verbose_name="Миниатюра готова"
+            ),
+        ),
+        migrations.RunPython(mark_existing_ready, migrations.RunPython.noop),
+    ]
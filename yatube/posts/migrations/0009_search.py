@@ -0,0 +1,77 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:34
+
+import django.db.models.deletion
+from django.db import DatabaseError, migrations, models, transaction
+
+
+def create_fts(apps, schema_editor):
+    # Без FTS5 в сборке SQLite поиск работает по таблице PostTerm.
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE posts_post_fts USING fts5(terms)"
+            )
+    except DatabaseError:
+        pass
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS posts_post_fts")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0008_feed_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PostTerm",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "term",
+                    models.CharField(
+                        max_length=64, verbose_name="Основа слова"
+                    ),
+                ),
+                (
+                    "count",
+                    models.PositiveSmallIntegerField(
+                        default=1, verbose_name="Вхождений"
+                    ),
+                ),
+                (
+                    "post",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="terms",
+                        to="posts.Post",
+                        verbose_name="Пост",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Слово поста",
+                "verbose_name_plural": "Поисковый индекс",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="postterm",
+            constraint=models.UniqueConstraint(
+                fields=("term", "post"), name="unique_post_term"
+            ),
+        ),
+        migrations.RunPython(create_fts, drop_fts),
+    ]
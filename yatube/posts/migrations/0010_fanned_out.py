@@ -0,0 +1,37 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_popular_posts(apps, schema_editor):
+    # Посты авторов выше порога раньше не попадали в ленты.
+    Post = apps.get_model("posts", "Post")
+    Post.objects.filter(
+        author__stats__followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+    ).update(fanned_out=False)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0009_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="fanned_out",
+            field=models.BooleanField(
+                default=True, editable=False, verbose_name="Разложен по лентам"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(fanned_out=False),
+                fields=["author", "pub_date", "id"],
+                name="post_unfanned_idx",
+            ),
+        ),
+        migrations.RunPython(mark_popular_posts, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,24 @@
+import json
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import Count
 
 User = get_user_model()
 
+# Колонки, которые шаблоны ленты не читают.
+FEED_DEFERRED_FIELDS = (
+    "author__password",
+    "author__last_login",
+    "author__is_superuser",
+    "author__email",
+    "author__is_staff",
+    "author__is_active",
+    "author__date_joined",
+    "group__description",
+)
+
 
 class Group(models.Model):
     title = models.CharField(
@@ -25,6 +41,17 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self, with_comment_total=False):
+        """Посты для ленты: автор и группа одним запросом."""
+        queryset = self.select_related("author", "group").defer(
+            *FEED_DEFERRED_FIELDS
+        )
+        if with_comment_total:
+            queryset = queryset.annotate(comment_total=Count("comments"))
+        return queryset
+
+
 class Post(models.Model):
     text = models.TextField(
         "Текст поста",
@@ -50,15 +77,71 @@ class Post(models.Model):
         help_text="Группа, к которой будет относиться пост",
     )
     image = models.ImageField("Картинка", upload_to="posts/", blank=True)
+    comments_count = models.PositiveIntegerField(
+        "Комментариев", default=0, editable=False
+    )
+    thumbnail_ready = models.BooleanField(
+        "Миниатюра готова", default=False, editable=False
+    )
+    image_variants = models.TextField(
+        "Варианты картинки", blank=True, editable=False
+    )
+    fanned_out = models.BooleanField(
+        "Разложен по лентам", default=True, editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ["-pub_date"]
+        # Ленты сортируются по (-pub_date, -id), в том числе внутри
+        # автора и группы.
+        indexes = [
+            models.Index(fields=["pub_date", "id"], name="post_pub_date_idx"),
+            models.Index(
+                fields=["author", "pub_date", "id"],
+                name="post_author_date_idx",
+            ),
+            models.Index(
+                fields=["group", "pub_date", "id"], name="post_group_date_idx"
+            ),
+            # Посты, которые лента подписок дочитывает при открытии.
+            models.Index(
+                fields=["author", "pub_date", "id"],
+                name="post_unfanned_idx",
+                condition=models.Q(fanned_out=False),
+            ),
+            # Проверка перед удалением вариантов: нужна ли картинка
+            # другим постам.
+            models.Index(fields=["image"], name="post_image_idx"),
+        ]
         verbose_name = "Пост"
         verbose_name_plural = "Посты"
 
     def __str__(self):
         return self.text[:15]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        post = super().from_db(db, field_names, values)
+        # Сигналы сравнивают с прочитанным без повторного SELECT.
+        post._loaded_values = dict(zip(field_names, values))
+        return post
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using, fields)
+        loaded = self.__dict__.setdefault("_loaded_values", {})
+        for field in self._meta.concrete_fields:
+            if field.attname in self.__dict__:
+                loaded[field.attname] = self.__dict__[field.attname]
+
+    @property
+    def variants(self):
+        try:
+            return json.loads(self.image_variants)
+        except ValueError:
+            return None
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -85,6 +168,11 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ["-created"]
+        indexes = [
+            models.Index(
+                fields=["post", "created", "id"], name="comment_post_date_idx"
+            ),
+        ]
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
 
@@ -105,6 +193,74 @@ class Follow(models.Model):
     )
 
     class Meta:
-        models.UniqueConstraint(
-            fields=["user", "author"], name="unique_follow"
-        )
+        # Уникальный индекс (user, author) обслуживает и выборку подписок.
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "author"], name="unique_follow"
+            ),
+        ]
+
+
+class AuthorStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name="stats",
+        verbose_name="Пользователь",
+    )
+    posts_count = models.PositiveIntegerField("Постов", default=0)
+    followers_count = models.PositiveIntegerField("Подписчиков", default=0)
+    following_count = models.PositiveIntegerField("Подписок", default=0)
+
+    class Meta:
+        verbose_name = "Счётчики автора"
+        verbose_name_plural = "Счётчики авторов"
+
+
+class Timeline(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name="timeline",
+        verbose_name="Читатель",
+    )
+    post_ids = models.TextField(
+        "Посты ленты",
+        blank=True,
+        help_text="Идентификаторы постов от новых к старым",
+    )
+
+    class Meta:
+        verbose_name = "Лента подписок"
+        verbose_name_plural = "Ленты подписок"
+
+    @property
+    def ids(self):
+        return [int(pk) for pk in self.post_ids.split(",") if pk]
+
+    @ids.setter
+    def ids(self, values):
+        values = list(values)[: settings.TIMELINE_LENGTH]
+        self.post_ids = ",".join(map(str, values))
+
+
+class PostTerm(models.Model):
+    """Запись обратного индекса: основа слова и число вхождений в пост."""
+
+    term = models.CharField("Основа слова", max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="terms",
+        verbose_name="Пост",
+    )
+    count = models.PositiveSmallIntegerField("Вхождений", default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["term", "post"], name="unique_post_term"
+            ),
+        ]
+        verbose_name = "Слово поста"
+        verbose_name_plural = "Поисковый индекс"
@@ -0,0 +1,328 @@
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+
+from .models import Post, PostTerm
+
+FTS_TABLE = "posts_post_fts"
+TERM_LENGTH = 64
+BATCH_SIZE = 1000
+
+VOWELS = "аеиоуыэюя"
+STOP_WORDS = frozenset(
+    "а без бы в во вот да для до же за и из или к как ли на над не ни "
+    "но о об от по под при про с со так то у что чтобы это".split()
+)
+
+
+def _endings(endings, after_a=()):
+    """Окончания от длинных к коротким с признаком «после а/я»."""
+    table = [(e, False) for e in endings] + [(e, True) for e in after_a]
+    return tuple(sorted(table, key=lambda item: -len(item[0])))
+
+
+# Окончания стеммера Snowball для русского языка. Во второй группе
+# окончание должно стоять после «а» или «я», они не удаляются.
+PERFECTIVE_GERUND = _endings(
+    ("ив", "ивши", "ившись", "ыв", "ывши", "ывшись"),
+    ("в", "вши", "вшись"),
+)
+ADJECTIVE = _endings(
+    "ее ие ые ое ими ыми ей ий ый ой ем им ым ом его ого ему ому их ых "
+    "ую юю ая яя ою ею".split()
+)
+PARTICIPLE = _endings(("ивш", "ывш", "ующ"), ("ем", "нн", "вш", "ющ", "щ"))
+REFLEXIVE = _endings(("ся", "сь"))
+VERB = _endings(
+    "ила ыла ена ейте уйте ите или ыли ей уй ил ыл им ым ен ило ыло "
+    "ено ят ует уют ит ыт ены ить ыть ишь ую ю".split(),
+    "ла на ете йте ли й л ем н ло но ет ют ны ть ешь нно".split(),
+)
+NOUN = _endings(
+    "а ев ов ие ье е иями ями ами еи ии и ией ей ой ий й иям ям ием ем "
+    "ам ом о у ах иях ях ы ь ию ью ю ия ья я".split()
+)
+DERIVATIONAL = _endings(("ост", "ость"))
+SUPERLATIVE = _endings(("ейш", "ейше"))
+
+
+def _strip(word, endings):
+    """Убирает самое длинное окончание; None, если оно не подошло."""
+    for ending, needs_a in endings:
+        if word.endswith(ending):
+            stem = word[: -len(ending)]
+            if needs_a and not stem.endswith(("а", "я")):
+                return None
+            return stem
+    return None
+
+
+def _region(word, start=0):
+    """Начало области после первой пары «гласная, согласная»."""
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+
+def _strip_inflection(tail):
+    """Шаг 1 Snowball: деепричастие или прилагательное, глагол, сущ."""
+    found = _strip(tail, PERFECTIVE_GERUND)
+    if found is not None:
+        return found
+    reflexive = _strip(tail, REFLEXIVE)
+    if reflexive is not None:
+        tail = reflexive
+    adjective = _strip(tail, ADJECTIVE)
+    if adjective is not None:
+        participle = _strip(adjective, PARTICIPLE)
+        return adjective if participle is None else participle
+    for found in (_strip(tail, VERB), _strip(tail, NOUN)):
+        if found is not None:
+            return found
+    return tail
+
+
+@lru_cache(maxsize=65536)
+def stem(word):
+    """Основа русского слова по алгоритму Snowball."""
+    word = word.lower().replace("ё", "е")
+    rv = next((i + 1 for i, ch in enumerate(word) if ch in VOWELS), None)
+    if rv is None:
+        return word
+    r2 = _region(word, _region(word))
+    head, tail = word[:rv], word[rv:]
+
+    tail = _strip_inflection(tail)
+    if tail.endswith("и"):
+        tail = tail[:-1]
+    derivational = _strip(tail, DERIVATIONAL)
+    if derivational is not None and len(head) + len(derivational) >= r2:
+        tail = derivational
+
+    superlative = _strip(tail, SUPERLATIVE)
+    if superlative is not None:
+        tail = superlative
+    if tail.endswith("нн"):
+        tail = tail[:-1]
+    elif superlative is None and tail.endswith("ь"):
+        tail = tail[:-1]
+    return head + tail
+
+
+def terms(text):
+    """Основы слов текста без стоп-слов, в порядке появления."""
+    words = re.findall(r"\w+", text.lower().replace("ё", "е"))
+    return [
+        (stem(word) if re.search("[а-я]", word) else word)[:TERM_LENGTH]
+        for word in words
+        if word not in STOP_WORDS
+    ]
+
+
+@lru_cache(maxsize=None)
+def _fts_table_exists(database):
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+def reset_backend():
+    """Забывает, есть ли таблица FTS5; вызывается после migrate."""
+    _fts_table_exists.cache_clear()
+
+
+def uses_fts():
+    backend = settings.SEARCH_BACKEND
+    if backend != "auto":
+        return backend == "fts5"
+    return connection.vendor == "sqlite" and _fts_table_exists(
+        connection.settings_dict["NAME"]
+    )
+
+
+def _index_many(rows):
+    """Добавляет в индекс пары (id, текст), которых в нём ещё нет."""
+    if uses_fts():
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, terms) VALUES (%s, %s)",
+                [(pk, " ".join(terms(text))) for pk, text in rows],
+            )
+        return
+    PostTerm.objects.bulk_create(
+        PostTerm(post_id=pk, term=term, count=count)
+        for pk, text in rows
+        for term, count in Counter(terms(text)).items()
+    )
+
+
+def index_post(post):
+    """Обновляет запись поста в поисковом индексе."""
+    unindex_post(post.pk)
+    _index_many([(post.pk, post.text)])
+
+
+def unindex_post(post_id):
+    if uses_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post_id]
+            )
+    else:
+        PostTerm.objects.filter(post_id=post_id).delete()
+
+
+def rebuild():
+    """Переиндексирует все посты пачками, возвращает их число."""
+    if uses_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+    else:
+        PostTerm.objects.all().delete()
+    posts = Post.objects.order_by("pk").values_list("pk", "text")
+    total, last = 0, 0
+    while True:
+        rows = list(posts.filter(pk__gt=last)[:BATCH_SIZE])
+        if not rows:
+            return total
+        with transaction.atomic():
+            _index_many(rows)
+        total += len(rows)
+        last = rows[-1][0]
+
+
+def _fts_match(words):
+    return " ".join('"{}"'.format(word.replace('"', '""')) for word in words)
+
+
+def index_texts(posts, texts):
+    """Индексирует посты выборки posts, чьи тексты взяты из texts.
+
+    Основы слов считаются по разу на текст и кладутся во временную
+    таблицу, а строки индекса вставляются одним INSERT … SELECT по
+    совпадению текста — так seed индексирует миллионы постов.
+    """
+    ops = connection.ops
+    texts = list(dict.fromkeys(texts))
+    select, params = (
+        posts.order_by().values("pk", "text").query.sql_with_params()
+    )
+    if uses_fts():
+        rows = [(text, " ".join(terms(text)), 1) for text in texts]
+        insert = (
+            f"INSERT INTO {FTS_TABLE} (rowid, terms) "
+            "SELECT post.id, seed_terms.term"
+        )
+    else:
+        rows = [
+            (text, term, count)
+            for text in texts
+            for term, count in Counter(terms(text)).items()
+        ]
+        insert = (
+            "INSERT INTO {} ({}, {}, {}) "
+            "SELECT post.id, seed_terms.term, seed_terms.count"
+        ).format(
+            ops.quote_name(PostTerm._meta.db_table),
+            *(
+                ops.quote_name(PostTerm._meta.get_field(name).column)
+                for name in ("post", "term", "count")
+            ),
+        )
+    # При ошибке временную таблицу убирает откат транзакции.
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TEMPORARY TABLE seed_terms "
+            "(text TEXT, term TEXT, count INTEGER)"
+        )
+        cursor.executemany("INSERT INTO seed_terms VALUES (%s, %s, %s)", rows)
+        cursor.execute("CREATE INDEX seed_terms_text ON seed_terms (text)")
+        cursor.execute(
+            f"{insert} FROM ({select}) post "
+            "JOIN seed_terms ON seed_terms.text = post.text",
+            params,
+        )
+        cursor.execute("DROP TABLE seed_terms")
+
+
+def _search_fts(words, limit):
+    match = _fts_match(words)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            "ORDER BY rank, rowid DESC LIMIT %s",
+            [match, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_inverted(words, limit):
+    postings = PostTerm.objects.filter(term__in=words).values_list(
+        "term", "post_id", "count"
+    )
+    by_post = {}
+    frequency = Counter()
+    for term, post_id, count in postings:
+        by_post.setdefault(post_id, {})[term] = count
+        frequency[term] += 1
+    total = Post.objects.count()
+    idf = {term: math.log(1 + total / df) for term, df in frequency.items()}
+    scores = {
+        post_id: sum(count * idf[term] for term, count in found.items())
+        for post_id, found in by_post.items()
+        if len(found) == len(words)
+    }
+    ranked = sorted(scores, key=lambda pk: (-scores[pk], -pk))
+    return ranked[:limit]
+
+
+def search(query, limit=None):
+    """Идентификаторы постов по запросу, от более релевантных.
+
+    Все слова запроса должны встретиться в посте. На SQLite
+    ранжирует FTS5 (bm25), иначе — TF-IDF по таблице PostTerm.
+    """
+    words = list(dict.fromkeys(terms(query)))
+    if not words:
+        return []
+    limit = limit or settings.SEARCH_RESULTS_LIMIT
+    if uses_fts():
+        return _search_fts(words, limit)
+    return _search_inverted(words, limit)
+
+
+def filter_matching(queryset, query):
+    """Посты queryset, где встречаются все слова запроса.
+
+    В отличие от search не ранжирует и не ограничивает выдачу:
+    индекс подставляется подзапросом, а не списком id.
+    """
+    words = list(dict.fromkeys(terms(query)))
+    if not words:
+        return queryset.none()
+    if uses_fts():
+        # RawSQL в pk__in получает вторые скобки и становится скалярным
+        # подзапросом, поэтому условие пишется целиком.
+        column = "{}.{}".format(
+            connection.ops.quote_name(Post._meta.db_table),
+            connection.ops.quote_name(Post._meta.pk.column),
+        )
+        return queryset.extra(
+            where=[
+                f"{column} IN (SELECT rowid FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s)"
+            ],
+            params=[_fts_match(words)],
+        )
+    matched = (
+        PostTerm.objects.filter(term__in=words)
+        .values("post")
+        .annotate(found=Count("term"))
+        .filter(found=len(words))
+        .values("post")
+    )
+    return queryset.filter(pk__in=matched)
@@ -0,0 +1,377 @@
+import multiprocessing
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, connections, transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+
+from . import counters, search
+from .images import build_variants
+from .models import Comment, Follow, Group, Post, User
+from .tasks import POST_THUMBNAIL
+
+# Одна транзакция на пачку: фиксация на диск дороже самой вставки.
+BATCH_SIZE = 20000
+# Строки генерируются кусками; у каждого куска свой генератор
+# случайных чисел, поэтому результат не зависит от числа процессов.
+CHUNK_SIZE = 10000
+IMAGE_COUNT = 8
+IMAGE_NAME = "posts/seed-{}.jpg"
+# Тексты берутся из заранее сгенерированного набора: Faker на каждую
+# строку был самой дорогой частью seed.
+TEXT_POOL_SIZE = 1000
+
+DEFAULTS = {
+    "users": 1000,
+    "groups": 20,
+    "posts": 20000,
+    "comments": 20000,
+    "follows": 20000,
+    "alpha": 1.2,
+    "group_share": 0.5,
+    "image_share": 0.0,
+    "days": 365,
+    "seed": 0,
+}
+
+
+@lru_cache(maxsize=4)
+def power_law_weights(count, alpha=1.2):
+    """Накопленные веса закона Ципфа; alpha = 0 — равномерно."""
+    weights = []
+    total = 0.0
+    for rank in range(1, count + 1):
+        total += rank ** -alpha
+        weights.append(total)
+    return weights
+
+
+def _rng(options, kind, chunk):
+    return random.Random(f"{options['seed']}:{kind}:{chunk}")
+
+
+@lru_cache(maxsize=4)
+def text_pool(seed, kind):
+    """Тексты постов (kind="posts") или комментариев, детерминированно."""
+    fake = Faker("ru_RU")
+    fake.seed_instance(f"{seed}:{kind}:texts")
+    if kind == "posts":
+        return tuple(
+            fake.text(max_nb_chars=300) for _ in range(TEXT_POOL_SIZE)
+        )
+    return tuple(fake.sentence() for _ in range(TEXT_POOL_SIZE))
+
+
+def _post_rows(task):
+    """Строки постов: номер текста, автор, группа, картинка, возраст."""
+    options, chunk, count = task
+    rng = _rng(options, "posts", chunk)
+    authors = power_law_weights(options["users"], options["alpha"])
+    population = range(options["users"])
+    # Как в живой базе, дата растёт вместе с id: индексы по дате
+    # дописываются в конец, а не перестраиваются вставками в середину.
+    step = options["days"] * 86400 / options["posts"]
+    rows = []
+    for position in range(chunk * CHUNK_SIZE, chunk * CHUNK_SIZE + count):
+        group = image = None
+        if options["groups"] and rng.random() < options["group_share"]:
+            group = rng.randrange(options["groups"])
+        if rng.random() < options["image_share"]:
+            image = rng.randrange(IMAGE_COUNT)
+        rows.append(
+            (
+                rng.randrange(TEXT_POOL_SIZE),
+                rng.choices(population, cum_weights=authors)[0],
+                group,
+                image,
+                (options["posts"] - position - rng.random()) * step,
+            )
+        )
+    return rows
+
+
+def _comment_rows(task):
+    options, chunk, count = task
+    rng = _rng(options, "comments", chunk)
+    return [
+        (
+            rng.randrange(TEXT_POOL_SIZE),
+            rng.randrange(options["posts"]),
+            rng.randrange(options["users"]),
+            rng.random() * options["days"] * 86400,
+        )
+        for _ in range(count)
+    ]
+
+
+def _follow_rows(task):
+    options, chunk, count = task
+    rng = _rng(options, "follows", chunk)
+    authors = power_law_weights(options["users"], options["alpha"])
+    population = range(options["users"])
+    rows = []
+    for _ in range(count):
+        user = rng.randrange(options["users"])
+        author = rng.choices(population, cum_weights=authors)[0]
+        if user != author:
+            rows.append((user, author))
+    return rows
+
+
+def _chunks(pool, func, options, total):
+    tasks = [
+        (options, chunk, min(CHUNK_SIZE, total - start))
+        for chunk, start in enumerate(range(0, total, CHUNK_SIZE))
+    ]
+    if pool is None:
+        return map(func, tasks)
+    return pool.imap(func, tasks)
+
+
+def _insert(model, fields, rows, ignore_conflicts=False):
+    """Вставляет кортежи значений fields пачками по BATCH_SIZE.
+
+    Каждая пачка — один executemany в своей транзакции: подготовка
+    значений в bulk_create стоила дороже самой вставки.
+    """
+    ops = connection.ops
+    meta = model._meta
+    columns = ", ".join(
+        ops.quote_name(meta.get_field(name).column) for name in fields
+    )
+    sql = "{} {} ({}) VALUES ({}) {}".format(
+        ops.insert_statement(ignore_conflicts=ignore_conflicts),
+        ops.quote_name(meta.db_table),
+        columns,
+        ", ".join(["%s"] * len(fields)),
+        ops.ignore_conflicts_suffix_sql(ignore_conflicts=ignore_conflicts),
+    )
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, batch)
+            batch = []
+    if batch:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, batch)
+
+
+@contextmanager
+def _deferred_indexes(model, count):
+    """Снимает индексы Meta.indexes на время вставки count строк.
+
+    Построить индекс по заполненной таблице быстрее, чем обновлять его
+    на каждой строке; если в таблице строк больше, чем добавится,
+    индексы остаются на месте.
+    """
+    indexes = model._meta.indexes
+    if count < model.objects.count():
+        indexes = []
+    # Редактор схемы без входа в контекст: seed может идти внутри
+    # транзакции, а в SQLite это мешает только переделке таблиц.
+    editor = connection.schema_editor()
+    for index in indexes:
+        editor.remove_index(model, index)
+    try:
+        yield
+    finally:
+        for index in indexes:
+            editor.add_index(model, index)
+
+
+def _ids(queryset):
+    """id новых строк; непрерывный диапазон не материализуется."""
+    bounds = queryset.aggregate(
+        first=Min("pk"), last=Max("pk"), total=Count("pk")
+    )
+    if not bounds["total"]:
+        return []
+    if bounds["last"] - bounds["first"] + 1 == bounds["total"]:
+        return range(bounds["first"], bounds["last"] + 1)
+    return list(queryset.order_by("pk").values_list("pk", flat=True))
+
+
+def _last_pk(model):
+    return model.objects.aggregate(last=Max("pk"))["last"] or 0
+
+
+def seed_images(seed=0):
+    """Картинки для постов: несколько файлов на все посты.
+
+    Миниатюра и варианты каждого файла готовятся здесь один раз,
+    а не задачей на каждый пост; возвращает манифесты вариантов.
+    """
+    rng = random.Random(f"{seed}:images")
+    geometry, thumbnail_options = POST_THUMBNAIL
+    manifests = []
+    for i in range(IMAGE_COUNT):
+        name = IMAGE_NAME.format(i)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        if not default_storage.exists(name):
+            buffer = BytesIO()
+            Image.new("RGB", (1440, 810), color).save(buffer, "JPEG")
+            default_storage.save(name, ContentFile(buffer.getvalue()))
+        image = Post(image=name).image
+        get_thumbnail(image, geometry, **thumbnail_options)
+        manifests.append(build_variants(image))
+    return manifests
+
+
+def seed(processes=1, **options):
+    """Заполняет базу синтетическими данными, детерминированно по seed.
+
+    Авторы постов и цели подписок выбираются по закону Ципфа с
+    показателем alpha: у немногих авторов много постов и подписчиков.
+    Случайные значения готовят processes процессов, тексты берутся из
+    набора text_pool, строки вставляются пачками в основном процессе.
+    Счётчики пересчитываются в конце, новые посты попадают в поисковый
+    индекс одним запросом, ленты подписок новых пользователей соберутся
+    при первом открытии.
+    """
+    options = {**DEFAULTS, **options}
+    manifests = []
+    if options["image_share"]:
+        manifests = seed_images(options["seed"])
+    post_texts = text_pool(options["seed"], "posts")
+    comment_texts = text_pool(options["seed"], "comments")
+    user_start, group_start = _last_pk(User), _last_pk(Group)
+    post_start = _last_pk(Post)
+    now = timezone.now()
+    adapt = connection.ops.adapt_datetimefield_value
+    joined = adapt(now)
+    # От наивного времени в часовом поясе базы adapt не пересчитывает
+    # пояс на каждой строке.
+    if settings.USE_TZ:
+        now = timezone.make_naive(now, connection.timezone)
+    _insert(
+        User,
+        (
+            "username",
+            "password",
+            "first_name",
+            "last_name",
+            "email",
+            "is_superuser",
+            "is_staff",
+            "is_active",
+            "date_joined",
+        ),
+        (
+            (f"user{user_start + i + 1}", "!", "", "", "")
+            + (False, False, True, joined)
+            for i in range(options["users"])
+        ),
+    )
+    Group.objects.bulk_create(
+        Group(
+            title=f"Группа {group_start + i + 1}",
+            slug=f"group-{group_start + i + 1}",
+            description="Синтетическая группа",
+        )
+        for i in range(options["groups"])
+    )
+    user_ids = _ids(User.objects.filter(pk__gt=user_start))
+    group_ids = _ids(Group.objects.filter(pk__gt=group_start))
+
+    pool = None
+    if processes > 1:
+        # Соединения с базой не должны переходить в дочерние процессы.
+        connections.close_all()
+        pool = multiprocessing.get_context("fork").Pool(processes)
+    try:
+        with _deferred_indexes(Post, options["posts"]):
+            _insert(
+                Post,
+                (
+                    "text",
+                    "author",
+                    "group",
+                    "image",
+                    "thumbnail_ready",
+                    "image_variants",
+                    "pub_date",
+                    "comments_count",
+                    "fanned_out",
+                ),
+                (
+                    (
+                        post_texts[text],
+                        user_ids[author],
+                        None if group is None else group_ids[group],
+                        "" if image is None else IMAGE_NAME.format(image),
+                        # Посты одной картинки делят её готовые варианты.
+                        image is not None,
+                        "" if image is None else manifests[image],
+                        adapt(now - timedelta(seconds=age)),
+                        0,
+                        True,
+                    )
+                    for rows in _chunks(
+                        pool, _post_rows, options, options["posts"]
+                    )
+                    for text, author, group, image, age in rows
+                ),
+            )
+        post_ids = _ids(Post.objects.filter(pk__gt=post_start))
+        with _deferred_indexes(Comment, options["comments"]):
+            _insert(
+                Comment,
+                ("text", "post", "author", "created"),
+                (
+                    (
+                        comment_texts[text],
+                        post_ids[post],
+                        user_ids[author],
+                        adapt(now - timedelta(seconds=age)),
+                    )
+                    for rows in _chunks(
+                        pool,
+                        _comment_rows,
+                        options,
+                        options["comments"] if post_ids else 0,
+                    )
+                    for text, post, author, age in rows
+                ),
+            )
+        # Повторные пары отбрасывает уникальное ограничение подписок.
+        _insert(
+            Follow,
+            ("user", "author"),
+            (
+                (user_ids[user], user_ids[author])
+                for rows in _chunks(
+                    pool, _follow_rows, options, options["follows"]
+                )
+                for user, author in rows
+            ),
+            ignore_conflicts=True,
+        )
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    new_users = User.objects.filter(pk__gt=user_start)
+    new_posts = Post.objects.filter(pk__gt=post_start)
+    counters.recount_authors(new_users.values_list("pk", flat=True))
+    counters.recount_posts(new_posts)
+    search.index_texts(new_posts, post_texts)
+    return {
+        "users": len(user_ids),
+        "groups": len(group_ids),
+        "posts": len(post_ids),
+        "comments": Comment.objects.filter(post__pk__gt=post_start).count(),
+        "follows": Follow.objects.filter(user__pk__gt=user_start).count(),
+    }
@@ -0,0 +1,142 @@
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete,
+    post_migrate,
+    post_save,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from core.queue import enqueue
+
+from . import caching, counters, search, timeline
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+from .tasks import drop_unused_variants, generate_thumbnails
+
+
+def _invalidate_comment_post(post_id):
+    post = Post.objects.filter(pk=post_id).values("author_id", "group_id")
+    for fields in post:
+        caching.invalidate_post(
+            post_id, fields["author_id"], fields["group_id"]
+        )
+
+
+def _loaded(instance):
+    # Значения полей, прочитанные из базы (Post.from_db).
+    return instance.__dict__.setdefault("_loaded_values", {})
+
+
+def _image_changed(instance):
+    loaded = _loaded(instance)
+    if instance.pk is not None and "image" not in loaded:
+        # Картинку не читали из базы, значит, и не заменяли.
+        return False
+    return (instance.image.name or "") != str(loaded.get("image") or "")
+
+
+def _drop_variants(variants, name, post_id):
+    if variants:
+        # Файлы удаляются, только когда новая запись уже в базе.
+        transaction.on_commit(
+            lambda: drop_unused_variants(variants, name, post_id)
+        )
+
+
+@receiver(pre_save, sender=Post)
+def image_replaced(sender, instance, **kwargs):
+    instance._image_changed = _image_changed(instance)
+    if instance._image_changed:
+        if instance.pk is not None:
+            # Задача могла дописать варианты после чтения поста.
+            stored = (
+                Post.objects.filter(pk=instance.pk)
+                .values_list("image_variants", "image")
+                .first()
+            )
+            if stored is not None:
+                _drop_variants(*stored, instance.pk)
+        instance.thumbnail_ready = False
+        instance.image_variants = ""
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    loaded = _loaded(instance)
+    caching.invalidate_post(
+        instance.pk,
+        instance.author_id,
+        instance.group_id,
+        loaded.get("group_id"),
+    )
+    loaded["group_id"] = instance.group_id
+    if "image" in instance.__dict__:
+        loaded["image"] = instance.image.name
+    if instance.__dict__.pop("_image_changed", False) and instance.image:
+        # Миниатюры готовит воркер, а не запрос пользователя.
+        enqueue(generate_thumbnails, instance.pk)
+    search.index_post(instance)
+    if created:
+        counters.bump_author(instance.author_id, "posts_count", 1)
+        timeline.push_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    caching.invalidate_post(instance.pk, instance.author_id, instance.group_id)
+    counters.bump_author(instance.author_id, "posts_count", -1)
+    _drop_variants(
+        instance.__dict__.get("image_variants"),
+        str(instance.__dict__.get("image") or ""),
+        instance.pk,
+    )
+    search.unindex_post(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        # Счётчики заводятся при регистрации, а не при первом чтении.
+        AuthorStats.objects.get_or_create(user_id=instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_post(instance.post_id, 1)
+        _invalidate_comment_post(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_post(instance.post_id, -1)
+    _invalidate_comment_post(instance.post_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created and instance.user_id and instance.author_id:
+        counters.bump_author(instance.author_id, "followers_count", 1)
+        counters.bump_author(instance.user_id, "following_count", 1)
+        caching.bump_feed_versions("pages", "follows")
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    if instance.user_id and instance.author_id:
+        counters.bump_author(instance.author_id, "followers_count", -1)
+        counters.bump_author(instance.user_id, "following_count", -1)
+        caching.bump_feed_versions("pages", "follows")
+        timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    caching.bump_feed_versions("pages", "groups", f"group:{instance.pk}")
+
+
+@receiver(post_migrate)
+def schema_changed(sender, **kwargs):
+    search.reset_backend()
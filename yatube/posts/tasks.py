@@ -0,0 +1,38 @@
+from sorl.thumbnail import get_thumbnail
+
+from core.queue import task
+
+from .caching import invalidate_post
+from .images import build_variants, delete_variants
+from .models import Post
+
+POST_THUMBNAIL = ("960x339", {"crop": "center", "upscale": True})
+
+
+def drop_unused_variants(variants, name, post_id):
+    """Удаляет варианты картинки name, если её не показывают другие посты.
+
+    Варианты лежат по имени файла, а один файл могут делить несколько
+    постов, например синтетические из seed.
+    """
+    others = Post.objects.filter(image=name).exclude(pk=post_id)
+    if variants and not others.exists():
+        delete_variants(variants)
+
+
+@task
+def generate_thumbnails(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    geometry, options = POST_THUMBNAIL
+    get_thumbnail(post.image, geometry, **options)
+    variants = build_variants(post.image)
+    # Картинку могли заменить, пока задача ждала в очереди.
+    updated = Post.objects.filter(pk=post.pk, image=post.image.name).update(
+        thumbnail_ready=True, image_variants=variants
+    )
+    if not updated:
+        drop_unused_variants(variants, post.image.name, post.pk)
+        return
+    invalidate_post(post.pk, post.author_id, post.group_id)
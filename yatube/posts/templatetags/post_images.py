@@ -0,0 +1,45 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from posts.images import FORMATS, variant_name
+
+register = template.Library()
+
+SIZES = "(max-width: 960px) 100vw, 960px"
+
+
+def _srcset(manifest, ext):
+    return ", ".join(
+        f"{default_storage.url(variant_name(manifest, width, ext))} {width}w"
+        for width in manifest["widths"]
+    )
+
+
+@register.simple_tag
+def post_picture(post, css_class="card-img my-2"):
+    """<picture> с вариантами картинки поста в разных форматах."""
+    manifest = post.variants
+    if not manifest:
+        return ""
+    mime_types = {ext: mime for ext, _, mime in FORMATS}
+    sources = format_html_join(
+        "",
+        '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (mime_types[ext], _srcset(manifest, ext), SIZES)
+            for ext in manifest["formats"]
+            if ext != "jpg"
+        ),
+    )
+    fallback = variant_name(manifest, manifest["widths"][0], "jpg")
+    return format_html(
+        '<picture>{}<img class="{}" src="{}" srcset="{}" sizes="{}" '
+        'width="960" height="339" loading="lazy" decoding="async" '
+        'alt=""></picture>',
+        sources,
+        css_class,
+        default_storage.url(fallback),
+        _srcset(manifest, "jpg"),
+        SIZES,
+    )
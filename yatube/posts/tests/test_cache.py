@@ -0,0 +1,136 @@
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..caching import POST_FRAGMENT, feed_version
+from ..models import Comment, Group, Post, User
+
+INDEX_PAGE = reverse("posts:index")
+
+
+class FeedCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="TestUser")
+        cls.group = Group.objects.create(
+            title="Тест группа",
+            slug="test_slug",
+            description="Описание",
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f"Тестовый текст {i}", author=cls.author, group=cls.group
+            )
+            for i in range(12)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def fragment_cached(self, post):
+        key = make_template_fragment_key(POST_FRAGMENT, [post.pk])
+        return cache.get(key) is not None
+
+    def test_pages_are_cached_separately(self):
+        """Вторая страница не отдаёт закэшированную первую."""
+        first = self.guest_client.get(INDEX_PAGE)
+        cursor = first.context["page_obj"].paginator.next_cursor
+        second = self.guest_client.get(INDEX_PAGE, {"cursor": cursor})
+        self.assertContains(second, "Тестовый текст 0")
+        self.assertNotContains(first, "Тестовый текст 0")
+
+    def test_new_post_is_visible_at_once(self):
+        """Новый пост виден сразу, без ожидания истечения кэша."""
+        self.guest_client.get(INDEX_PAGE)
+        Post.objects.create(text="Свежий пост", author=self.author)
+        self.assertContains(self.guest_client.get(INDEX_PAGE), "Свежий пост")
+
+    def test_edit_invalidates_only_its_fragment(self):
+        """Правка поста сбрасывает только его фрагмент."""
+        self.guest_client.get(INDEX_PAGE)
+        edited, untouched = self.posts[-1], self.posts[-2]
+        self.assertTrue(self.fragment_cached(edited))
+        edited.text = "Исправленный текст"
+        edited.save()
+        self.assertFalse(self.fragment_cached(edited))
+        self.assertTrue(self.fragment_cached(untouched))
+        self.assertContains(
+            self.guest_client.get(INDEX_PAGE), "Исправленный текст"
+        )
+
+    def test_mutations_bump_scoped_versions(self):
+        """Изменения постов и комментариев сдвигают версии своих лент."""
+        scopes = ("all", f"group:{self.group.pk}", f"author:{self.author.pk}")
+        other_scope = "author:0"
+        before = {scope: feed_version(scope) for scope in scopes}
+        other_before = feed_version(other_scope)
+        Comment.objects.create(
+            post=self.posts[0], author=self.author, text="Коммент"
+        )
+        for scope in scopes:
+            with self.subTest(scope=scope):
+                self.assertGreater(feed_version(scope), before[scope])
+        self.assertEqual(feed_version(other_scope), other_before)
+
+    def test_group_and_profile_pages_are_refreshed(self):
+        """Страницы группы и профиля обновляются после нового поста."""
+        urls = (
+            reverse("posts:group_list", args=[self.group.slug]),
+            reverse("posts:profile", args=[self.author.username]),
+        )
+        for url in urls:
+            self.guest_client.get(url)
+        Post.objects.create(
+            text="Свежий пост", author=self.author, group=self.group
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url), "Свежий пост")
+
+    def test_cached_page_skips_post_queries(self):
+        """Повторный показ страницы не читает посты из базы."""
+        # Читатель со входом: целые страницы кэшируются только для гостей.
+        reader = Client()
+        reader.force_login(self.author)
+        reader.get(INDEX_PAGE)
+        with CaptureQueriesContext(connection) as queries:
+            reader.get(INDEX_PAGE)
+        self.assertFalse(
+            [
+                query
+                for query in queries.captured_queries
+                if '"posts_post"."text"' in query["sql"]
+            ]
+        )
+
+    def test_group_rename_is_visible_at_once(self):
+        """Новое название группы сразу видно в ленте."""
+        reader = Client()
+        reader.force_login(self.author)
+        reader.get(INDEX_PAGE)
+        self.group.title = "Новое название"
+        self.group.save()
+        self.assertContains(reader.get(INDEX_PAGE), "Новое название")
+
+    def test_save_does_not_reread_group(self):
+        """Сохранение поста не перечитывает прежнюю группу."""
+        post = Post.objects.get(pk=self.posts[0].pk)
+        other = Group.objects.create(title="Другая", slug="other")
+        before = feed_version(f"group:{self.group.pk}")
+        post.group = other
+        with CaptureQueriesContext(connection) as queries:
+            post.save()
+        self.assertFalse(
+            [
+                query
+                for query in queries.captured_queries
+                if query["sql"].startswith("SELECT")
+                and 'FROM "posts_post"' in query["sql"]
+            ]
+        )
+        self.assertGreater(feed_version(f"group:{self.group.pk}"), before)
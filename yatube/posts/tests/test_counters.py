@@ -0,0 +1,83 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import AuthorStats, Comment, Follow, Post, User
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.post = Post.objects.create(text="Тестовый пост", author=cls.author)
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_counters_follow_changes(self):
+        """Счётчики меняются при создании и удалении объектов."""
+        self.reader_client.get(reverse("posts:profile", args=[self.author]))
+        self.reader_client.get(reverse("posts:profile", args=[self.reader]))
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        comment = Comment.objects.create(
+            post=self.post, author=self.reader, text="Коммент"
+        )
+        second = Post.objects.create(text="Второй пост", author=self.author)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 2)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+
+        follow.delete()
+        comment.delete()
+        second.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_profile_reads_counter(self):
+        """Профиль не считает посты автора запросом COUNT."""
+        url = reverse("posts:profile", args=[self.author])
+        self.reader_client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.reader_client.get(url)
+        for query in queries.captured_queries:
+            with self.subTest(sql=query["sql"]):
+                self.assertNotIn("COUNT(", query["sql"])
+        self.assertEqual(response.context["count"], 1)
+        self.assertEqual(response.context["stats"].posts_count, 1)
+
+    def test_recount_repairs_drift(self):
+        """Команда recount исправляет рассинхронизацию счётчиков."""
+        Post.objects.bulk_create(
+            Post(text="Без сигналов", author=self.author) for _ in range(3)
+        )
+        Comment.objects.bulk_create(
+            [Comment(post=self.post, author=self.reader, text="Коммент")]
+        )
+        Follow.objects.bulk_create(
+            [Follow(user=self.reader, author=self.author)]
+        )
+        out = StringIO()
+        call_command("recount", stdout=out)
+        self.assertIn("авторов: 2, постов: 1", out.getvalue())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 4)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
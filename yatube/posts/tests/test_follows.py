@@ -0,0 +1,126 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..follows import bulk_follow, bulk_unfollow
+from ..models import AuthorStats, Follow, Post, Timeline, User
+from ..timeline import rebuild
+
+
+class BulkFollowTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = [
+            User.objects.create_user(username=f"user{i}") for i in range(4)
+        ]
+        cls.post = Post.objects.create(text="Пост", author=cls.users[1])
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_bulk_follow_dedupes_and_recounts(self):
+        """Повторы, подписки на себя и неизвестные id пропускаются."""
+        reader, author, other, _ = (user.pk for user in self.users)
+        Follow.objects.create(user_id=reader, author_id=other)
+        rebuild([reader])
+        summary = bulk_follow(
+            [
+                (reader, author),
+                (reader, author),
+                (reader, other),
+                (reader, reader),
+                (reader, 10**6),
+                (other, author),
+            ],
+            batch_size=2,
+        )
+        self.assertEqual(summary["read"], 6)
+        self.assertEqual(summary["duplicates"], 1)
+        self.assertEqual(summary["skipped"], 2)
+        self.assertEqual(summary["created"], 2)
+        self.assertEqual(self.stats(self.users[1]).followers_count, 2)
+        self.assertEqual(self.stats(self.users[0]).following_count, 2)
+        self.assertEqual(
+            Timeline.objects.get(user_id=reader).ids, [self.post.pk]
+        )
+
+    def test_bulk_follow_counts_created_per_batch(self):
+        """created не зависит от чужих подписок и всей таблицы."""
+        reader, author, other, last = (user.pk for user in self.users)
+        Follow.objects.create(user_id=other, author_id=last)
+        Follow.objects.create(user_id=reader, author_id=author)
+        with CaptureQueriesContext(connection) as queries:
+            summary = bulk_follow([(reader, author), (reader, last)])
+        self.assertEqual(summary["created"], 1)
+        whole_table = 'COUNT(*) AS "__count" FROM "posts_follow"'
+        self.assertFalse(
+            any(
+                query["sql"].endswith(whole_table)
+                for query in queries.captured_queries
+            )
+        )
+
+    def test_bulk_unfollow(self):
+        """Массовая отписка удаляет пары и пересчитывает счётчики."""
+        reader, author, other, _ = (user.pk for user in self.users)
+        bulk_follow([(reader, author), (reader, other), (other, author)])
+        deleted = bulk_unfollow([(reader, author), (reader, other)])
+        self.assertEqual(deleted, 2)
+        self.assertEqual(
+            list(Follow.objects.values_list("user_id", "author_id")),
+            [(other, author)],
+        )
+        self.assertEqual(self.stats(self.users[1]).followers_count, 1)
+        self.assertEqual(self.stats(self.users[0]).following_count, 0)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as target:
+            target.write(content)
+        return path
+
+    def test_import_follows_command(self):
+        """import_follows читает CSV и JSON Lines с id и именами."""
+        ids = [user.pk for user in self.users]
+        csv_path = self.write(
+            "edges.csv", f"user,author\n{ids[0]},{ids[1]}\n{ids[2]},{ids[1]}\n"
+        )
+        jsonl_path = self.write(
+            "edges.jsonl",
+            json.dumps({"user": ids[3], "author": ids[1]})
+            + "\n"
+            + json.dumps([ids[0], ids[1]])
+            + "\n",
+        )
+        out = StringIO()
+        call_command("import_follows", csv_path, jsonl_path, stdout=out)
+        self.assertIn("создано: 3", out.getvalue())
+        self.assertIn("повторов: 1", out.getvalue())
+        self.assertEqual(self.stats(self.users[1]).followers_count, 3)
+
+        names = self.write("names.csv", "user0,user3\nuser0,nobody\n")
+        out = StringIO()
+        call_command("import_follows", names, "--usernames", stdout=out)
+        self.assertIn("создано: 1", out.getvalue())
+        self.assertIn("пропущено: 1", out.getvalue())
+
+        call_command(
+            "import_follows", names, "--usernames", "--unfollow", stdout=out
+        )
+        self.assertFalse(
+            Follow.objects.filter(
+                user=self.users[0], author=self.users[3]
+            ).exists()
+        )
@@ -1,16 +1,44 @@
+import json
+import os
+import pickle
 import shutil
+import struct
 import tempfile
+import traceback
+import zlib
+from io import BytesIO
 
 from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.template import Context, Template
+from django.test import (
+    Client,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
 from django.urls import reverse
 
+from core.models import Task
+from core.queue import work
+from PIL import Image
+
 from posts.forms import PostForm
+from posts.images import build_variants, variant_name, variants_path
 
 from ..models import Group, Post, User
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b"\x47\x49\x46\x38\x39\x61\x02\x00"
+    b"\x01\x00\x80\x00\x00\x00\x00\x00"
+    b"\xFF\xFF\xFF\x21\xF9\x04\x00\x00"
+    b"\x00\x00\x00\x2C\x00\x00\x00\x00"
+    b"\x02\x00\x01\x00\x00\x02\x02\x0C"
+    b"\x0A\x00\x3B"
+)
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -88,3 +116,347 @@ class PostCreateFormTest(TestCase):
         )
         self.assertEqual(response.context["post"], self.post)
         self.assertEqual(response.context["is_edit"], True)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPipelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="TestUser")
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_user = Client()
+        self.authorized_user.force_login(self.user)
+
+    def test_thumbnail_generated_by_worker(self):
+        """Миниатюру готовит воркер, до этого показывается оригинал."""
+        uploaded = SimpleUploadedFile(
+            name="thumb.gif", content=SMALL_GIF, content_type="image/gif"
+        )
+        self.authorized_user.post(
+            reverse("posts:post_create"),
+            data={"text": "Пост с картинкой", "image": uploaded},
+        )
+        post = Post.objects.get(text="Пост с картинкой")
+        self.assertFalse(post.thumbnail_ready)
+        self.assertTrue(
+            Task.objects.filter(name__endswith="generate_thumbnails").exists()
+        )
+        detail = reverse("posts:post_detail", args=[post.pk])
+        response = self.authorized_user.get(detail)
+        self.assertContains(response, post.image.url)
+
+        work(once=True)
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnail_ready)
+        self.assertFalse(Task.objects.exists())
+        response = self.authorized_user.get(detail)
+        self.assertContains(response, settings.MEDIA_URL + "cache/")
+        self.assertNotContains(response, post.image.url)
+        response = self.authorized_user.get(reverse("posts:index"))
+        self.assertContains(response, "<picture>")
+        path = post.variants["path"]
+        self.assertContains(response, f"{path}-480.jpg 480w")
+        self.assertNotContains(response, post.image.url)
+
+    def test_edit_without_new_image_keeps_thumbnail(self):
+        """Правка текста не ставит миниатюру в очередь заново."""
+        post = Post.objects.create(
+            text="Текст",
+            author=self.user,
+            image=SimpleUploadedFile("keep.gif", SMALL_GIF, "image/gif"),
+        )
+        work(once=True)
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnail_ready)
+        self.authorized_user.post(
+            reverse("posts:post_edit", args=[post.pk]),
+            data={"text": "Новый текст"},
+        )
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnail_ready)
+        self.assertFalse(Task.objects.exists())
+
+    def test_image_set_outside_form_is_queued(self):
+        """Картинка, заданная через ORM, тоже получает миниатюры."""
+        post = Post.objects.create(text="Без картинки", author=self.user)
+        self.assertFalse(Task.objects.exists())
+        post.image = SimpleUploadedFile("orm.gif", SMALL_GIF, "image/gif")
+        post.save()
+        self.assertFalse(post.thumbnail_ready)
+        work(once=True)
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnail_ready)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGE_WIDTHS=(64, 128))
+class ImageVariantsTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_variants_manifest_and_files(self):
+        """Варианты картинки сохраняются во всех доступных форматах."""
+        image = BytesIO()
+        Image.new("RGB", (100, 60), "red").save(image, "PNG")
+        post = Post(
+            image=SimpleUploadedFile("wide.png", image.getvalue(), "image/png")
+        )
+        post.image.save("wide.png", post.image.file, save=False)
+        manifest = json.loads(build_variants(post.image))
+        self.assertEqual(manifest["widths"], [64])
+        self.assertIn("jpg", manifest["formats"])
+        for ext in manifest["formats"]:
+            with self.subTest(ext=ext):
+                name = variant_name(manifest, 64, ext)
+                with default_storage.open(name) as variant:
+                    self.assertEqual(Image.open(variant).size, (64, 23))
+
+    def test_variants_path_differs_by_extension(self):
+        """У a.png и a.jpg разные варианты."""
+        self.assertNotEqual(
+            variants_path("posts/a.png"), variants_path("posts/a.jpg")
+        )
+        self.assertTrue(variants_path("posts/a.png").startswith("posts/"))
+
+    def test_picture_tag_sources(self):
+        """Тег post_picture выводит source для каждого формата."""
+        post = Post(
+            image_variants=json.dumps(
+                {
+                    "path": "posts/variants/pic",
+                    "widths": [480, 960],
+                    "formats": ["webp", "jpg"],
+                }
+            )
+        )
+        html = Template(
+            "{% load post_images %}{% post_picture post %}"
+        ).render(Context({"post": post}))
+        self.assertIn(
+            '<source type="image/webp" '
+            'srcset="/media/posts/variants/pic-480.webp 480w, '
+            '/media/posts/variants/pic-960.webp 960w"',
+            html,
+        )
+        self.assertIn('src="/media/posts/variants/pic-480.jpg"', html)
+        self.assertEqual(
+            Template("{% load post_images %}{% post_picture post %}").render(
+                Context({"post": Post()})
+            ),
+            "",
+        )
+
+
+def png_upload(name, color):
+    image = BytesIO()
+    Image.new("RGB", (100, 60), color).save(image, "PNG")
+    return SimpleUploadedFile(name, image.getvalue(), "image/png")
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGE_WIDTHS=(64,), TASKS_EAGER=True
+)
+class VariantCleanupTest(TransactionTestCase):
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def variant_files(self, post):
+        manifest = post.variants
+        return [
+            variant_name(manifest, width, ext)
+            for width in manifest["widths"]
+            for ext in manifest["formats"]
+        ]
+
+    def test_replaced_image_variants_are_deleted(self):
+        """Замена и удаление картинки удаляют прежние варианты."""
+        user = User.objects.create_user(username="TestUser")
+        post = Post.objects.create(
+            text="Текст", author=user, image=png_upload("a.png", "red")
+        )
+        post.refresh_from_db()
+        old = self.variant_files(post)
+        self.assertTrue(all(map(default_storage.exists, old)))
+        post.image = png_upload("a.jpg", "blue")
+        post.save()
+        post.refresh_from_db()
+        new = self.variant_files(post)
+        self.assertFalse(any(map(default_storage.exists, old)))
+        self.assertTrue(all(map(default_storage.exists, new)))
+        post.delete()
+        self.assertFalse(any(map(default_storage.exists, new)))
+
+    def test_shared_image_variants_are_kept(self):
+        """Варианты общей картинки живут, пока её показывает хоть один пост."""
+        user = User.objects.create_user(username="TestUser")
+        post = Post.objects.create(
+            text="Текст", author=user, image=png_upload("a.png", "red")
+        )
+        twin = Post.objects.create(
+            text="Копия", author=user, image=post.image.name
+        )
+        post.refresh_from_db()
+        files = self.variant_files(post)
+        post.delete()
+        self.assertTrue(all(map(default_storage.exists, files)))
+        twin.refresh_from_db()
+        twin.delete()
+        self.assertFalse(any(map(default_storage.exists, files)))
+
+
+def png_header(width, height):
+    """PNG, у которого в заголовке указан размер, а пикселей почти нет."""
+
+    def chunk(kind, data):
+        crc = zlib.crc32(kind + data)
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(
+            ">I", crc
+        )
+
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", ihdr)
+        + chunk(b"IDAT", zlib.compress(b"\x00"))
+        + chunk(b"IEND", b"")
+    )
+
+
+def peak_memory(func):
+    """Пиковый прирост RSS в байтах при вызове func и её результат.
+
+    func выполняется в дочернем процессе: VmHWM потомка после fork
+    равен текущему RSS, поэтому разница — память самой загрузки,
+    включая буферы Pillow, которые не видит tracemalloc.
+    """
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # Потомок не должен вернуться в тестовый раннер: при любой
+        # ошибке он передаёт её родителю и завершается.
+        try:
+            os.close(read_end)
+            try:
+                before = _proc_status("VmHWM")
+                result = func()
+                outcome = (_proc_status("VmHWM") - before, result, None)
+            except Exception as error:
+                outcome = (None, None, error)
+            try:
+                data = pickle.dumps(outcome)
+            except Exception:
+                data = pickle.dumps(
+                    (None, None, RuntimeError(traceback.format_exc()))
+                )
+            with os.fdopen(write_end, "wb") as pipe:
+                pipe.write(data)
+        finally:
+            os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end, "rb") as pipe:
+        data = pipe.read()
+    os.waitpid(pid, 0)
+    if not data:
+        raise RuntimeError("Дочерний процесс завершился без ответа")
+    peak, result, error = pickle.loads(data)
+    if error is not None:
+        raise error
+    return peak, result
+
+
+def _proc_status(field):
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) * 1024
+    raise KeyError(field)
+
+
+def jpeg_upload(size, name="big.jpg"):
+    image = BytesIO()
+    Image.new("RGB", size, "blue").save(image, "JPEG")
+    return SimpleUploadedFile(name, image.getvalue(), "image/jpeg")
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POST_IMAGE_MAX_SIDE=1000,
+    POST_IMAGE_MAX_PIXELS=40_000_000,
+)
+class UploadLimitsTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def form(self, upload):
+        return PostForm(data={"text": "Картинка"}, files={"image": upload})
+
+    def test_large_jpeg_downscaled_without_full_decode(self):
+        """Большой JPEG уменьшается, не раскрываясь целиком в памяти."""
+        upload = jpeg_upload((6000, 4000))
+        full_decode = 6000 * 4000 * 3
+
+        def validate():
+            form = self.form(upload)
+            image = form.cleaned_data["image"] if form.is_valid() else None
+            return {
+                "errors": form.errors,
+                "size": list(Image.open(image).size) if image else None,
+            }
+
+        if not os.path.exists("/proc/self/status"):
+            self.skipTest("Нужен /proc для замера памяти.")
+        peak, result = peak_memory(validate)
+        self.assertEqual(result["errors"], {})
+        self.assertEqual(result["size"], [1000, 667])
+        self.assertLess(
+            peak,
+            full_decode // 2,
+            f"Пик памяти загрузки {peak / 2 ** 20:.1f} МБ",
+        )
+
+    def test_small_image_kept_as_is(self):
+        """Картинка в пределах лимитов сохраняется без перекодирования."""
+        upload = jpeg_upload((800, 600))
+        form = self.form(upload)
+        self.assertTrue(form.is_valid())
+        self.assertIs(form.cleaned_data["image"], upload)
+
+    def test_decompression_bomb_rejected_by_header(self):
+        """Картинка с огромным разрешением отклоняется по заголовку."""
+        for width, height in ((8000, 8000), (30000, 30000)):
+            with self.subTest(size=(width, height)):
+                form = self.form(
+                    SimpleUploadedFile(
+                        "bomb.png", png_header(width, height), "image/png"
+                    )
+                )
+                self.assertFalse(form.is_valid())
+                self.assertIn("image", form.errors)
+
+    def test_unsupported_format_rejected(self):
+        """Форматы кроме JPEG, PNG, GIF и WebP не принимаются."""
+        image = BytesIO()
+        Image.new("RGB", (10, 10)).save(image, "BMP")
+        form = self.form(
+            SimpleUploadedFile("pic.bmp", image.getvalue(), "image/bmp")
+        )
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors["image"][0][:14], "Поддерживаются")
+
+    @override_settings(POST_IMAGE_MAX_BYTES=1024)
+    def test_file_size_limit(self):
+        """Файл больше POST_IMAGE_MAX_BYTES не принимается."""
+        form = self.form(jpeg_upload((800, 600)))
+        self.assertFalse(form.is_valid())
+        self.assertIn("image", form.errors)
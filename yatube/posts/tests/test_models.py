@@ -1,7 +1,8 @@
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Follow, Group, Post
 
 User = get_user_model()
 
@@ -89,3 +90,10 @@ class PostModelTest(TestCase):
                 self.assertEqual(
                     task_post._meta.get_field(field).help_text, expected_value
                 )
+
+    def test_follow_is_unique(self):
+        """Повторная подписка на автора запрещена на уровне базы."""
+        reader = User.objects.create_user(username="reader")
+        Follow.objects.create(user=reader, author=self.user)
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(user=reader, author=self.user)
@@ -0,0 +1,167 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post, PostTerm, User
+from ..search import (
+    TERM_LENGTH,
+    _fts_table_exists,
+    filter_matching,
+    rebuild,
+    search,
+    stem,
+    terms,
+    uses_fts,
+)
+
+BACKENDS = ("fts5", "inverted")
+
+
+class StemTest(TestCase):
+    def test_russian_stems(self):
+        """Стеммер отбрасывает окончания по правилам Snowball."""
+        samples = {
+            "красивая": "красив",
+            "книги": "книг",
+            "важнейшие": "важн",
+            "бессмысленность": "бессмыслен",
+            "встречавшихся": "встреча",
+            "подгибающимися": "подгиба",
+            "ёжик": "ежик",
+        }
+        for word, expected in samples.items():
+            with self.subTest(word=word):
+                self.assertEqual(stem(word), expected)
+
+    def test_terms_skip_stop_words(self):
+        """Стоп-слова не индексируются, латиница не стеммится."""
+        self.assertEqual(terms("Кошки и Django"), ["кошк", "django"])
+
+    def test_long_terms_are_truncated(self):
+        """Любое слово обрезается до длины поля PostTerm.term."""
+        for word in ("a" * 100, "1" * 80, "ж" * 90):
+            with self.subTest(word=word[:1]):
+                (term,) = terms(word)
+                self.assertEqual(len(term), TERM_LENGTH)
+
+    def test_backend_check_is_reset_by_migrate(self):
+        """После migrate наличие таблицы FTS5 проверяется заново."""
+        uses_fts()
+        self.assertEqual(_fts_table_exists.cache_info().currsize, 1)
+        call_command("migrate", verbosity=0)
+        self.assertEqual(_fts_table_exists.cache_info().currsize, 0)
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+
+    def setUp(self):
+        cache.clear()
+
+    def create(self, text):
+        return Post.objects.create(text=text, author=self.author)
+
+    def test_search_by_word_forms(self):
+        """Поиск находит посты по другим формам слов и ранжирует их."""
+        once = self.create("Красивая кошка спит на окне")
+        twice = self.create("Кошки, кошки и ещё раз красивые кошки")
+        self.create("Собака гуляет во дворе")
+        for backend in BACKENDS:
+            with self.subTest(backend=backend), self.settings(
+                SEARCH_BACKEND=backend
+            ):
+                rebuild()
+                self.assertEqual(search("красивой кошке"), [twice.pk, once.pk])
+                self.assertEqual(search("кошка собака"), [])
+                self.assertEqual(search("и на"), [])
+
+    def test_index_follows_post_changes(self):
+        """Индекс обновляется при правке и удалении поста."""
+        for backend in BACKENDS:
+            with self.subTest(backend=backend), self.settings(
+                SEARCH_BACKEND=backend
+            ):
+                post = self.create("Утренний туман над рекой")
+                self.assertEqual(search("туманы"), [post.pk])
+                post.text = "Вечерний закат над рекой"
+                post.save()
+                self.assertEqual(search("туман"), [])
+                self.assertEqual(search("закаты"), [post.pk])
+                post.delete()
+                self.assertEqual(search("закат"), [])
+        self.assertFalse(PostTerm.objects.exists())
+
+    def test_filter_matching_is_not_limited(self):
+        """filter_matching отдаёт все совпадения, не только первые."""
+        posts = [self.create(f"Кошка номер {i}") for i in range(3)]
+        self.create("Кошачий корм")
+        for backend in BACKENDS:
+            with self.subTest(backend=backend), self.settings(
+                SEARCH_BACKEND=backend, SEARCH_RESULTS_LIMIT=2
+            ):
+                rebuild()
+                self.assertEqual(len(search("кошка")), 2)
+                matched = filter_matching(Post.objects.all(), "кошки номер")
+                self.assertEqual(set(matched), set(posts))
+                self.assertFalse(filter_matching(Post.objects.all(), "и"))
+
+    def test_reindex_command(self):
+        """Команда reindex перестраивает индекс по всем постам."""
+        self.create("Первый пост")
+        self.create("Второй пост")
+        out = StringIO()
+        with self.settings(SEARCH_BACKEND="inverted"):
+            PostTerm.objects.all().delete()
+            call_command("reindex", stdout=out)
+            self.assertEqual(len(search("посты")), 2)
+        self.assertIn("Проиндексировано постов: 2", out.getvalue())
+
+
+class SearchPageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.admin = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="pass"
+        )
+        for i in range(12):
+            Post.objects.create(
+                text=f"Заметка о погоде {i}", author=cls.author
+            )
+        cls.other = Post.objects.create(text="Про котов", author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_search_page_paginated(self):
+        """Страница поиска выводит результаты постранично с запросом."""
+        url = reverse("posts:search")
+        response = self.client.get(url, {"q": "погода"})
+        page_obj = response.context["page_obj"]
+        self.assertEqual(page_obj.paginator.count, 12)
+        self.assertEqual(len(page_obj), 10)
+        self.assertContains(
+            response, "?q=%D0%BF%D0%BE%D0%B3%D0%BE%D0%B4%D0%B0&amp;page=2"
+        )
+        response = self.client.get(url, {"q": "погода", "page": 2})
+        self.assertEqual(len(response.context["page_obj"]), 2)
+        response = self.client.get(url)
+        self.assertIsNone(response.context["page_obj"])
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт через тот же индекс."""
+        self.client.force_login(self.admin)
+        response = self.client.get(
+            reverse("admin:posts_post_changelist"), {"q": "коты"}
+        )
+        self.assertEqual(
+            list(response.context["cl"].result_list), [self.other]
+        )
@@ -0,0 +1,103 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+
+from core.models import Task
+
+from ..models import AuthorStats, Comment, Follow, Post, User
+from ..search import search
+from ..seeding import DEFAULTS, _post_rows, seed, text_pool
+
+SMALL = {"users": 30, "groups": 3, "posts": 120, "comments": 80, "follows": 90}
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class SeedTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_seed_fills_tables_and_derived_data(self):
+        """seed создаёт строки и пересчитывает счётчики и индекс."""
+        totals = seed(processes=2, **SMALL)
+        self.assertEqual(totals["users"], 30)
+        self.assertEqual(Post.objects.count(), 120)
+        self.assertEqual(Comment.objects.count(), 80)
+        self.assertEqual(totals["follows"], Follow.objects.count())
+        self.assertEqual(
+            AuthorStats.objects.aggregate(total=Sum("posts_count"))["total"],
+            120,
+        )
+        post = Post.objects.order_by("pk").last()
+        self.assertIn(post.pk, search(post.text.split()[0]))
+
+    def test_seed_is_deterministic(self):
+        """Одинаковый seed даёт одинаковые данные при любом числе процессов."""
+        options = {**DEFAULTS, **SMALL, "seed": 7}
+        rows = _post_rows((options, 0, SMALL["posts"]))
+        self.assertEqual(rows, _post_rows((options, 0, SMALL["posts"])))
+        self.assertNotEqual(
+            rows, _post_rows(({**options, "seed": 8}, 0, SMALL["posts"]))
+        )
+        seed(processes=2, **{**SMALL, "seed": 7})
+        first_user = User.objects.order_by("pk").first().pk
+        self.assertEqual(
+            list(Post.objects.order_by("pk").values_list("text", "author_id")),
+            [
+                (text_pool(7, "posts")[text], first_user + author)
+                for text, author, *_ in rows
+            ],
+        )
+
+    def test_seeded_posts_are_indexed(self):
+        """Тексты новых постов попадают в индекс любого бэкенда."""
+        for backend in ("fts5", "inverted"):
+            with self.subTest(backend=backend), self.settings(
+                SEARCH_BACKEND=backend
+            ):
+                seed(**SMALL)
+                post = Post.objects.order_by("pk").last()
+                word = max(post.text.split(), key=len)
+                self.assertIn(post.pk, search(word))
+
+    @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+    def test_seed_images_share_variants(self):
+        """Варианты готовятся по разу на картинку, без задач на посты."""
+        seed(**{**SMALL, "image_share": 1.0})
+        posts = Post.objects.all()
+        self.assertFalse(posts.filter(thumbnail_ready=False).exists())
+        self.assertFalse(Task.objects.exists())
+        rows = set(posts.values_list("image", "image_variants"))
+        # У всех постов одной картинки один и тот же манифест.
+        self.assertEqual(len(rows), len({image for image, _ in rows}))
+        self.assertTrue(all(variants for _, variants in rows))
+
+    def test_popular_authors_get_more_posts(self):
+        """Авторы постов распределены по закону Ципфа."""
+        seed(**SMALL)
+        counts = list(
+            AuthorStats.objects.order_by("user_id").values_list(
+                "posts_count", flat=True
+            )
+        )
+        self.assertGreater(counts[0], counts[-1])
+
+    def test_seed_command(self):
+        """Команда seed печатает число созданных строк."""
+        out = StringIO()
+        call_command(
+            "seed",
+            "--users=5",
+            "--posts=10",
+            "--comments=0",
+            "--follows=5",
+            "--groups=1",
+            stdout=out,
+        )
+        self.assertIn("posts: 10", out.getvalue())
@@ -3,14 +3,29 @@ import tempfile
 
 from django import forms
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.paginator import Paginator
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
 
 from yatube.settings import POSTS_ON_PAGE
 
-from ..models import Comment, Follow, Group, Post, User
+from ..counters import recount_authors
+from ..models import (
+    AuthorStats,
+    Comment,
+    Follow,
+    Group,
+    Post,
+    Timeline,
+    User,
+)
+from ..timeline import rebuild
 
 INDEX_PAGE = reverse("posts:index")
 GROUP_SLUG = "test_slug"
@@ -67,6 +82,8 @@ class PostPagesTest(TestCase):
             for i in range(12)
         ]
         cls.posts = Post.objects.bulk_create(post_obj)
+        # bulk_create обходит сигналы, счётчики пересчитываются вручную.
+        recount_authors([cls.author.pk])
 
         cls.post = Post.objects.create(
             author=cls.author,
@@ -321,3 +338,516 @@ class FollowTest(TestCase):
         Follow.objects.create(user=self.user, author=self.author)
         response = self.follower.get(reverse("posts:follow_index"))
         self.assertIn(self.post, response.context["page_obj"])
+
+
+class CursorPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="TestUser")
+        Post.objects.bulk_create(
+            Post(text=f"Тестовый текст {i}", author=cls.author)
+            for i in range(POSTS_ON_PAGE + 3)
+        )
+        # Одинаковая дата у всех постов: порядок держится на id.
+        Post.objects.update(pub_date=timezone.now())
+        cls.ordered = list(Post.objects.order_by("-pk"))
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_first_page_without_count(self):
+        """Первая страница курсорного пагинатора не считает записи."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(INDEX_PAGE)
+        page_obj = response.context["page_obj"]
+        self.assertEqual(list(page_obj), self.ordered[:POSTS_ON_PAGE])
+        self.assertFalse(page_obj.has_previous())
+        self.assertTrue(page_obj.has_next())
+        for query in queries.captured_queries:
+            with self.subTest(sql=query["sql"]):
+                self.assertNotIn("COUNT(", query["sql"])
+                self.assertNotIn("OFFSET", query["sql"])
+
+    def test_next_and_previous_cursors(self):
+        """Переход по курсорам вперёд и назад."""
+        first = self.guest_client.get(AUTHOR_POSTS).context["page_obj"]
+        response = self.guest_client.get(
+            AUTHOR_POSTS, {"cursor": first.paginator.next_cursor}
+        )
+        second = response.context["page_obj"]
+        self.assertEqual(list(second), self.ordered[POSTS_ON_PAGE:])
+        self.assertTrue(second.has_previous())
+        self.assertFalse(second.has_next())
+        response = self.guest_client.get(
+            AUTHOR_POSTS, {"cursor": second.paginator.previous_cursor}
+        )
+        previous = response.context["page_obj"]
+        self.assertEqual(list(previous), self.ordered[:POSTS_ON_PAGE])
+        self.assertFalse(previous.has_previous())
+
+    def test_broken_cursor_returns_first_page(self):
+        """Некорректный курсор отдаёт первую страницу."""
+        for cursor in ("broken", "W10", "WzEsIDIsIDNd"):
+            with self.subTest(cursor=cursor):
+                response = self.guest_client.get(
+                    INDEX_PAGE, {"cursor": cursor}
+                )
+                self.assertEqual(
+                    list(response.context["page_obj"]),
+                    self.ordered[:POSTS_ON_PAGE],
+                )
+
+    def test_legacy_page_number(self):
+        """Старые ссылки ?page=N продолжают работать."""
+        response = self.guest_client.get(INDEX_PAGE, {"page": 2})
+        self.assertEqual(
+            list(response.context["page_obj"]), self.ordered[POSTS_ON_PAGE:]
+        )
+
+
+@override_settings(
+    COMMENTS_ON_PAGE=5, QUERY_INSPECTION_RATE=1, QUERY_INSPECTION_RAISE=True
+)
+class CommentPageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username="TestUser")
+        cls.post = Post.objects.create(text="Тестовый текст", author=author)
+        Comment.objects.bulk_create(
+            Comment(
+                post=cls.post,
+                author=User.objects.create_user(username=f"reader{i}"),
+                text=f"Комментарий {i}",
+            )
+            for i in range(8)
+        )
+        cls.ordered = list(Comment.objects.order_by("-created", "-pk"))
+        cls.url = reverse("posts:post_detail", args=[cls.post.pk])
+        cls.more_url = reverse("posts:post_comments", args=[cls.post.pk])
+
+    def test_detail_shows_first_comments(self):
+        """Пост выводит первую страницу комментариев без N+1."""
+        response = self.client.get(self.url, {"page": 2})
+        comments = response.context["comments"]
+        self.assertEqual(list(comments), self.ordered[:5])
+        self.assertContains(response, "Показать ещё комментарии")
+        response = self.client.get(
+            self.url, {"comments_cursor": comments.paginator.next_cursor}
+        )
+        self.assertEqual(list(response.context["comments"]), self.ordered[5:])
+        self.assertContains(response, "К новым комментариям")
+
+    def test_load_more_fragment_and_json(self):
+        """Подгрузка комментариев отдаёт фрагмент HTML или JSON."""
+        first = self.client.get(self.url).context["comments"]
+        cursor = first.paginator.next_cursor
+        response = self.client.get(self.more_url, {"cursor": cursor})
+        self.assertTemplateUsed(response, "posts/includes/comment_list.html")
+        self.assertNotContains(response, "<html")
+        self.assertContains(response, self.ordered[5].text)
+        self.assertNotContains(response, "Показать ещё комментарии")
+        data = self.client.get(
+            self.more_url, {"cursor": cursor, "format": "json"}
+        ).json()
+        self.assertEqual(
+            [comment["id"] for comment in data["comments"]],
+            [comment.pk for comment in self.ordered[5:]],
+        )
+        self.assertEqual(data["comments"][0]["author"], "reader2")
+        self.assertIsNone(data["next_cursor"])
+        missing = reverse("posts:post_comments", args=[self.post.pk + 100])
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="TestUser")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(title="Группа", slug="test_slug")
+        cls.post = Post.objects.create(
+            text="Тестовый текст", author=cls.author, group=cls.group
+        )
+        cls.urls = [
+            INDEX_PAGE,
+            GROUP_POSTS,
+            AUTHOR_POSTS,
+            reverse("posts:post_detail", args=[cls.post.pk]),
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def revalidate(self, client, url, response):
+        return client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+    def test_unchanged_pages_answer_304(self):
+        """Неизменившаяся страница отвечает 304 без шаблонов."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn("Last-Modified", response)
+                again = self.revalidate(self.client, url, response)
+                self.assertEqual(again.status_code, 304)
+                self.assertEqual(again.templates, [])
+
+    def test_changes_produce_new_etag(self):
+        """Новый пост, комментарий и подписка меняют ETag."""
+        detail = self.urls[3]
+        changes = [
+            (
+                self.urls[:3],
+                lambda: Post.objects.create(
+                    text="Ещё пост", author=self.author, group=self.group
+                ),
+            ),
+            (
+                [detail],
+                lambda: Comment.objects.create(
+                    post=self.post, author=self.reader, text="Комментарий"
+                ),
+            ),
+            (
+                [AUTHOR_POSTS],
+                lambda: Follow.objects.create(
+                    user=self.reader, author=self.author
+                ),
+            ),
+        ]
+        for urls, change in changes:
+            responses = {url: self.client.get(url) for url in urls}
+            change()
+            for url, response in responses.items():
+                with self.subTest(url=url):
+                    again = self.revalidate(self.client, url, response)
+                    self.assertEqual(again.status_code, 200)
+
+    def test_group_edit_and_unrelated_comment(self):
+        """Правка группы меняет ETag, комментарий к другому посту — нет."""
+        other = Post.objects.create(text="Другой пост", author=self.author)
+        responses = {url: self.client.get(url) for url in self.urls}
+        Comment.objects.create(post=other, author=self.reader, text="Ответ")
+        detail = self.urls[3]
+        again = self.revalidate(self.client, detail, responses[detail])
+        self.assertEqual(again.status_code, 304)
+        self.group.title = "Новое название"
+        self.group.save()
+        for url in (INDEX_PAGE, GROUP_POSTS, detail):
+            with self.subTest(url=url):
+                again = self.revalidate(self.client, url, responses[url])
+                self.assertEqual(again.status_code, 200)
+
+    def test_etag_depends_on_viewer(self):
+        """У гостя и пользователя разные ETag одной страницы."""
+        reader = Client()
+        reader.force_login(self.reader)
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                again = self.revalidate(reader, url, response)
+                self.assertEqual(again.status_code, 200)
+
+    def test_profile_and_post_batch_queries(self):
+        """Подписка и даты страниц читаются вместе с основной строкой."""
+        reader = Client()
+        reader.force_login(self.reader)
+        Follow.objects.create(user=self.reader, author=self.author)
+        comment = Comment.objects.create(
+            post=self.post, author=self.reader, text="Комментарий"
+        )
+        detail = self.urls[3]
+        # Сессия и пользователь, строка для ETag, объект и страница.
+        for url in (AUTHOR_POSTS, detail):
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = reader.get(url)
+                sql = [
+                    query["sql"]
+                    for query in queries.captured_queries
+                    if "SAVEPOINT" not in query["sql"]
+                ]
+                self.assertEqual(len(sql), 5, sql)
+        self.assertTrue(reader.get(AUTHOR_POSTS).context["following"])
+        self.assertEqual(
+            response["Last-Modified"],
+            http_date(comment.created.timestamp()),
+        )
+        profile = reader.get(AUTHOR_POSTS)
+        self.assertEqual(
+            profile["Last-Modified"], http_date(self.post.pub_date.timestamp())
+        )
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.old_post = Post.objects.create(
+            text="Старый пост", author=cls.author
+        )
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def feed(self):
+        response = self.reader_client.get(reverse("posts:follow_index"))
+        return list(response.context["page_obj"])
+
+    def test_follow_backfills_and_post_fans_out(self):
+        """Подписка дополняет ленту, новый пост раскладывается по лентам."""
+        self.assertEqual(self.feed(), [])
+        self.reader_client.get(
+            reverse("posts:profile_follow", args=[self.author])
+        )
+        self.assertEqual(
+            Timeline.objects.get(user=self.reader).ids, [self.old_post.pk]
+        )
+        new_post = Post.objects.create(text="Новый пост", author=self.author)
+        self.assertEqual(
+            Timeline.objects.get(user=self.reader).ids,
+            [new_post.pk, self.old_post.pk],
+        )
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+
+    def test_unfollow_prunes_timeline(self):
+        """Отписка убирает посты автора из ленты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.feed(), [self.old_post])
+        self.reader_client.get(
+            reverse("posts:profile_unfollow", args=[self.author])
+        )
+        self.assertEqual(Timeline.objects.get(user=self.reader).ids, [])
+        self.assertEqual(self.feed(), [])
+
+    def test_reads_do_not_write(self):
+        """Счётчики и ленту создают регистрация и подписка, а не чтение."""
+        self.assertTrue(AuthorStats.objects.filter(user=self.reader).exists())
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertTrue(Timeline.objects.filter(user=self.reader).exists())
+        with CaptureQueriesContext(connection) as queries:
+            self.feed()
+            self.reader_client.get(
+                reverse("posts:profile", args=[self.author])
+            )
+            self.reader_client.get(
+                reverse("posts:post_detail", args=[self.old_post.pk])
+            )
+        writes = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith(("INSERT", "UPDATE", "DELETE"))
+        ]
+        self.assertEqual(writes, [])
+
+    @override_settings(TIMELINE_LENGTH=2)
+    def test_timeline_is_bounded(self):
+        """Лента хранит ограниченное число постов."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.feed()
+        posts = [
+            Post.objects.create(text=f"Пост {i}", author=self.author)
+            for i in range(3)
+        ]
+        self.assertEqual(
+            Timeline.objects.get(user=self.reader).ids,
+            [posts[2].pk, posts[1].pk],
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_popular_author_read_on_demand(self):
+        """Посты популярного автора не пишутся в ленты, но видны в них."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.feed()
+        new_post = Post.objects.create(text="Новый пост", author=self.author)
+        self.assertNotIn(
+            new_post.pk, Timeline.objects.get(user=self.reader).ids
+        )
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+        # Автор опустился ниже порога, но пост из ленты не пропадает.
+        with override_settings(TIMELINE_FANOUT_LIMIT=10):
+            self.assertEqual(self.feed(), [new_post, self.old_post])
+
+    @override_settings(TIMELINE_LENGTH=2)
+    def test_history_past_stored_ids(self):
+        """Посты старше сохранённого списка читаются напрямую."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.feed()
+        posts = [
+            Post.objects.create(text=f"Пост {i}", author=self.author)
+            for i in range(3)
+        ]
+        self.assertEqual(
+            self.feed(), [posts[2], posts[1], posts[0], self.old_post]
+        )
+
+    @override_settings(TIMELINE_LENGTH=3, POSTS_ON_PAGE=2)
+    def test_cursor_pages_cross_stored_ids(self):
+        """Курсор проходит список и историю за ним в обе стороны."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [
+            Post.objects.create(text=f"Пост {i}", author=self.author)
+            for i in range(5)
+        ]
+        with override_settings(TIMELINE_FANOUT_LIMIT=0):
+            posts.append(
+                Post.objects.create(text="Популярный", author=self.author)
+            )
+        expected = [self.old_post, *posts][::-1]
+        url = reverse("posts:follow_index")
+        pages, cursor = [], None
+        while True:
+            page = self.reader_client.get(
+                url, {"cursor": cursor} if cursor else {}
+            ).context["page_obj"]
+            pages.append(list(page))
+            cursor = page.paginator.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual([post for rows in pages for post in rows], expected)
+        for rows in reversed(pages[:-1]):
+            cursor = page.paginator.previous_cursor
+            page = self.reader_client.get(url, {"cursor": cursor}).context[
+                "page_obj"
+            ]
+            self.assertEqual(list(page), rows)
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title="Тест группа",
+            slug="test_slug",
+            description="Описание",
+        )
+        cls.reader = User.objects.create_user(username="reader")
+        for i in range(4):
+            author = User.objects.create_user(username=f"author{i}")
+            Follow.objects.create(user=cls.reader, author=author)
+            for _ in range(3):
+                Post.objects.create(
+                    text="Тестовый текст", author=author, group=cls.group
+                )
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.reader_client.get(url)
+        return len(queries)
+
+    def test_feed_queries_do_not_depend_on_page_size(self):
+        """Число запросов ленты не зависит от размера страницы."""
+        url_list = (
+            INDEX_PAGE,
+            reverse("posts:group_list", args=[self.group.slug]),
+            reverse("posts:profile", args=["author0"]),
+            reverse("posts:follow_index"),
+        )
+        for url in url_list:
+            with self.subTest(url=url):
+                self.count_queries(url)
+                with self.settings(POSTS_ON_PAGE=2):
+                    small_page = self.count_queries(url)
+                with self.settings(POSTS_ON_PAGE=12):
+                    full_page = self.count_queries(url)
+                self.assertEqual(small_page, full_page)
+
+    def test_for_feed_comment_total(self):
+        """for_feed подгружает автора, группу и число комментариев."""
+        post = Post.objects.select_related("author").first()
+        Comment.objects.create(post=post, author=self.reader, text="Коммент")
+        with self.assertNumQueries(1):
+            feed_post = (
+                Post.objects.for_feed(with_comment_total=True)
+                .filter(pk=post.pk)
+                .get()
+            )
+            self.assertEqual(feed_post.comment_total, 1)
+            self.assertEqual(feed_post.author.username, post.author.username)
+            self.assertEqual(feed_post.group.slug, self.group.slug)
+
+
+class FeedIndexTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title="Тест группа",
+            slug="test_slug",
+            description="Описание",
+        )
+        cls.reader = User.objects.create_user(username="reader")
+        for i in range(3):
+            author = User.objects.create_user(username=f"author{i}")
+            Follow.objects.create(user=cls.reader, author=author)
+            for _ in range(5):
+                cls.post = Post.objects.create(
+                    text="Тестовый текст", author=author, group=cls.group
+                )
+        Comment.objects.create(post=cls.post, author=cls.reader, text="Да")
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def feed_plans(self, url):
+        """Планы EXPLAIN QUERY PLAN для сортированных выборок страницы."""
+        with CaptureQueriesContext(connection) as queries:
+            self.reader_client.get(url)
+        plans = []
+        for query in queries.captured_queries:
+            sql = query["sql"]
+            if "ORDER BY" not in sql:
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute("EXPLAIN QUERY PLAN " + sql)
+                plans.append(" | ".join(row[-1] for row in cursor.fetchall()))
+        return plans
+
+    def test_feed_queries_use_ordering_indexes(self):
+        """Ленты читаются по составным индексам без сортировки."""
+        url_indexes = {
+            INDEX_PAGE: "post_pub_date_idx",
+            INDEX_PAGE + "?page=2": "post_pub_date_idx",
+            reverse("posts:group_list", args=[self.group.slug]): (
+                "post_group_date_idx"
+            ),
+            reverse("posts:profile", args=["author0"]): (
+                "post_author_date_idx"
+            ),
+            reverse("posts:post_detail", args=[self.post.pk]): (
+                "comment_post_date_idx"
+            ),
+        }
+        for url, index in url_indexes.items():
+            with self.subTest(url=url):
+                plans = self.feed_plans(url)
+                self.assertTrue(plans)
+                for plan in plans:
+                    self.assertIn(index, plan)
+                    self.assertNotIn("TEMP B-TREE", plan)
+
+    @override_settings(TIMELINE_LENGTH=6, POSTS_ON_PAGE=4)
+    def test_follow_feed_searches_by_index(self):
+        """Первая страница заполненной ленты читается по списку id."""
+        rebuild([self.reader.pk])
+        self.assertEqual(len(Timeline.objects.get(user=self.reader).ids), 6)
+        for plan in self.feed_plans(reverse("posts:follow_index")):
+            with self.subTest(plan=plan):
+                # До SQLite 3.36 план пишет «SCAN TABLE <таблица>».
+                self.assertNotRegex(plan, r"SCAN (TABLE )?posts_post\b")
+                self.assertNotRegex(plan, r"SCAN (TABLE )?posts_follow\b")
+                self.assertNotIn("TEMP B-TREE", plan)
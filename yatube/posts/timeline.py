@@ -0,0 +1,176 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from yatube.backends.sqlite3.base import immediate_transactions
+from yatube.routers import primary
+from yatube.utils import CursorPaginator
+
+from .counters import stats_for
+from .models import Follow, Post, Timeline
+
+ORDERING = ("-pub_date", "-pk")
+
+
+def _recent_ids(queryset):
+    return queryset.order_by(*ORDERING).values_list("pk", flat=True)[
+        : settings.TIMELINE_LENGTH
+    ]
+
+
+def push_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    stats = stats_for(post.author)
+    # Автор поста мог прийти с давно прочитанными счётчиками.
+    stats.refresh_from_db(fields=["followers_count"])
+    followers = stats.followers_count
+    if followers > settings.TIMELINE_FANOUT_LIMIT:
+        # Пост популярного автора лента дочитывает при открытии: по
+        # флагу, а не по текущему числу подписчиков, которое меняется.
+        post.fanned_out = False
+        Post.objects.filter(pk=post.pk).update(fanned_out=False)
+        return
+    with transaction.atomic():
+        timelines = list(
+            Timeline.objects.select_for_update().filter(
+                user__follower__author_id=post.author_id
+            )
+        )
+        for timeline in timelines:
+            timeline.ids = [post.pk] + timeline.ids
+        Timeline.objects.bulk_update(timelines, ["post_ids"], batch_size=500)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние посты нового автора подписки."""
+    timeline = Timeline.objects.filter(user_id=user_id).first()
+    if timeline is None:
+        # Первая подписка: лента собирается здесь, а не при чтении.
+        rebuild([user_id])
+        return
+    timeline.ids = _recent_ids(
+        Post.objects.filter(Q(pk__in=timeline.ids) | Q(author_id=author_id))
+    )
+    timeline.save(update_fields=["post_ids"])
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора, от которого отписались."""
+    timeline = Timeline.objects.filter(user_id=user_id).first()
+    if timeline is None:
+        return
+    timeline.ids = _recent_ids(
+        Post.objects.filter(pk__in=timeline.ids).exclude(author_id=author_id)
+    )
+    timeline.save(update_fields=["post_ids"])
+
+
+def rebuild(user_ids):
+    """Пересобирает ленты пользователей по таблице подписок."""
+    for user_id in user_ids:
+        ids = list(
+            _recent_ids(Post.objects.filter(author__following__user=user_id))
+        )
+        timeline, _ = Timeline.objects.get_or_create(user_id=user_id)
+        timeline.ids = ids
+        timeline.save(update_fields=["post_ids"])
+
+
+def timeline_posts(user):
+    """Посты ленты подписок: все посты авторов, на которых подписан user.
+
+    Курсорные страницы по этой выборке собирает TimelinePaginator.
+    """
+    authors = Follow.objects.filter(user=user).values("author")
+    return Post.objects.filter(author__in=authors)
+
+
+def _stored_keys(user):
+    """Ключи (pub_date, id) сохранённой ленты и признак её заполненности."""
+    timeline = Timeline.objects.filter(user=user).first()
+    if timeline is None:
+        # Ленту создаёт подписка; здесь собираются только ленты после
+        # массового импорта. Только что собранная лента есть пока лишь
+        # в основной базе.
+        with primary():
+            with immediate_transactions(), transaction.atomic():
+                rebuild([user.pk])
+            timeline = Timeline.objects.get(user=user)
+    ids = timeline.ids
+    dates = dict(
+        Post.objects.filter(pk__in=ids)
+        .order_by()
+        .values_list("pk", "pub_date")
+    )
+    keys = [(dates[pk], pk) for pk in ids if pk in dates]
+    return keys, len(ids) >= settings.TIMELINE_LENGTH
+
+
+class TimelinePaginator(CursorPaginator):
+    """Курсорные страницы ленты подписок по сохранённому списку id.
+
+    object_list — выборка timeline_posts(user), возможно с фильтрами.
+    Страница собирается из постов списка и неразложенных постов;
+    авторы подписки читаются напрямую только за последним id
+    заполненного списка, и то не больше чем на страницу.
+    """
+
+    def __init__(self, object_list, per_page, key="pub_date", user=None):
+        super().__init__(object_list, per_page, key)
+        self.user = user
+
+    def _fetch(self, keys, need):
+        # Строки по id без ORDER BY: порядок уже задан списком.
+        rows = []
+        for start in range(0, len(keys), need):
+            end = start + need
+            chunk = [pk for _, pk in keys[start:end]]
+            found = {
+                self.row_key(row)[1]: row
+                for row in self.object_list.filter(pk__in=chunk).order_by()
+            }
+            rows.extend(found[pk] for pk in chunk if pk in found)
+            if len(rows) >= need:
+                break
+        return rows[:need]
+
+    def _merged(self, keys, position, backwards, oldest):
+        """Посты списка вместе с неразложенными, ближайшие первыми."""
+        need = self.per_page + 1
+        rows = self._fetch(keys, need)
+        authors = Follow.objects.filter(user=self.user).values("author")
+        if Post.objects.filter(author__in=authors, fanned_out=False).exists():
+            unfanned = self.object_list.filter(fanned_out=False)
+            if oldest is not None:
+                # Старше списка их прочитает прямой запрос.
+                unfanned = self.beyond(unfanned, oldest, backwards=True)
+            rows.extend(self.beyond(unfanned, position, backwards)[:need])
+        unique = {self.row_key(row): row for row in rows}
+        return [unique[key] for key in sorted(unique, reverse=not backwards)]
+
+    def rows(self, position, backwards):
+        need = self.per_page + 1
+        keys, full = _stored_keys(self.user)
+        oldest = keys[-1] if full and keys else None
+        rows = []
+        if backwards:
+            keys.reverse()
+            if oldest is not None and position < oldest:
+                # Курсор за концом списка: сначала посты между ними.
+                older = self.beyond(self.object_list, oldest)
+                rows = list(self.beyond(older, position, True)[:need])
+        if position is not None:
+            keys = [
+                key
+                for key in keys
+                if (key > position if backwards else key < position)
+            ]
+        if len(rows) < need:
+            rows.extend(self._merged(keys, position, backwards, oldest))
+            rows = rows[:need]
+        if not backwards and oldest is not None and len(rows) < need:
+            # Список кончился: дальше — посты авторов подписки.
+            edge = oldest if position is None else min(position, oldest)
+            older = self.beyond(self.object_list, edge)
+            rows.extend(older[: need - len(rows)])
+        return rows
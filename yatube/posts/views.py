@@ -1,23 +1,46 @@
+from functools import partial
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.http import urlencode
+from django.views.decorators.http import condition
 
-from yatube.utils import pagination
+from yatube.utils import pagination, query_batch
 
+from . import conditional
+from .caching import cached_page
+from .comments import comment_page, serialize
+from .counters import stats_for
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post, User
+from .search import search as search_posts
+from .timeline import TimelinePaginator, timeline_posts
 
 
+@condition(
+    etag_func=conditional.index_etag,
+    last_modified_func=conditional.index_last_modified,
+)
 def index(request):
     template = "posts/index.html"
-    posts = pagination(request, Post.objects.all())
+    posts = cached_page(request, "all", Post.objects.for_feed())
     context = {"page_obj": posts}
     return render(request, template, context)
 
 
+@condition(
+    etag_func=conditional.group_etag,
+    last_modified_func=conditional.group_last_modified,
+)
 def group_posts(request, slug):
     group_template = "posts/group_list.html"
     group = get_object_or_404(Group, slug=slug)
-    paginator = pagination(request, group.posts.all())
+    paginator = cached_page(
+        request, f"group:{group.pk}", group.posts.for_feed()
+    )
     context = {
         "group": group,
         "page_obj": paginator,
@@ -25,30 +48,47 @@ def group_posts(request, slug):
     return render(request, group_template, context)
 
 
+@condition(
+    etag_func=conditional.profile_etag,
+    last_modified_func=conditional.profile_last_modified,
+)
 def profile(request, username):
     profile_template = "posts/profile.html"
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    paginator = pagination(request, posts)
-    count = author.posts.count()
-    following = (
-        request.user.is_authenticated
-        and author.following.filter(user=request.user).exists()
+    # Подписка проверяется тем же запросом, что загружает автора.
+    author = get_object_or_404(
+        query_batch(
+            User.objects.select_related("stats"),
+            **conditional.following_check(request),
+        ),
+        username=username,
+    )
+    stats = stats_for(author)
+    posts = author.posts.for_feed()
+    paginator = cached_page(
+        request, f"author:{author.pk}", posts, count=stats.posts_count
     )
+    following = getattr(author, "is_following", False)
     context = {
         "page_obj": paginator,
         "author": author,
-        "count": count,
+        "count": stats.posts_count,
+        "stats": stats,
         "following": following,
     }
     return render(request, profile_template, context)
 
 
+@condition(
+    etag_func=conditional.post_etag,
+    last_modified_func=conditional.post_last_modified,
+)
 def post_detail(request, post_id):
     post_detail_template = "posts/post_detail.html"
-    post = get_object_or_404(Post, pk=post_id)
-    post_count = post.author.posts.count()
-    comments = pagination(request, post.comments.all())
+    post = get_object_or_404(
+        Post.objects.select_related("author__stats", "group"), pk=post_id
+    )
+    post_count = stats_for(post.author).posts_count
+    comments = comment_page(post, request.GET.get("comments_cursor"))
     form = CommentForm()
     context = {
         "post": post,
@@ -60,6 +100,37 @@ def post_detail(request, post_id):
     return render(request, post_detail_template, context)
 
 
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only("pk"), pk=post_id)
+    comments = comment_page(post, request.GET.get("cursor"))
+    if request.GET.get("format") == "json":
+        return JsonResponse(serialize(comments))
+    context = {"post": post, "comments": comments}
+    return render(request, "posts/includes/comment_list.html", context)
+
+
+def search(request):
+    template = "posts/search.html"
+    query = request.GET.get("q", "").strip()
+    page_obj = None
+    if query:
+        ids = search_posts(query)
+        page_obj = Paginator(ids, settings.POSTS_ON_PAGE).get_page(
+            request.GET.get("page")
+        )
+        # Страница id в порядке релевантности, посты — одним запросом.
+        posts = Post.objects.for_feed().in_bulk(page_obj.object_list)
+        page_obj.object_list = [
+            posts[pk] for pk in page_obj.object_list if pk in posts
+        ]
+    context = {
+        "query": query,
+        "page_obj": page_obj,
+        "page_params": urlencode({"q": query}) + "&",
+    }
+    return render(request, template, context)
+
+
 @login_required
 def post_create(request):
     create_post_template = "posts/create_post.html"
@@ -108,8 +179,11 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     template = "posts/follow.html"
+    posts = timeline_posts(request.user).for_feed()
     page_obj = pagination(
-        request, Post.objects.filter(author__following__user=request.user)
+        request,
+        posts,
+        paginator_class=partial(TimelinePaginator, user=request.user),
     )
     context = {
         "page_obj": page_obj,
@@ -0,0 +1,7 @@
+import os
+
+from yatube.handlers import get_asgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "yatube.settings")
+
+application = get_asgi_application()
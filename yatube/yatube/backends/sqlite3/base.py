@@ -0,0 +1,33 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.backends.sqlite3 import base
+
+_state = threading.local()
+
+
+@contextmanager
+def immediate_transactions(enabled=True):
+    """Транзакции внутри блока сразу берут блокировку записи."""
+    previous = getattr(_state, "immediate", False)
+    _state.immediate = enabled
+    try:
+        yield
+    finally:
+        _state.immediate = previous
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite, где пишущие транзакции начинаются с BEGIN IMMEDIATE.
+
+    Отложенная транзакция, которая сначала читает, а потом пишет, не
+    может дождаться блокировки записи и сразу падает с «database is
+    locked». BEGIN IMMEDIATE берёт блокировку в начале и ждёт её
+    busy_timeout.
+    """
+
+    def _start_transaction_under_autocommit(self):
+        if getattr(_state, "immediate", False):
+            self.cursor().execute("BEGIN IMMEDIATE")
+        else:
+            super()._start_transaction_under_autocommit()
@@ -0,0 +1,231 @@
+import pickle
+from urllib.parse import urlsplit
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from core import metrics
+
+BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "dummy": "django.core.cache.backends.dummy.DummyCache",
+    "redis": "yatube.cache.RedisCache",
+    "rediss": "yatube.cache.RedisCache",
+}
+
+
+def cache_config(url, key_prefix="", version=1, timeout=300):
+    """Настройки кэша из строки вида locmem://, file:///path, redis://.
+
+    Префикс и версия общие для всех ключей, в том числе фрагментов
+    шаблонов и хранилища sorl-thumbnail: смена CACHE_VERSION
+    сбрасывает их одновременно.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in BACKENDS:
+        raise ImproperlyConfigured(f"Неизвестная схема кэша: {url}")
+    config = {
+        "BACKEND": BACKENDS[parts.scheme],
+        "KEY_PREFIX": key_prefix,
+        "VERSION": version,
+        "TIMEOUT": timeout,
+    }
+    if parts.scheme == "file":
+        # file:///dev/shm/yatube — общий кэш в памяти для воркеров хоста.
+        config["LOCATION"] = parts.path
+    elif parts.scheme.startswith("redis"):
+        config["LOCATION"] = url
+    return config
+
+
+def metered(config):
+    """Оборачивает настройки кэша в MeteredCache."""
+    options = {**config.get("OPTIONS", {}), "BACKEND": config["BACKEND"]}
+    return {
+        **config,
+        "BACKEND": "yatube.cache.MeteredCache",
+        "OPTIONS": options,
+    }
+
+
+class MeteredCache(BaseCache):
+    """Считает попадания и промахи кэша для метрик запроса.
+
+    Настоящий бэкенд задаётся OPTIONS["BACKEND"], все операции
+    передаются ему.
+    """
+
+    _missing = object()
+
+    def __init__(self, location, params):
+        options = dict(params.get("OPTIONS", {}))
+        backend = options.pop("BACKEND")
+        params = {**params, "OPTIONS": options}
+        super().__init__(params)
+        self._cache = import_string(backend)(location, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cache, name)
+
+    def get(self, key, default=None, version=None):
+        value = self._cache.get(key, self._missing, version=version)
+        if value is self._missing:
+            metrics.add("cache_misses")
+            return default
+        metrics.add("cache_hits")
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = self._cache.get_many(keys, version=version)
+        metrics.add("cache_hits", len(found))
+        metrics.add("cache_misses", len(keys) - len(found))
+        return found
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._cache.add(key, value, timeout, version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._cache.set(key, value, timeout, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._cache.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        return self._cache.delete(key, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._cache.set_many(data, timeout, version)
+
+    def delete_many(self, keys, version=None):
+        return self._cache.delete_many(keys, version)
+
+    def has_key(self, key, version=None):
+        return self._cache.has_key(key, version)
+
+    def incr(self, key, delta=1, version=None):
+        return self._cache.incr(key, delta, version)
+
+    def decr(self, key, delta=1, version=None):
+        return self._cache.decr(key, delta, version)
+
+    def clear(self):
+        return self._cache.clear()
+
+    def close(self, **kwargs):
+        return self._cache.close(**kwargs)
+
+
+class RedisCache(BaseCache):
+    """Кэш поверх сервера с протоколом Redis.
+
+    Клиент задаётся OPTIONS["CLIENT_CLASS"] и создаётся через
+    from_url(); по умолчанию используется redis.Redis.
+    """
+
+    def __init__(self, server, params):
+        super().__init__(params)
+        self._server = server
+        self._client_class = params.get("OPTIONS", {}).get(
+            "CLIENT_CLASS", "redis.Redis"
+        )
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            client_class = import_string(self._client_class)
+            self._client = client_class.from_url(self._server)
+        return self._client
+
+    def _ttl(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return None if timeout is None else max(int(timeout), 0)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    @staticmethod
+    def _encode(value):
+        # Целые храним как есть, чтобы INCRBY работал на сервере.
+        if isinstance(value, int) and not isinstance(value, bool):
+            return str(value).encode()
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _decode(raw):
+        try:
+            return int(raw)
+        except ValueError:
+            return pickle.loads(raw)
+
+    def _store(self, key, value, timeout, only_new=False):
+        ttl = self._ttl(timeout)
+        if ttl == 0:
+            self.client.delete(key)
+            return False
+        return bool(
+            self.client.set(key, self._encode(value), ex=ttl, nx=only_new)
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        return self._store(key, value, timeout, only_new=True)
+
+    def get(self, key, default=None, version=None):
+        raw = self.client.get(self._key(key, version))
+        return default if raw is None else self._decode(raw)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._store(self._key(key, version), value, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        ttl = self._ttl(timeout)
+        if ttl is None:
+            return bool(self.client.persist(key))
+        return bool(self.client.expire(key, ttl))
+
+    def delete(self, key, version=None):
+        self.client.delete(self._key(key, version))
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        raw_values = self.client.mget([self._key(k, version) for k in keys])
+        return {
+            key: self._decode(raw)
+            for key, raw in zip(keys, raw_values)
+            if raw is not None
+        }
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        for key, value in data.items():
+            self.set(key, value, timeout, version)
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self.client.delete(*keys)
+
+    def has_key(self, key, version=None):
+        return bool(self.client.exists(self._key(key, version)))
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        if not self.client.exists(key):
+            raise ValueError(f"Key '{key}' not found")
+        return self.client.incrby(key, delta)
+
+    def clear(self):
+        if not self.key_prefix:
+            self.client.flushdb()
+            return
+        keys = list(self.client.scan_iter(match=f"{self.key_prefix}:*"))
+        if keys:
+            self.client.delete(*keys)
@@ -0,0 +1,182 @@
+"""ASGI-приложение поверх WSGI-обработчика Django.
+
+Django 2.2 синхронный, поэтому представления работают в пуле из
+ASGI_THREADS потоков. Приём соединений, чтение тела запроса и отправка
+ответа идут в цикле событий: ожидающие и медленные клиенты не занимают
+потоки, а число одновременных соединений на процесс не ограничено
+размером пула.
+"""
+
+import asyncio
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+
+# Сколько кусков потокового ответа поток пула готовит впрок.
+STREAM_BUFFER = 4
+
+
+def _latin1(value):
+    # Строки WSGI — байты, прочитанные как latin-1.
+    return value.encode("utf-8").decode("latin-1")
+
+
+def wsgi_environ(scope, body):
+    """Окружение WSGI для HTTP-соединения ASGI."""
+    root = scope.get("root_path", "")
+    path = scope["path"]
+    if root and path.startswith(root):
+        start = len(root)
+        path = path[start:]
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": _latin1(root),
+        "PATH_INFO": _latin1(path),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+        environ["REMOTE_PORT"] = str(scope["client"][1])
+    for name, value in scope.get("headers", ()):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[name] = value
+            continue
+        key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class ASGIHandler:
+    def __init__(self, threads=None):
+        self.wsgi = WSGIHandler()
+        self.executor = ThreadPoolExecutor(
+            threads or settings.ASGI_THREADS, thread_name_prefix="asgi"
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            raise ValueError(f"Неподдерживаемое соединение: {scope['type']}")
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=STREAM_BUFFER)
+        closed = threading.Event()
+
+        def put(message):
+            # Поток пула ждёт места в очереди: клиент задаёт темп.
+            asyncio.run_coroutine_threadsafe(queue.put(message), loop).result()
+            return not closed.is_set()
+
+        job = loop.run_in_executor(
+            self.executor, self.respond, wsgi_environ(scope, body), put
+        )
+        try:
+            while True:
+                message = await queue.get()
+                if message is None:
+                    break
+                await send(message)
+        except BaseException:
+            closed.set()
+            # Очередь дочитывается, чтобы поток пула не ждал места
+            # и закрыл ответ сам.
+            while await queue.get() is not None:
+                continue
+            raise
+        finally:
+            await job
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def read_body(self, receive):
+        """Тело запроса целиком; None, если клиент отключился."""
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                return b"".join(chunks)
+
+    def respond(self, environ, put):
+        """Ответ Django целиком в одном потоке пула.
+
+        Сообщения ASGI передаются в цикл событий через put, в конце — None.
+        Потоковый ответ читается и закрывается в том же потоке, где
+        создан: request_finished закрывает соединения с базой этого
+        запроса, а привязка к основной базе действует до конца ответа.
+        """
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = [
+                (name.encode("latin-1"), value.encode("latin-1"))
+                for name, value in headers
+            ]
+
+        try:
+            response = self.wsgi(environ, start_response)
+            try:
+                streaming = getattr(response, "streaming", False)
+                content = None if streaming else b"".join(response)
+                put(
+                    {
+                        "type": "http.response.start",
+                        "status": started["status"],
+                        "headers": started["headers"],
+                    }
+                )
+                if content is not None:
+                    put({"type": "http.response.body", "body": content})
+                    return
+                for chunk in response:
+                    message = {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": True,
+                    }
+                    if not put(message):
+                        return
+                put({"type": "http.response.body", "body": b""})
+            finally:
+                response.close()
+        finally:
+            put(None)
+
+
+def get_asgi_application():
+    django.setup(set_prefix=False)
+    return ASGIHandler()
@@ -0,0 +1,53 @@
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+_state = threading.local()
+# Сессии и пользователи читаются с основной базы: иначе только что
+# вошедший пользователь может оказаться анонимным.
+PRIMARY_TABLES = {"django_session", "auth_user"}
+
+
+@contextmanager
+def replica_reads(enabled=True, aliases=None):
+    """Разрешает чтение с реплик aliases (None — со всех) внутри блока."""
+    previous = getattr(_state, "replicas", [])
+    _state.replicas = aliases if enabled else []
+    try:
+        yield
+    finally:
+        _state.replicas = previous
+
+
+def primary():
+    """Блок, читающий с основной базы: например, только что записанное."""
+    return replica_reads(False)
+
+
+class ReplicaRouter:
+    """Запись — в основную базу, чтение — со случайной реплики.
+
+    Реплики используются только там, где их разрешил replica_reads:
+    в безопасных HTTP-запросах без метки недавней записи. Команды,
+    фоновые задачи и изменяющие запросы читают с основной базы.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.db_table in PRIMARY_TABLES:
+            return "default"
+        aliases = getattr(_state, "replicas", [])
+        if aliases is None:
+            aliases = settings.DATABASE_REPLICAS
+        return random.choice(aliases) if aliases else "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема попадает на реплики вместе с данными.
+        return db not in settings.DATABASE_REPLICAS
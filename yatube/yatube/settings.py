@@ -1,11 +1,13 @@
 import os
 
+from yatube.cache import cache_config, metered
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
 SECRET_KEY = os.getenv("SECRET_KEY", default="secret_key")
 
-DEBUG = True
+DEBUG = os.getenv("DEBUG", "").lower() in ("1", "true", "yes", "on")
 
 INTERNAL_IPS = [
     "127.0.0.1",
@@ -20,10 +22,84 @@ ALLOWED_HOSTS = [
 
 
 POSTS_ON_PAGE = 10
+# Комментарии под постом листаются отдельно, своими страницами.
+COMMENTS_ON_PAGE = 20
+# Размер страницы API по умолчанию и наибольший ?limit=.
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+# Наибольшее число авторов в одном запросе массовой подписки.
+API_BULK_LIMIT = 500
+# Строк в одной пачке потоковой выгрузки постов и комментариев.
+EXPORT_BATCH_SIZE = 2000
+
+# Длина ленты подписок и порог подписчиков, после которого посты автора
+# не раскладываются по лентам, а подмешиваются при чтении.
+TIMELINE_LENGTH = 500
+TIMELINE_FANOUT_LIMIT = 5000
+
+# Фрагменты лент сбрасываются сигналами, время жизни — страховка.
+FEED_CACHE_TIMEOUT = 60 * 10
+
+# Кэш страниц целиком для посетителей без сессии: срок, коэффициент
+# раннего обновления XFetch, блокировка перерисовки и ожидание первой
+# отрисовки другим процессом, в секундах.
+PAGE_CACHE_VIEWS = [
+    "posts:index",
+    "posts:group_list",
+    "posts:profile",
+    "about:author",
+    "about:tech",
+]
+PAGE_CACHE_TIMEOUT = 60
+PAGE_CACHE_BETA = 1.0
+PAGE_CACHE_LOCK_TIMEOUT = 10
+PAGE_CACHE_WAIT = 2
+
+# Очередь фоновых задач в основной базе (manage.py runworker).
+TASKS_EAGER = False
+TASK_MAX_ATTEMPTS = 3
+TASK_TIMEOUT = 60 * 5
+# Пауза перед повтором упавшей задачи, удваивается с каждой попыткой.
+TASK_RETRY_DELAY = 30
+
+# Ширины адаптивных вариантов картинок постов (srcset).
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+
+# Ограничения загрузки: размер файла, число пикселей по заголовку
+# и длинная сторона, до которой уменьшаются большие оригиналы.
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40_000_000
+POST_IMAGE_MAX_SIDE = 2560
+
+# Поиск: auto — FTS5 на SQLite, иначе обратный индекс PostTerm;
+# можно явно указать fts5 или inverted.
+SEARCH_BACKEND = "auto"
+SEARCH_RESULTS_LIMIT = 1000
+
+# Метрики на /metrics. В METRICS_DIR процессы-воркеры сохраняют
+# снимки своих счётчиков раз в METRICS_FLUSH_INTERVAL секунд.
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = 5
+# Адреса, с которых /metrics доступен без входа; персоналу — всегда.
+METRICS_ALLOWED_IPS = [
+    ip
+    for ip in os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",")
+    if ip
+]
+
+# Инспектор запросов: доля HTTP-запросов, в которых ищутся N+1
+# (форма SQL повторилась больше порога) и медленные запросы.
+QUERY_INSPECTION_RATE = float(
+    os.getenv("QUERY_INSPECTION_RATE", "1" if DEBUG else "0")
+)
+QUERY_INSPECTION_RAISE = False
+NPLUSONE_THRESHOLD = 5
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_SECONDS", "0.1"))
 
 
 INSTALLED_APPS = [
     "about.apps.AboutConfig",
+    "api.apps.ApiConfig",
     "core.apps.CoreConfig",
     "users.apps.UsersConfig",
     "posts.apps.PostsConfig",
@@ -34,10 +110,14 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "sorl.thumbnail",
-    "debug_toolbar",
 ]
 
 MIDDLEWARE = [
+    "core.middleware.MetricsMiddleware",
+    "core.middleware.QueryInspectorMiddleware",
+    "core.middleware.ReplicaMiddleware",
+    "core.middleware.WriteTransactionMiddleware",
+    "core.middleware.PageCacheMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -45,16 +125,19 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
 ]
 
+if DEBUG:
+    INSTALLED_APPS += ["debug_toolbar"]
+    MIDDLEWARE += ["debug_toolbar.middleware.DebugToolbarMiddleware"]
+
 ROOT_URLCONF = "yatube.urls"
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "core.templating.InstrumentedTemplates",
         "DIRS": [TEMPLATES_DIR],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -64,21 +147,67 @@ TEMPLATES = [
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
                 "core.context_processors.year.year",
+                "core.context_processors.cache.feed_cache_timeout",
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = "yatube.wsgi.application"
-
+# Потоки, в которых ASGI-приложение выполняет синхронный Django.
+ASGI_THREADS = int(os.getenv("ASGI_THREADS", "8"))
+
+
+# Соединения с базой переиспользуются между запросами столько секунд.
+CONN_MAX_AGE = int(os.getenv("CONN_MAX_AGE", "60"))
+
+# PRAGMA для каждого нового соединения с SQLite. wal — читатели не
+# ждут писателей; rollback — журнал отката, как у SQLite по умолчанию.
+SQLITE_PROFILES = {
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -64000,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    },
+    "rollback": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+    },
+}
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "wal")
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
+        "ENGINE": "yatube.backends.sqlite3",
         "NAME": os.path.join(BASE_DIR, "db.sqlite3"),
+        "CONN_MAX_AGE": CONN_MAX_AGE,
     }
 }
 
+# Реплики только для чтения: пути к копиям базы через запятую. Их
+# синхронизирует с основной базой manage.py replicate.
+REPLICA_PATHS = [
+    path for path in os.getenv("DATABASE_REPLICAS", "").split(",") if path
+]
+DATABASE_REPLICAS = [f"replica{i}" for i in range(1, len(REPLICA_PATHS) + 1)]
+for alias, path in zip(DATABASE_REPLICAS, REPLICA_PATHS):
+    DATABASES[alias] = {
+        "ENGINE": "yatube.backends.sqlite3",
+        "NAME": path,
+        "CONN_MAX_AGE": CONN_MAX_AGE,
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_ROUTERS = ["yatube.routers.ReplicaRouter"]
+# После своей записи пользователь читает с реплик, догнавших позицию
+# записи, или с основной базы. Кука с позицией живёт не дольше, чем
+# REPLICA_PIN_SECONDS, — на случай остановки репликации.
+REPLICA_PIN_COOKIE = "read_primary"
+REPLICA_PIN_SECONDS = 60 * 60
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -124,8 +253,26 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 CSRF_FAILURE_VIEW = "core.views.csrf_failure"
 
+# CACHE_URL: locmem://, file:///dev/shm/yatube или redis://host:6379/0.
 CACHES = {
-    "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-    }
+    "default": metered(
+        cache_config(
+            os.getenv("CACHE_URL", "locmem://"),
+            key_prefix=os.getenv("CACHE_KEY_PREFIX", "yatube"),
+            version=int(os.getenv("CACHE_VERSION", "1")),
+        )
+    )
 }
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        # Медленные запросы и N+1 в формате JSON, по строке на событие.
+        "yatube.queries": {"handlers": ["console"], "level": "INFO"},
+    },
+}
+
+THUMBNAIL_CACHE = "default"
+THUMBNAIL_KEY_PREFIX = "thumbnail"
@@ -1,10 +1,141 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import json
 
-from yatube.settings import POSTS_ON_PAGE
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db.models import Exists, Q, QuerySet, Subquery
 
 
-def pagination(request, object_list):
-    paginator = Paginator(object_list, POSTS_ON_PAGE)
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по паре (key, id) без COUNT и OFFSET.
+
+    Курсоры непрозрачны для клиента: это base64 от направления
+    и ключа граничной записи. Стоимость страницы не зависит от глубины.
+    """
+
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, key="pub_date"):
+        super().__init__(object_list, per_page)
+        self.key = key
+        self.next_cursor = None
+        self.previous_cursor = None
+        self._num_pages = 1
+
+    @property
+    def num_pages(self):
+        return self._num_pages
+
+    def row_key(self, row):
+        """Пара (key, id) строки: модели или словаря из .values()."""
+        if isinstance(row, dict):
+            return row[self.key], row["id"]
+        return getattr(row, self.key), row.pk
+
+    def encode_cursor(self, row, backwards=False):
+        value, pk = self.row_key(row)
+        if hasattr(value, "isoformat"):
+            value = value.isoformat()
+        raw = json.dumps([backwards, value, pk]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            backwards, value, pk = json.loads(raw)
+            field = self.object_list.model._meta.get_field(self.key)
+            value = field.to_python(value)
+            if value is None:
+                raise ValueError(cursor)
+            return bool(backwards), value, int(pk)
+        except (binascii.Error, TypeError, ValueError, ValidationError):
+            raise InvalidPage("Некорректный курсор")
+
+    def beyond(self, queryset, position, backwards=False):
+        """Строки queryset по ту сторону от пары position в порядке ленты."""
+        key = self.key
+        if position is not None:
+            value, pk = position
+            lookup = "gt" if backwards else "lt"
+            queryset = queryset.filter(
+                Q(**{f"{key}__{lookup}": value})
+                | Q(**{key: value, f"pk__{lookup}": pk})
+            )
+        ordering = (key, "pk") if backwards else (f"-{key}", "-pk")
+        return queryset.order_by(*ordering)
+
+    def rows(self, position, backwards):
+        """До per_page + 1 строк за курсором, ближайшие первыми."""
+        queryset = self.beyond(self.object_list, position, backwards)
+        return list(queryset[: self.per_page + 1])
+
+    def page(self, cursor=None):
+        backwards, position = False, None
+        if cursor is not None:
+            backwards, value, pk = self.decode_cursor(cursor)
+            position = (value, pk)
+        rows = self.rows(position, backwards)
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if backwards:
+            rows.reverse()
+            has_previous, has_next = has_more, True
+        else:
+            has_previous, has_next = cursor is not None, has_more
+        self.next_cursor = self.previous_cursor = None
+        if rows and has_next:
+            self.next_cursor = self.encode_cursor(rows[-1])
+        if rows and has_previous:
+            self.previous_cursor = self.encode_cursor(rows[0], True)
+        number = 2 if self.previous_cursor else 1
+        self._num_pages = number + 1 if self.next_cursor else number
+        return Page(rows, number, self)
+
+    def get_page(self, cursor):
+        try:
+            return self.page(cursor)
+        except InvalidPage:
+            return self.page()
+
+
+def pagination(
+    request,
+    object_list,
+    key="pub_date",
+    count=None,
+    paginator_class=CursorPaginator,
+):
     page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+    if page_number is not None:
+        # Совместимость со старыми ссылками вида ?page=N.
+        paginator = Paginator(
+            object_list.order_by(f"-{key}", "-pk"), settings.POSTS_ON_PAGE
+        )
+        if count is not None:
+            # Известный заранее счётчик избавляет от COUNT(*).
+            paginator.count = count
+        return paginator.get_page(page_number)
+    paginator = paginator_class(object_list, settings.POSTS_ON_PAGE, key)
+    return paginator.get_page(request.GET.get("cursor"))
+
+
+def query_batch(queryset, **queries):
+    """Присоединяет к строкам queryset независимые запросы в одном SQL.
+
+    Запрос с одной колонкой (values или values_list) становится
+    подзапросом со значением первой строки, любой другой — EXISTS;
+    готовые выражения добавляются как есть. Во внутренних запросах
+    строку внешнего задаёт OuterRef. База получает одно обращение
+    вместо нескольких последовательных.
+    """
+    annotations = {}
+    for name, query in queries.items():
+        if isinstance(query, QuerySet):
+            if query._fields is not None and len(query._fields) == 1:
+                query = Subquery(query[:1])
+            else:
+                query = Exists(query)
+        annotations[name] = query
+    return queryset.annotate(**annotations)